@@ -0,0 +1,540 @@
+"""
+Automatic Correct/Wrong grading of the answers.csv files of a CSV tree.
+
+Each text answer / audio transcription is compared with the accepted answers
+of its question: the expected answers of examQuestions.ts
+(data/question_answers.json, see parse_questions.py) plus the extra answers
+of the grading reference (data/answer_synonyms.json).
+
+Both sides are normalized the same way: lowercase words without punctuation,
+possessives and plural "s", without articles, and number words as digits
+("Eight bits." -> ('8', 'bit'), "four four three" -> ('443',)). Per question, the accepted words go into a
+character trie, searched with one Levenshtein row per trie node, so a
+response word is compared with every accepted word in a single walk that
+stops as soon as a branch exceeds the edit budget. Accepted phrases are then
+aligned with windows of the response words:
+    - a word within its edit budget (0 for short words and numbers) matches;
+      one edit more still matches, but the row goes to review
+    - an accepted word that only repeats the question ("Transport" for
+      "Transport layer", asked as "Which OSI layer ...") may be left out
+    - response words that only repeat the question are ignored
+The score (0..1) is the share of the response covered by accepted answers.
+Rows at or above --accept are marked Correct, rows below --reject Wrong, the
+rest (and answers without a transcription, or spoken numbers that match
+nothing) are left empty and listed in grading_review.csv for a human. Results are cached per (question, answer), so
+a whole exam cohort is graded in well under a second.
+
+    python3 answer_grading.py                  # fill the empty marks of manual_corrected_csvs/
+    python3 answer_grading.py --evaluate       # compare with the existing manual marks
+"""
+
+import argparse
+import csv
+import json
+import re
+import time
+from pathlib import Path
+
+from answer_table import EXCLUDED_USERS, AnswerTable
+from parse_questions import parse_exam_questions, parse_question_details
+from summary_intervals import METRICS, format_value, load_users_rows, summary_estimates
+from tiered_transcription import EXPECTED_ANSWERS_FILE
+
+CORRECTED_DIR = '../manual_corrected_csvs'
+SYNONYMS_FILE = Path('../data/answer_synonyms.json')
+QUESTIONS_FILE = Path('../data/questions_map.json')
+REVIEW_FILE = '../output/general_statistics/grading_review.csv'
+
+ACCEPT_SCORE = 0.8  # at or above: Correct
+REJECT_SCORE = 0.5  # below: Wrong; in between: review
+NEAR_MISS_SCORE = 0.7  # score cap of a match that needed one edit more than the budget
+OPTIONAL_WORD_COST = 0.25  # cost (per character) of leaving out an accepted word that repeats the question
+MARK = 'x'
+
+# Transcriptions that are not an answer (generate_csv.py, transcribe_audio.py, voice_activity.NO_SPEECH);
+# spelled out because importing voice_activity loads Whisper
+UNGRADABLE = ('Not transcribed yet', 'TRANSCRIPTION_FAILED', 'NO_SPEECH_DETECTED')
+
+STOPWORDS = frozenset({'a', 'an', 'the', 'e', 'g', 'eg', 'ie', 'etc', 'um', 'uh'})
+UNITS = {word: value for value, word in enumerate(
+    'zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen '
+    'sixteen seventeen eighteen nineteen'.split())}
+TENS = {word: value * 10 for value, word in enumerate(
+    'twenty thirty forty fifty sixty seventy eighty ninety'.split(), 2)}
+
+PAIR_ROWS = ('Correct Pairs (Both Correct)', 'Wrong Pairs (Both Wrong)', 'Partial Pairs (One Correct)')
+# Rows of general_statistics/summary.csv computed from the Correct/Wrong marks
+GRADED_SUMMARY_ROWS = (
+    'Total Graded Answers (Count)', 'Total Correct Answers (Count)', 'Total Wrong Answers (Count)',
+    'Overall Accuracy (%)',
+    'Text Answers - Graded (Count)', 'Text Answers - Correct (Count)', 'Text Answers - Wrong (Count)',
+    'Text Accuracy (%)',
+    'Audio Answers - Graded (Count)', 'Audio Answers - Correct (Count)', 'Audio Answers - Wrong (Count)',
+    'Audio Accuracy (%)',
+    'Text vs Audio Performance Gap (%)',
+)
+
+
+def _single_digit(word):
+    """'4' / 'four' -> '4'; None for anything else."""
+    if len(word) == 1 and word.isdigit():
+        return word
+    value = UNITS.get(word)
+    return str(value) if value is not None and value < 10 else None
+
+
+def _numbers_to_digits(words):
+    """['four', 'hundred', 'and', 'forty', 'three', 'ms'] -> ['443', 'ms'].
+
+    Numbers read out digit by digit are joined: ['four', 'four', 'three'] and
+    ['4', '4', '3'] -> ['443'].
+    """
+    result, i = [], 0
+    while i < len(words):
+        digits = []
+        while i + len(digits) < len(words) and _single_digit(words[i + len(digits)]) is not None:
+            digits.append(_single_digit(words[i + len(digits)]))
+        if len(digits) > 1:
+            result.append(''.join(digits))
+            i += len(digits)
+            continue
+        if words[i] not in UNITS and words[i] not in TENS:
+            result.append(words[i])
+            i += 1
+            continue
+        total = current = 0
+        while i < len(words):
+            word = words[i]
+            if word in UNITS or word in TENS:
+                current += UNITS.get(word, TENS.get(word))
+            elif word == 'hundred':
+                current = max(current, 1) * 100
+            elif word == 'thousand':
+                total, current = total + max(current, 1) * 1000, 0
+            elif not (word == 'and' and i + 1 < len(words) and (words[i + 1] in UNITS or words[i + 1] in TENS)):
+                break
+            i += 1
+        result.append(str(total + current))
+    return result
+
+
+def _singular(word):
+    """'graphs' -> 'graph'; 'https', 'class', 'bus', 'analysis' are kept."""
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')) \
+            and re.search('[aeiouy]', word[:-1]):
+        return word[:-1]
+    return word
+
+
+def answer_words(text, numbers=True):
+    """Normalized words of an answer: "The Dijkstra's algorithm." -> ('dijkstra', 'algorithm')."""
+    text = re.sub(r"['’]s\b", '', text.lower())
+    words = re.sub(r'[\W_]+', ' ', text).split()
+    if numbers:
+        words = _numbers_to_digits(words)
+    return tuple(_singular(word) for word in words if word not in STOPWORDS)
+
+
+def edit_budget(word):
+    """Edits allowed between a response word and this accepted word (none for numbers and acronyms)."""
+    if word.isdigit() or len(word) <= 3 or not re.search('[aeiouy]', word):
+        return 0
+    return 1 if len(word) <= 6 else 2 if len(word) <= 11 else 3
+
+
+def _near_miss_budget(word):
+    budget = edit_budget(word)
+    return budget + 1 if budget else 0
+
+
+class WordTrie:
+    """Character trie of the accepted words of one question."""
+
+    def __init__(self, words):
+        self.root = {}
+        for word in words:
+            node = self.root
+            for char in word:
+                node = node.setdefault(char, {})
+            node[None] = word
+        self.max_edits = max((_near_miss_budget(word) for word in words), default=0)
+
+    def search(self, word):
+        """accepted word -> edit distance to word, for the accepted words within their near-miss budget."""
+        found = {}
+        stack = [(child, char, list(range(len(word) + 1))) for char, child in self.root.items() if char is not None]
+        while stack:
+            node, char, previous = stack.pop()
+            row = [previous[0] + 1]
+            for column in range(1, len(word) + 1):
+                row.append(min(row[column - 1] + 1, previous[column] + 1,
+                               previous[column - 1] + (word[column - 1] != char)))
+            accepted = node.get(None)
+            if accepted is not None and row[-1] <= _near_miss_budget(accepted):
+                found[accepted] = row[-1]
+            # No word below this node can get closer than the best cell of the row
+            if min(row) <= self.max_edits:
+                stack.extend((child, next_char, row) for next_char, child in node.items() if next_char is not None)
+        return found
+
+
+class QuestionMatcher:
+    """Accepted phrases of one question and the trie of their words."""
+
+    def __init__(self, accepted, question_text=''):
+        self.question_words = frozenset(answer_words(question_text))
+        self.phrases = {}  # normalized words -> accepted answer as written
+        for answer in accepted:
+            for numbers in (True, False):
+                words = answer_words(answer, numbers)
+                if words:
+                    self.phrases.setdefault(words, answer)
+        self.trie = WordTrie({word for phrase in self.phrases for word in phrase})
+        self._lookups = {}
+
+    def lookup(self, word):
+        if word not in self._lookups:
+            self._lookups[word] = self.trie.search(word)
+        return self._lookups[word]
+
+    def _alignments(self, words, phrase):
+        """(start, end, cost, near_miss) of phrase aligned with words[start:end].
+
+        Every response word of the window matches the next accepted word in
+        order or, if it is not an accepted word itself, replaces it (at the
+        cost of the longer word); accepted words may be left out (at full
+        cost, or OPTIONAL_WORD_COST if they repeat the question). At least
+        one accepted word that is not in the question must match.
+        """
+        def extend(start, p, r, cost, near_miss, required):
+            if p == len(phrase):
+                if r > start and required:
+                    yield start, r, cost, near_miss
+                return
+            word = phrase[p]
+            optional = word in self.question_words
+            yield from extend(start, p + 1, r, cost + len(word) * (OPTIONAL_WORD_COST if optional else 1),
+                              near_miss, required)
+            if r < len(words):
+                distance = self.lookup(words[r]).get(word)
+                if distance is not None:
+                    yield from extend(start, p + 1, r + 1, cost + distance,
+                                      near_miss or distance > edit_budget(word), required or not optional)
+                elif not self.lookup(words[r]):
+                    yield from extend(start, p + 1, r + 1, cost + max(len(word), len(words[r])), near_miss, required)
+
+        for start in range(len(words)):
+            yield from extend(start, 0, start, 0, False, False)
+
+    def score(self, words):
+        """(score, accepted answer) of normalized response words."""
+        if words in self.phrases:
+            return 1.0, self.phrases[words]
+        coverage = [0.0] * len(words)
+        best, matched = 0.0, ''
+        for phrase, answer in self.phrases.items():
+            length = sum(len(word) for word in phrase)
+            for start, end, cost, near_miss in self._alignments(words, phrase):
+                score = max(0.0, 1 - cost / length)
+                if near_miss:
+                    score = min(score, NEAR_MISS_SCORE)
+                for i in range(start, end):
+                    coverage[i] = max(coverage[i], score)
+                if score > best:
+                    best, matched = score, answer
+        counted = [value for value, word in zip(coverage, words) if value > 0 or word not in self.question_words]
+        return (sum(counted) / len(counted) if counted else 0.0), matched
+
+
+class AnswerGrader:
+    """Grades (question, answer) pairs; one QuestionMatcher per question with accepted answers."""
+
+    def __init__(self, accepted_answers, question_texts=None, accept=ACCEPT_SCORE, reject=REJECT_SCORE):
+        question_texts = question_texts or {}
+        self.matchers = {question_id: QuestionMatcher(answers, question_texts.get(question_id, ''))
+                         for question_id, answers in accepted_answers.items() if answers}
+        self.accept = accept
+        self.reject = reject
+        self._cache = {}
+
+    def grade(self, question_id, answer):
+        """{'verdict': 'Correct' / 'Wrong' / None (review), 'score', 'matched', 'reason'}.
+
+        None for questions that are not graded (no accepted answers).
+        """
+        matcher = self.matchers.get(question_id)
+        if matcher is None:
+            return None
+        key = (question_id, answer)
+        if key not in self._cache:
+            self._cache[key] = self._grade(matcher, answer)
+        return self._cache[key]
+
+    def _grade(self, matcher, answer):
+        answer = (answer or '').strip()
+        if not answer or answer in UNGRADABLE:
+            return {'verdict': None, 'score': 0.0, 'matched': '',
+                    'reason': 'no transcription' if answer else 'empty answer'}
+        words, spelled = answer_words(answer), answer_words(answer, numbers=False)
+        score, matched = max(matcher.score(words), matcher.score(spelled))
+        if score >= self.accept:
+            return {'verdict': 'Correct', 'score': score, 'matched': matched, 'reason': ''}
+        if score == 0 and words != spelled and all(word.isdigit() for word in words):
+            # A number in words that matches nothing ("four forty three") may be a transcription split
+            return {'verdict': None, 'score': score, 'matched': matched, 'reason': 'unmatched spoken number'}
+        if score < self.reject:
+            return {'verdict': 'Wrong', 'score': score, 'matched': matched, 'reason': ''}
+        return {'verdict': None, 'score': score, 'matched': matched, 'reason': 'uncertain match'}
+
+
+def load_accepted_answers(answers_file=EXPECTED_ANSWERS_FILE, synonyms_file=SYNONYMS_FILE):
+    """question_id -> accepted answers (examQuestions.ts answers + grading-reference synonyms)."""
+    if Path(answers_file).exists():
+        with open(answers_file, 'r', encoding='utf-8') as f:
+            details = json.load(f)
+    else:
+        details = parse_question_details()
+    accepted = {question_id: list(question['answers']) for question_id, question in details.items()}
+    if Path(synonyms_file).exists():
+        with open(synonyms_file, 'r', encoding='utf-8') as f:
+            for question_id, synonyms in json.load(f).items():
+                accepted.setdefault(question_id, []).extend(synonyms)
+    return accepted
+
+
+def load_question_texts(path=QUESTIONS_FILE):
+    if Path(path).exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return parse_exam_questions()
+
+
+def answer_text(row):
+    """The graded text of an answers.csv row: the transcription of audio answers, the typed text otherwise."""
+    return row['Transcription (Audio Answers)'] if row['Answer Type'] == 'Audio' else row['User Answer (Text)']
+
+
+def _is_marked(cell):
+    return bool(cell and cell.strip())
+
+
+def pair_counts(rows):
+    """(both correct, both wrong, one correct) over the standard / control pairs with both questions marked."""
+    marks = {}
+    for row in rows:
+        if _is_marked(row['Correct']) or _is_marked(row['Wrong']):
+            marks[row['Question ID']] = _is_marked(row['Correct'])
+    correct = wrong = partial = 0
+    for question_id, standard in marks.items():
+        control = marks.get(question_id.replace('_standard_', '_control_'))
+        if '_standard_' not in question_id or control is None:
+            continue
+        if standard and control:
+            correct += 1
+        elif not standard and not control:
+            wrong += 1
+        else:
+            partial += 1
+    return correct, wrong, partial
+
+
+def _read_csv(path):
+    """(rows as lists, line terminator) of a CSV file; the terminator is kept when the file is written back."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        first_line = f.readline()
+        f.seek(0)
+        return list(csv.reader(f)), '\r\n' if first_line.endswith('\r\n') else '\n'
+
+
+def _write_csv(path, rows, lineterminator):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f, lineterminator=lineterminator).writerows(rows)
+
+
+def _update_summary(path, values):
+    """Set Metric -> Value rows of a summary.csv (missing metrics are appended)."""
+    rows, lineterminator = _read_csv(path)
+    updated = [list(row) for row in rows]
+    for metric, value in values.items():
+        for row in updated:
+            if row and row[0] == metric:
+                row[1:] = [str(value)]
+                break
+        else:
+            updated.append([metric, str(value)])
+    if updated != rows:
+        _write_csv(path, updated, lineterminator)
+
+
+def _update_users_csv(path, counts):
+    """Correct (Count) / Wrong (Count) of the graded users in general_statistics/users.csv."""
+    if not path.exists():
+        return
+    rows, lineterminator = _read_csv(path)
+    header = rows[0]
+    user_column, correct_column, wrong_column = (header.index(name) for name in
+                                                 ('User ID', 'Correct (Count)', 'Wrong (Count)'))
+    updated = [list(row) for row in rows]
+    for row in updated[1:]:
+        if row and row[user_column] in counts:
+            row[correct_column], row[wrong_column] = (str(count) for count in counts[row[user_column]])
+    if updated != rows:
+        _write_csv(path, updated, lineterminator)
+
+
+def _update_general_summary(corrected_dir):
+    """Recompute the GRADED_SUMMARY_ROWS of general_statistics/summary.csv from the marks of answers.csv.
+
+    Same users (EXCLUDED_USERS left out) and same formulas as the estimates
+    of summary_intervals.py, which the charts check their values against.
+    """
+    summary_file = corrected_dir / 'general_statistics' / 'summary.csv'
+    if not summary_file.exists():
+        return
+    answers = AnswerTable.from_csv_tree(corrected_dir / 'user_csvs', exclude_users=EXCLUDED_USERS)
+    estimates = summary_estimates(answers, load_users_rows(corrected_dir, EXCLUDED_USERS))
+    values = {metric: format_value(estimates[metric], METRICS[metric][0]) for metric in GRADED_SUMMARY_ROWS}
+    values['Text performs better than Audio'] = 'Yes' if estimates['Text vs Audio Performance Gap (%)'] > 0 else 'No'
+    _update_summary(summary_file, values)
+
+
+def grade_user(user_dir, grader, overwrite=False):
+    """Fill the Correct/Wrong marks of one user's answers.csv and update its summary.csv.
+
+    Rows that already carry a mark are kept unless overwrite is set; rows
+    left for review are never changed. Returns (verdict counts, review rows,
+    (correct, wrong) marks of the user).
+    """
+    answers_file = user_dir / 'answers.csv'
+    rows, lineterminator = _read_csv(answers_file)
+    header = rows[0]
+    records = [dict(zip(header, row)) for row in rows[1:]]
+    counts = {'Correct': 0, 'Wrong': 0, 'review': 0, 'kept': 0}
+    review = []
+    for record in records:
+        result = grader.grade(record['Question ID'], answer_text(record))
+        if result is None:
+            continue
+        if not overwrite and (_is_marked(record['Correct']) or _is_marked(record['Wrong'])):
+            counts['kept'] += 1
+            continue
+        if result['verdict'] is None:
+            counts['review'] += 1
+            review.append({'User ID': user_dir.name, 'Question ID': record['Question ID'],
+                           'Answer Type': record['Answer Type'], 'Answer': answer_text(record),
+                           'Best Match': result['matched'], 'Score': f"{result['score']:.2f}",
+                           'Reason': result['reason']})
+            continue
+        counts[result['verdict']] += 1
+        record['Correct'] = MARK if result['verdict'] == 'Correct' else ''
+        record['Wrong'] = MARK if result['verdict'] == 'Wrong' else ''
+
+    updated = [header] + [[record[column] for column in header] for record in records]
+    if updated != rows:
+        _write_csv(answers_file, updated, lineterminator)
+
+    marks = (sum(_is_marked(record['Correct']) for record in records),
+             sum(_is_marked(record['Wrong']) for record in records))
+    summary_file = user_dir / 'summary.csv'
+    if summary_file.exists():
+        _update_summary(summary_file, {'Correct Answers (Count)': marks[0], 'Wrong Answers (Count)': marks[1],
+                                       **dict(zip(PAIR_ROWS, pair_counts(records)))})
+    return counts, review, marks
+
+
+def grade_tree(corrected_dir, grader, overwrite=False):
+    """Grade every user_csvs/<user_id>/answers.csv; returns (verdict counts, review rows).
+
+    users.csv and the graded rows of general_statistics/summary.csv are
+    updated with the new marks.
+    """
+    corrected_dir = Path(corrected_dir)
+    totals = {'Correct': 0, 'Wrong': 0, 'review': 0, 'kept': 0}
+    review, marks = [], {}
+    for user_dir in sorted((corrected_dir / 'user_csvs').glob('*')):
+        if not (user_dir / 'answers.csv').exists():
+            continue
+        counts, user_review, marks[user_dir.name] = grade_user(user_dir, grader, overwrite)
+        for name, count in counts.items():
+            totals[name] += count
+        review.extend(user_review)
+    _update_users_csv(corrected_dir / 'general_statistics' / 'users.csv', marks)
+    _update_general_summary(corrected_dir)
+    return totals, review
+
+
+def evaluate_tree(corrected_dir, grader):
+    """Compare the grader with the existing marks; returns (agreement counts, disagreements)."""
+    counts = {'agree': 0, 'disagree': 0, 'review': 0}
+    disagreements = []
+    for answers_file in sorted(Path(corrected_dir).glob('user_csvs/*/answers.csv')):
+        with open(answers_file, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                if not (_is_marked(row['Correct']) or _is_marked(row['Wrong'])):
+                    continue
+                result = grader.grade(row['Question ID'], answer_text(row))
+                if result is None:
+                    continue
+                manual = 'Correct' if _is_marked(row['Correct']) else 'Wrong'
+                if result['verdict'] is None:
+                    counts['review'] += 1
+                elif result['verdict'] == manual:
+                    counts['agree'] += 1
+                else:
+                    counts['disagree'] += 1
+                    disagreements.append((row['Question ID'], answer_text(row), manual, result))
+    return counts, disagreements
+
+
+def write_review_csv(review, path=REVIEW_FILE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    columns = ['User ID', 'Question ID', 'Answer Type', 'Answer', 'Best Match', 'Score', 'Reason']
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(review)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the Correct/Wrong columns of answers.csv automatically.")
+    parser.add_argument('--corrected', default=CORRECTED_DIR,
+                        help=f"CSV tree to grade (default: {CORRECTED_DIR})")
+    parser.add_argument('--review', default=REVIEW_FILE,
+                        help=f"CSV of the rows left for a human (default: {REVIEW_FILE})")
+    parser.add_argument('--accept', type=float, default=ACCEPT_SCORE,
+                        help=f"Minimum score marked Correct (default: {ACCEPT_SCORE})")
+    parser.add_argument('--reject', type=float, default=REJECT_SCORE,
+                        help=f"Scores below this are marked Wrong (default: {REJECT_SCORE})")
+    parser.add_argument('--overwrite', action='store_true',
+                        help="Re-grade rows that already have a mark (rows left for review keep theirs)")
+    parser.add_argument('--evaluate', action='store_true',
+                        help="Only compare the grader with the existing marks; nothing is written")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    grader = AnswerGrader(load_accepted_answers(), load_question_texts(), args.accept, args.reject)
+
+    if args.evaluate:
+        counts, disagreements = evaluate_tree(args.corrected, grader)
+        decided = counts['agree'] + counts['disagree']
+        print(f"Marked rows: {decided + counts['review']} "
+              f"({counts['review']} would go to review, {decided} graded automatically)")
+        if decided:
+            print(f"Agreement with the manual marks: {counts['agree']}/{decided} ({counts['agree'] / decided:.1%})")
+        for question_id, answer, manual, result in disagreements:
+            print(f"  {question_id:<22} {answer!r:<40} manual {manual:<7} -> {result['verdict']} "
+                  f"(score {result['score']:.2f}, {result['matched'] or 'no match'})")
+        print(f"Done in {time.perf_counter() - start:.2f}s")
+        return
+
+    totals, review = grade_tree(args.corrected, grader, args.overwrite)
+    write_review_csv(review, args.review)
+    print(f"Graded {totals['Correct'] + totals['Wrong']} answers in {time.perf_counter() - start:.2f}s: "
+          f"{totals['Correct']} correct, {totals['Wrong']} wrong, {totals['review']} left for review "
+          f"({totals['kept']} existing marks kept)")
+    print(f"Saved {args.review}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Columnar answer table shared by the report scripts.
+
+One row per answer, stored as typed NumPy arrays:
+    user_id, question_id, section, kind, answer_type  -> categorical codes (int32)
+    time_ms                                           -> float64 (NaN = missing)
+    displayed_at, answered_at                         -> datetime64[ms] (NaT = missing)
+    correct, wrong                                    -> bool
+
+The table is built once, from a corrected CSV tree (manual_corrected_csvs/user_csvs),
+and averages, ratios and accuracies are computed as vectorized group-bys
+(np.bincount) instead of Python loops.
+"""
+
+import csv
+from pathlib import Path
+
+import numpy as np
+
+KINDS = ('standard', 'control', 'accomodation')
+ANSWER_TYPES = ('Text', 'Audio')
+CATEGORICAL_COLUMNS = ('user_id', 'question_id', 'section', 'kind', 'answer_type')
+
+# Users left out of the statistics (general_statistics/summary.csv and the per-user analyses):
+# too many tab changes, or only accommodation answers (see manual_corrected_csvs/README.md)
+EXCLUDED_USERS = frozenset({
+    'yskSrWOMY1dMfleJ1demTFRwmaB3',
+    'kzHpKFHMcPPnV8KAKZX4skbzRlM2',
+    'dwtLwhIgAyQAfqgq6BGgRYDqwdi2',
+    'I95XongADMhnGoykzUkcFxfx2Zg1',
+    '2jx38lBdkJZAffOTjapIJUOkcmT2',
+})
+
+
+def split_question_id(question_id):
+    """'section2_standard_Q6' -> ('section2_standard', 'standard')."""
+    section = question_id.rsplit('_', 1)[0] if '_' in question_id else ''
+    kind = section.split('_', 1)[1] if '_' in section else ''
+    return section, kind if kind in KINDS else ''
+
+
+def parse_mmss_to_ms(value):
+    """'1:05' -> 65000.0, '' -> NaN (time columns of answers.csv)."""
+    try:
+        minutes, seconds = value.split(':')
+        return (int(minutes) * 60 + int(seconds)) * 1000.0
+    except (AttributeError, ValueError):
+        return np.nan
+
+
+def _is_marked(cell):
+    """A Correct/Wrong cell counts as marked when it holds any marker ('x', 'OK', ...)."""
+    return bool(cell and cell.strip())
+
+
+def _to_datetime64(timestamps):
+    return np.array([ts.rstrip('Z') if ts else 'NaT' for ts in timestamps], dtype='datetime64[ms]')
+
+
+def _encode(values, labels=None):
+    """Encode a list of strings as (codes, labels); '' and None map to -1."""
+    if labels is None:
+        labels = sorted({v for v in values if v})
+    lookup = {label: code for code, label in enumerate(labels)}
+    codes = np.fromiter((lookup.get(v, -1) for v in values), dtype=np.int32, count=len(values))
+    return codes, tuple(labels)
+
+
+class AnswerTable:
+    """Typed, columnar view of every answer in a cohort."""
+
+    def __init__(self, rows):
+        """rows: dict column -> list of raw Python values (see empty_rows)."""
+        self.codes = {}
+        self.labels = {}
+        for column in CATEGORICAL_COLUMNS:
+            fixed = {'kind': KINDS, 'answer_type': ANSWER_TYPES}.get(column)
+            self.codes[column], self.labels[column] = _encode(rows[column], fixed)
+
+        self.time_ms = np.asarray(rows['time_ms'], dtype=np.float64)
+        self.displayed_at = _to_datetime64(rows['displayed_at'])
+        self.answered_at = _to_datetime64(rows['answered_at'])
+        self.correct = np.asarray(rows['correct'], dtype=bool)
+        self.wrong = np.asarray(rows['wrong'], dtype=bool)
+
+    def __len__(self):
+        return len(self.time_ms)
+
+    @staticmethod
+    def empty_rows():
+        return {column: [] for column in CATEGORICAL_COLUMNS + (
+            'time_ms', 'displayed_at', 'answered_at', 'correct', 'wrong')}
+
+    @staticmethod
+    def _append(rows, user_id, question_id, answer_type, time_ms, displayed_at, answered_at, correct, wrong):
+        section, kind = split_question_id(question_id)
+        rows['user_id'].append(user_id)
+        rows['question_id'].append(question_id)
+        rows['section'].append(section)
+        rows['kind'].append(kind)
+        rows['answer_type'].append(answer_type)
+        rows['time_ms'].append(np.nan if time_ms is None else time_ms)
+        rows['displayed_at'].append(displayed_at)
+        rows['answered_at'].append(answered_at)
+        rows['correct'].append(correct)
+        rows['wrong'].append(wrong)
+
+    @classmethod
+    def from_csv_tree(cls, user_csvs_dir, exclude_users=()):
+        """Build the table from <user_csvs_dir>/<user_id>/answers.csv (with Correct/Wrong marks)."""
+        rows = cls.empty_rows()
+        for user_dir in sorted(Path(user_csvs_dir).glob('*')):
+            answers_file = user_dir / 'answers.csv'
+            if not user_dir.is_dir() or user_dir.name in exclude_users or not answers_file.exists():
+                continue
+            with open(answers_file, 'r', encoding='utf-8', newline='') as f:
+                cls.append_csv_rows(rows, user_dir.name, csv.DictReader(f))
+        return cls(rows)
+
+    @classmethod
+    def append_csv_rows(cls, rows, user_id, csv_rows):
+        """Append the lines of one user's answers.csv (csv.DictReader rows) to rows (see empty_rows)."""
+        for row in csv_rows:
+            cls._append(rows, user_id, row.get('Question ID', ''),
+                        row.get('Answer Type', '').strip(),
+                        parse_mmss_to_ms(row.get('Time to Answer (mm:ss)', '')),
+                        row.get('Question Displayed At (Timestamp)', ''),
+                        row.get('Answered At (Timestamp)', ''),
+                        _is_marked(row.get('Correct', '')),
+                        _is_marked(row.get('Wrong', '')))
+
+    def code_of(self, column, label):
+        """Categorical code of a label (-1 if it never occurs)."""
+        labels = self.labels[column]
+        return labels.index(label) if label in labels else -1
+
+    def mask(self, **equals):
+        """Boolean row mask, e.g. table.mask(kind='standard', answer_type='Audio')."""
+        mask = np.ones(len(self), dtype=bool)
+        for column, label in equals.items():
+            mask &= self.codes[column] == self.code_of(column, label)
+        return mask
+
+    def group_sum(self, values, by, mask=None):
+        """Sum of values per group of column `by` (indexed by code, length len(labels[by])).
+
+        With by=None the whole table is a single group (arrays of length 1).
+        """
+        if by is None:
+            codes, n_groups = np.zeros(len(self), dtype=np.int32), 1
+        else:
+            codes, n_groups = self.codes[by], len(self.labels[by])
+        keep = codes >= 0
+        if mask is not None:
+            keep &= mask
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64), codes.shape)
+        return np.bincount(codes[keep], weights=values[keep], minlength=n_groups)
+
+    def group_count(self, by, mask=None):
+        return self.group_sum(1.0, by, mask).astype(np.int64)
+
+    def time_stats(self, by, mask=None):
+        """(count, sum_ms, mean_ms) of time_ms per group; answers without a time are ignored."""
+        timed = ~np.isnan(self.time_ms)
+        if mask is not None:
+            timed &= mask
+        counts = self.group_count(by, timed)
+        sums = self.group_sum(np.where(timed, self.time_ms, 0.0), by, timed)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        return counts, sums, means
+
+    def accuracy_counts(self, by, mask=None):
+        """(correct, wrong) counts per group."""
+        return (self.group_count(by, self.correct if mask is None else self.correct & mask),
+                self.group_count(by, self.wrong if mask is None else self.wrong & mask))
@@ -0,0 +1,28 @@
+"""
+Helpers shared by the transcription scripts for walking the audio answers of an export.
+"""
+
+from pathlib import Path
+
+AUDIO_DIR = Path('../data/audio_files')
+
+
+def iter_audio_answers(data):
+    """Yield (user_id, question_id, answer) for every audio answer in examProgress and examResults"""
+    for user_id, user_data in data.get('examProgress', {}).items():
+        if isinstance(user_data, dict) and 'answers' in user_data:
+            for question_id, answer in user_data['answers'].items():
+                if 'audioUrl' in answer:
+                    yield user_id, question_id, answer
+
+    for user_id, results in data.get('examResults', {}).items():
+        for result_id, result_data in results.items():
+            if 'answers' in result_data:
+                for question_id, answer in result_data['answers'].items():
+                    if 'audioUrl' in answer:
+                        yield user_id, question_id, answer
+
+
+def audio_path_for(user_id, question_id, audio_dir=AUDIO_DIR):
+    """Local file of an audio answer: <audio_dir>/<user_id>_<question_id>.webm"""
+    return Path(audio_dir) / f"{user_id}_{question_id}.webm"
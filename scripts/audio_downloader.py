@@ -0,0 +1,88 @@
+"""
+Concurrent downloader for the audio answers (Firebase Storage .webm files).
+
+All requests share one pooled requests.Session; downloads run on a bounded
+thread pool, bodies are streamed to disk in chunks, written to a temporary
+file and atomically renamed into place, and failed requests are retried with
+exponential backoff. The audio files end up in data/audio_files/ before the
+transcription stage runs.
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+CHUNK_SIZE = 64 * 1024
+
+
+def create_session(pool_size=DEFAULT_WORKERS):
+    """One session for all downloads, with a connection pool sized to the workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def download_file(session, url, output_path, timeout=DEFAULT_TIMEOUT,
+                  retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Stream url to output_path via a temp file + atomic rename. Returns True on success."""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    for attempt in range(retries + 1):
+        tmp_path = None
+        try:
+            with session.get(url, timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                fd, tmp_path = tempfile.mkstemp(dir=output_path.parent, prefix=output_path.name, suffix='.part')
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(tmp_path, output_path)
+            return True
+        except Exception as e:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            permanent = status is not None and 400 <= status < 500 and status != 429
+            if attempt == retries or permanent:
+                print(f"    Error downloading {output_path.name}: {e}")
+                return False
+            time.sleep(backoff * (2 ** attempt))
+
+
+def download_all(jobs, workers=DEFAULT_WORKERS, session=None, **kwargs):
+    """Download [(url, output_path), ...] concurrently, skipping files that already exist.
+
+    Returns a dict output_path -> True/False.
+    """
+    pending = [(url, Path(path)) for url, path in jobs if not Path(path).exists()]
+    results = {Path(path): True for _, path in jobs if Path(path).exists()}
+    if not pending:
+        return results
+
+    own_session = session is None
+    if own_session:
+        session = create_session(workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                path: executor.submit(download_file, session, url, path, **kwargs)
+                for url, path in pending
+            }
+            for path, future in futures.items():
+                results[path] = future.result()
+    finally:
+        if own_session:
+            session.close()
+    return results
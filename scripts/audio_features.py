@@ -0,0 +1,104 @@
+"""
+Decoded-audio cache for the transcription scripts.
+
+Every Whisper call on a .webm path shells out to ffmpeg to decode and resample
+the file to 16 kHz. The audio never changes between re-transcription passes, so
+each file is decoded once into data/audio_features/<name>.npy (16 kHz mono PCM,
+stored as float16) and later passes memory-map that array and hand it to the
+model directly. The PCM is kept rather than the log-mel spectrogram because it
+is valid for every model size (the mel settings differ between models).
+
+Run on its own to prepare every downloaded file:
+    python3 audio_features.py [--workers N]
+"""
+
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from audio_answers import AUDIO_DIR
+
+try:
+    import whisper
+except ImportError:
+    whisper = None
+
+FEATURES_DIR = Path('../data/audio_features')
+DEFAULT_WORKERS = 4
+
+
+def feature_path_for(audio_path, features_dir=FEATURES_DIR):
+    """<features_dir>/<user_id>_<question_id>.npy for an audio file."""
+    return Path(features_dir) / (Path(audio_path).stem + '.npy')
+
+
+def _is_fresh(audio_path, feature_path):
+    return feature_path.exists() and feature_path.stat().st_mtime_ns >= Path(audio_path).stat().st_mtime_ns
+
+
+def prepare_one(audio_path, features_dir=FEATURES_DIR):
+    """Decode audio_path once into float16 PCM. Returns the .npy path, or None if decoding fails."""
+    feature_path = feature_path_for(audio_path, features_dir)
+    if _is_fresh(audio_path, feature_path):
+        return feature_path
+    if whisper is None:
+        return None
+    try:
+        pcm = whisper.load_audio(str(audio_path))
+    except Exception as e:
+        print(f"    Failed to decode {Path(audio_path).name}: {e}")
+        return None
+
+    feature_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = feature_path.with_suffix('.part.npy')
+    np.save(tmp_path, pcm.astype(np.float16))
+    os.replace(tmp_path, feature_path)
+    return feature_path
+
+
+def prepare_features(audio_paths, features_dir=FEATURES_DIR, workers=DEFAULT_WORKERS):
+    """Decode every file that has no up-to-date .npy yet (ffmpeg runs in parallel).
+
+    Returns a dict audio_path -> .npy path, for the files that could be decoded.
+    """
+    audio_paths = [Path(path) for path in audio_paths]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        feature_paths = list(executor.map(lambda path: prepare_one(path, features_dir), audio_paths))
+    return {audio_path: feature_path
+            for audio_path, feature_path in zip(audio_paths, feature_paths) if feature_path is not None}
+
+
+def load_pcm(path):
+    """16 kHz float32 PCM: memory-mapped from a .npy feature file, or decoded with ffmpeg."""
+    path = Path(path)
+    if path.suffix == '.npy':
+        return np.asarray(np.load(path, mmap_mode='r'), dtype=np.float32)
+    return whisper.load_audio(str(path))
+
+
+def audio_input(path):
+    """What to pass to model.transcribe(): the PCM array of a .npy file, else the file path."""
+    return load_pcm(path) if Path(path).suffix == '.npy' else str(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode every downloaded audio answer once into data/audio_features/.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent ffmpeg decodes (default: {DEFAULT_WORKERS})")
+    args = parser.parse_args()
+
+    if whisper is None:
+        print("Whisper not installed. Run: pip install openai-whisper")
+        exit(1)
+
+    audio_paths = sorted(AUDIO_DIR.glob('*.webm'))
+    print(f"Decoding {len(audio_paths)} audio files into {FEATURES_DIR}/ ...")
+    prepared = prepare_features(audio_paths, workers=args.workers)
+    print(f"Ready: {len(prepared)}/{len(audio_paths)}")
+
+
+if __name__ == '__main__':
+    main()
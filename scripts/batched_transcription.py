@@ -0,0 +1,162 @@
+"""
+Batched Whisper inference for short audio answers.
+
+model.transcribe() runs the full 30-second-window pipeline for one file at a
+time, so with answers that are only a few seconds long the per-call overhead
+(mel setup, one encoder pass per clip) dominates. Here clips that fit in a
+single window are padded to 30 s, stacked into one mel batch and encoded in a
+single forward pass; the decoder then runs on the precomputed audio features
+with the same prompt, beam size and thresholds as transcribe(). Clips longer
+than one window, clips that fail the compression-ratio / log-probability
+thresholds (transcribe() would retry them at higher temperatures) and batches
+that fail outright fall back to the caller's per-file transcription function.
+"""
+
+import dataclasses
+
+from audio_features import load_pcm
+
+try:
+    import torch
+    import whisper
+    from whisper.audio import N_FRAMES, N_SAMPLES
+except ImportError:
+    whisper = None
+
+DEFAULT_BATCH_SIZE = 8
+
+
+def _decoding_options(options):
+    """DecodingOptions equivalent to the first transcribe() attempt with these options."""
+    temperature = options.get('temperature', 0.0)
+    if isinstance(temperature, (list, tuple)):
+        temperature = temperature[0]
+    return whisper.DecodingOptions(
+        task=options.get('task', 'transcribe'),
+        language=options.get('language'),
+        temperature=temperature,
+        beam_size=options.get('beam_size') if temperature == 0 else None,
+        best_of=options.get('best_of') if temperature > 0 else None,
+        prompt=options.get('initial_prompt'),
+        fp16=options.get('fp16', True),
+    )
+
+
+def _needs_fallback(result, options):
+    """Same quality checks transcribe() applies before trying the next temperature."""
+    compression_ratio_threshold = options.get('compression_ratio_threshold', 2.4)
+    logprob_threshold = options.get('logprob_threshold', -1.0)
+    no_speech_threshold = options.get('no_speech_threshold', 0.6)
+
+    if no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold \
+            and logprob_threshold is not None and result.avg_logprob < logprob_threshold:
+        return False  # silence
+    if compression_ratio_threshold is not None and result.compression_ratio > compression_ratio_threshold:
+        return True  # too repetitive
+    if logprob_threshold is not None and result.avg_logprob < logprob_threshold:
+        return True  # average log probability is too low
+    return False
+
+
+def _is_silence(result, options):
+    """transcribe() drops a window whose no-speech probability is high and log-probability low."""
+    no_speech_threshold = options.get('no_speech_threshold', 0.6)
+    logprob_threshold = options.get('logprob_threshold', -1.0)
+    if no_speech_threshold is None or result.no_speech_prob <= no_speech_threshold:
+        return False
+    return logprob_threshold is None or result.avg_logprob <= logprob_threshold
+
+
+def _single_window_mel(audio, model):
+    """Log-mel of a clip that fits in one window, padded the way transcribe() pads it."""
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+    content_frames = mel.shape[-1] - N_FRAMES
+    return whisper.pad_or_trim(mel[:, :content_frames], N_FRAMES)
+
+
+def _decode_batch(model, mels, decoding_options):
+    """One encoder pass for the whole batch, then decode each clip's features.
+
+    decoding_options holds one DecodingOptions per clip; clips that share the
+    same options (prompt) are decoded together.
+    """
+    dtype = torch.float16 if decoding_options[0].fp16 else torch.float32
+    with torch.no_grad():
+        features = model.embed_audio(torch.stack(mels).to(model.device).to(dtype))
+    groups = {}
+    for i, clip_options in enumerate(decoding_options):
+        groups.setdefault(clip_options, []).append(i)
+
+    results = [None] * len(mels)
+    for clip_options, indices in groups.items():
+        if (clip_options.beam_size or clip_options.best_of or 1) > 1:
+            # Beam search / best-of decoding only supports one clip per call
+            decoded = [model.decode(features[i:i + 1], clip_options)[0] for i in indices]
+        else:
+            decoded = model.decode(features[indices], clip_options)
+        for i, result in zip(indices, decoded):
+            results[i] = result
+    return results
+
+
+def transcribe_batched(model, audio_paths, options, transcribe_one, batch_size=DEFAULT_BATCH_SIZE, prompts=None):
+    """Yield (audio_path, transcription) for every path, batching the short clips.
+
+    options are the transcribe() keyword arguments (WHISPER_OPTIONS of the
+    calling script); transcribe_one(audio_path, model) is the script's
+    per-file function, used for long clips and for fallbacks. Paths may be
+    audio files or decoded .npy features (see audio_features.py). prompts
+    optionally maps a path to its own initial_prompt (see question_prompts.py);
+    it is then passed on as transcribe_one(audio_path, model, prompt).
+    """
+    def transcribe_single(audio_path):
+        if prompts is None:
+            return transcribe_one(audio_path, model)
+        return transcribe_one(audio_path, model, prompts.get(audio_path))
+
+    if whisper is None or batch_size <= 1:
+        for audio_path in audio_paths:
+            yield audio_path, transcribe_single(audio_path)
+        return
+
+    decoding_options = _decoding_options(options)
+    batch = []
+
+    def clip_options(audio_path):
+        prompt = prompts.get(audio_path) if prompts is not None else None
+        return decoding_options if not prompt else dataclasses.replace(decoding_options, prompt=prompt)
+
+    def flush():
+        paths = [path for path, _ in batch]
+        try:
+            results = _decode_batch(model, [mel for _, mel in batch], [clip_options(path) for path in paths])
+        except Exception as e:
+            print(f"    Batched decoding failed ({e}), transcribing {len(paths)} files one by one")
+            results = [None] * len(paths)
+        batch.clear()
+        for audio_path, result in zip(paths, results):
+            if result is None or _needs_fallback(result, options):
+                yield audio_path, transcribe_single(audio_path)
+            elif _is_silence(result, options):
+                yield audio_path, ''
+            else:
+                yield audio_path, result.text.strip()
+
+    for audio_path in audio_paths:
+        try:
+            audio = load_pcm(audio_path)
+        except Exception as e:
+            print(f"    Failed to decode {audio_path}: {e}")
+            yield audio_path, None
+            continue
+        if len(audio) > N_SAMPLES:
+            yield audio_path, transcribe_single(audio_path)
+            continue
+        batch.append((audio_path, _single_window_mel(audio, model)))
+        if len(batch) >= batch_size:
+            print(f"    Decoding a batch of {len(batch)} clips...")
+            yield from flush()
+
+    if batch:
+        print(f"    Decoding a batch of {len(batch)} clips...")
+        yield from flush()
@@ -0,0 +1,479 @@
+"""
+SQLite storage backend for the Firebase export.
+
+The export (final.json / final_with_transcriptions.json) is normally kept as
+one pretty-printed JSON document, which every script parses in full and the
+transcription scripts rewrite in full. The store keeps the same data
+normalized into tables: one row per user, per examProgress / examResults
+entry and per answer, with an index on answers(user_id, question_id). The
+common answer fields are columns; the shared prefix of the audio URLs is
+stored once. A single user or answer can be read or updated without touching
+the rest of the export.
+
+The conversion is lossless in both directions (key order included):
+    python3 export_store.py to-store ../data/final_with_transcriptions.json ../data/final_with_transcriptions.sqlite
+    python3 export_store.py to-json ../data/final_with_transcriptions.sqlite ../data/final_with_transcriptions.json
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+STORE_SUFFIXES = ('.sqlite', '.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    name     TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data     TEXT                -- JSON, for sections other than examProgress / examResults / users
+);
+CREATE TABLE IF NOT EXISTS user_ids (
+    id      INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS question_ids (
+    id          INTEGER PRIMARY KEY,
+    question_id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS url_prefixes (
+    id     INTEGER PRIMARY KEY,
+    prefix TEXT NOT NULL UNIQUE  -- {user} / {question} stand for the answer's ids
+);
+CREATE TABLE IF NOT EXISTS key_orders (
+    id   INTEGER PRIMARY KEY,
+    keys TEXT NOT NULL UNIQUE    -- JSON list: field order of the original answer objects
+);
+CREATE TABLE IF NOT EXISTS users (
+    user     INTEGER PRIMARY KEY REFERENCES user_ids(id),
+    position INTEGER NOT NULL,
+    email    TEXT,
+    info     TEXT NOT NULL       -- JSON of users[user_id]
+);
+CREATE TABLE IF NOT EXISTS progress (
+    user       INTEGER PRIMARY KEY REFERENCES user_ids(id),
+    position   INTEGER NOT NULL,
+    submitted  INTEGER NOT NULL,
+    data       TEXT NOT NULL,    -- JSON of examProgress[user_id] without its answers
+    answers_at INTEGER           -- position of the 'answers' key, NULL if there is none
+);
+CREATE TABLE IF NOT EXISTS result_users (
+    user     INTEGER PRIMARY KEY REFERENCES user_ids(id),
+    position INTEGER NOT NULL,
+    raw      TEXT                -- JSON, only when examResults[user_id] is not an object
+);
+CREATE TABLE IF NOT EXISTS results (
+    id         INTEGER PRIMARY KEY,
+    user       INTEGER NOT NULL REFERENCES user_ids(id),
+    position   INTEGER NOT NULL,
+    result_id  TEXT NOT NULL,
+    data       TEXT NOT NULL,    -- JSON of examResults[user_id][result_id] without its answers
+    answers_at INTEGER,
+    UNIQUE (user, position)
+);
+CREATE TABLE IF NOT EXISTS answers (
+    user          INTEGER NOT NULL REFERENCES user_ids(id),
+    question      INTEGER NOT NULL REFERENCES question_ids(id),
+    result        INTEGER NOT NULL, -- results.id, 0 for examProgress answers
+    position      INTEGER NOT NULL,
+    text              TEXT,
+    url_prefix        INTEGER REFERENCES url_prefixes(id),
+    audio_url         TEXT,         -- the part after url_prefixes.prefix
+    transcription     TEXT,
+    time_ms           INTEGER,
+    audio_duration_ms INTEGER,
+    answered_at       INTEGER,      -- epoch ms (or the original text if it is not a plain ISO timestamp)
+    displayed_at      INTEGER,
+    key_order         INTEGER REFERENCES key_orders(id),
+    extra             TEXT,         -- JSON of any other fields (speechSpan, ...)
+    raw               TEXT,         -- JSON, only when the answer is not an object
+    PRIMARY KEY (user, question, result)
+) WITHOUT ROWID;
+CREATE VIEW IF NOT EXISTS answer_rows AS
+    SELECT u.user_id, r.result_id, q.question_id, a.text,
+           replace(replace(p.prefix, '{user}', u.user_id), '{question}', q.question_id) || a.audio_url AS audio_url,
+           a.transcription, a.time_ms, a.audio_duration_ms, a.answered_at AS answered_at_ms,
+           a.displayed_at AS displayed_at_ms
+    FROM answers a
+    JOIN user_ids u ON u.id = a.user
+    JOIN question_ids q ON q.id = a.question
+    LEFT JOIN results r ON r.id = a.result
+    LEFT JOIN url_prefixes p ON p.id = a.url_prefix;
+"""
+
+# (column, export field, type stored in the column); other fields and values go to `extra`
+_COLUMN_FIELDS = (
+    ('text', 'text', str),
+    ('transcription', 'transcription', str),
+    ('time_ms', 'timeToAnswerMs', int),
+    ('audio_duration_ms', 'audioQuestionDurationMs', int),
+)
+_TIMESTAMP_FIELDS = (('answered_at', 'answeredAt'), ('displayed_at', 'questionDisplayedAt'))
+_ANSWER_COLUMNS = ('text', 'url_prefix', 'audio_url', 'transcription', 'time_ms', 'audio_duration_ms',
+                   'answered_at', 'displayed_at', 'key_order', 'extra', 'raw')
+_SECTIONS = ('examProgress', 'examResults', 'users')
+_TABLES = ('sections', 'user_ids', 'question_ids', 'url_prefixes', 'key_orders', 'users', 'progress',
+           'result_users', 'results', 'answers')
+_INTERNED = {'user_ids': 'user_id', 'question_ids': 'question_id', 'url_prefixes': 'prefix', 'key_orders': 'keys'}
+
+_ISO_MS = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z\Z')
+_EPOCH = datetime(1970, 1, 1)
+
+
+def is_store(path):
+    """True for a path that names an export store (.sqlite / .db) rather than JSON."""
+    return Path(path).suffix in STORE_SUFFIXES
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _ms_to_timestamp(ms):
+    """1767538480693 -> '2026-01-04T14:54:40.693Z'."""
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ms // 1000)) + '.%03dZ' % (ms % 1000)
+
+
+def _timestamp_to_ms(value):
+    """Epoch ms of an ISO timestamp, or None when converting back would not give the same text."""
+    if not isinstance(value, str) or not _ISO_MS.match(value):
+        return None
+    ms = (datetime.fromisoformat(value[:-1]) - _EPOCH) // timedelta(milliseconds=1)
+    return ms if _ms_to_timestamp(ms) == value else None
+
+
+def _split_url(url, user_id, question_id):
+    """Audio URL -> (prefix template, rest).
+
+    The prefix is everything up to the last path separator ('/' or an encoded
+    %2F), with the user and question ids replaced by {user} / {question}, so
+    all answers of an export share a few prefixes:
+    'https://host/o/audio%2F<uid>%2F<qid>%2F17.webm?token=..' -> ('https://host/o/audio%2F{user}%2F{question}%2F', '17.webm?token=..').
+    """
+    path = url.split('?', 1)[0]
+    cut = max(path.rfind('/') + 1, path.rfind('%2F') + 3)
+    prefix, rest = url[:cut], url[cut:]
+    if user_id and question_id and '{' not in prefix + user_id + question_id:
+        prefix = prefix.replace(user_id, '{user}').replace(question_id, '{question}')
+    return prefix, rest
+
+
+def _join_url(prefix, rest, user_id, question_id):
+    return prefix.replace('{user}', user_id).replace('{question}', question_id) + rest
+
+
+def _without_answers(entry):
+    """(entry without its 'answers' object, index of that key or None)."""
+    if not isinstance(entry, dict) or not isinstance(entry.get('answers'), dict):
+        return entry, None
+    return {key: value for key, value in entry.items() if key != 'answers'}, list(entry).index('answers')
+
+
+def _with_answers(entry, answers_at, answers):
+    if answers_at is None:
+        return entry
+    items = list(entry.items())
+    items.insert(answers_at, ('answers', answers))
+    return dict(items)
+
+
+class ExportStore:
+    """The export in SQLite, with per-user and per-answer access."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.executescript(_SCHEMA)
+        self._load_ids()
+
+    def _load_ids(self):
+        """Interned values (value -> id) of user ids, question ids, URL prefixes and key orders."""
+        self._ids = {table: dict(self._conn.execute(f'SELECT {column}, id FROM {table}'))
+                     for table, column in _INTERNED.items()}
+        self._values = {table: {value_id: value for value, value_id in ids.items()}
+                        for table, ids in self._ids.items()}
+        self._key_orders = {key_id: json.loads(keys) for key_id, keys in self._values['key_orders'].items()}
+
+    def _id(self, table, value):
+        ids = self._ids[table]
+        if value not in ids:
+            ids[value] = self._conn.execute(f'INSERT INTO {table} ({_INTERNED[table]}) VALUES (?)',
+                                            (value,)).lastrowid
+            self._values[table][ids[value]] = value
+            if table == 'key_orders':
+                self._key_orders[ids[value]] = json.loads(value)
+        return ids[value]
+
+    def _answer_columns(self, user_id, question_id, answer):
+        """Column values (in _ANSWER_COLUMNS order) of one answer."""
+        if not isinstance(answer, dict):
+            return (None,) * 10 + (_dumps(answer),)
+        columns = {column: answer[field] for column, field, kind in _COLUMN_FIELDS
+                   if type(answer.get(field)) is kind}
+        stored = {field for column, field, _ in _COLUMN_FIELDS if column in columns}
+        for column, field in _TIMESTAMP_FIELDS:
+            ms = _timestamp_to_ms(answer.get(field))
+            if ms is not None:
+                columns[column] = ms
+                stored.add(field)
+        if type(answer.get('audioUrl')) is str:
+            prefix, columns['audio_url'] = _split_url(answer['audioUrl'], user_id, question_id)
+            columns['url_prefix'] = self._id('url_prefixes', prefix)
+            stored.add('audioUrl')
+
+        extra = {field: value for field, value in answer.items() if field not in stored}
+        columns['key_order'] = self._id('key_orders', _dumps(list(answer)))
+        columns['extra'] = _dumps(extra) if extra else None
+        return tuple(columns.get(column) for column in _ANSWER_COLUMNS)
+
+    def _answer_from_row(self, user_id, question_id, row):
+        """Inverse of _answer_columns."""
+        (text, url_prefix, audio_url, transcription, time_ms, audio_duration_ms,
+         answered_at, displayed_at, key_order, extra, raw) = row
+        if raw is not None:
+            return json.loads(raw)
+        fields = json.loads(extra) if extra else {}
+        for field, value in (('text', text), ('transcription', transcription), ('timeToAnswerMs', time_ms),
+                             ('audioQuestionDurationMs', audio_duration_ms)):
+            if value is not None:
+                fields[field] = value
+        for field, value in (('answeredAt', answered_at), ('questionDisplayedAt', displayed_at)):
+            if value is not None:
+                fields[field] = _ms_to_timestamp(value) if type(value) is int else value
+        if audio_url is not None:
+            fields['audioUrl'] = _join_url(self._values['url_prefixes'][url_prefix], audio_url, user_id, question_id)
+        return {field: fields[field] for field in self._key_orders[key_order]}
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Writing
+
+    def _insert_answers(self, user_id, result, answers):
+        user = self._id('user_ids', user_id)
+        placeholders = ', '.join('?' * (4 + len(_ANSWER_COLUMNS)))
+        self._conn.executemany(
+            f'INSERT INTO answers VALUES ({placeholders})',
+            [(user, self._id('question_ids', question_id), result, position)
+             + self._answer_columns(user_id, question_id, answer)
+             for position, (question_id, answer) in enumerate(answers.items())])
+
+    def import_export(self, data):
+        """Replace the store's content with an export dict (as loaded from final.json)."""
+        with self._conn:
+            for table in _TABLES:
+                self._conn.execute(f'DELETE FROM {table}')
+            self._load_ids()
+
+            for position, (name, section) in enumerate(data.items()):
+                self._conn.execute('INSERT INTO sections VALUES (?, ?, ?)',
+                                   (name, position, None if name in _SECTIONS else _dumps(section)))
+
+            for position, (user_id, info) in enumerate(data.get('users', {}).items()):
+                email = info.get('email', 'N/A') if isinstance(info, dict) else None
+                self._conn.execute('INSERT INTO users VALUES (?, ?, ?, ?)',
+                                   (self._id('user_ids', user_id), position, email, _dumps(info)))
+
+            for position, (user_id, progress) in enumerate(data.get('examProgress', {}).items()):
+                user = self._id('user_ids', user_id)
+                entry, answers_at = _without_answers(progress)
+                submitted = isinstance(progress, dict) and progress.get('submitted') == True
+                self._conn.execute('INSERT INTO progress VALUES (?, ?, ?, ?, ?)',
+                                   (user, position, submitted, _dumps(entry), answers_at))
+                if answers_at is not None:
+                    self._insert_answers(user_id, 0, progress['answers'])
+
+            for position, (user_id, results) in enumerate(data.get('examResults', {}).items()):
+                user = self._id('user_ids', user_id)
+                raw = None if isinstance(results, dict) else _dumps(results)
+                self._conn.execute('INSERT INTO result_users VALUES (?, ?, ?)', (user, position, raw))
+                if raw is not None:
+                    continue
+                for result_position, (result_id, result) in enumerate(results.items()):
+                    entry, answers_at = _without_answers(result)
+                    result_key = self._conn.execute(
+                        'INSERT INTO results (user, position, result_id, data, answers_at) VALUES (?, ?, ?, ?, ?)',
+                        (user, result_position, result_id, _dumps(entry), answers_at)).lastrowid
+                    if answers_at is not None:
+                        self._insert_answers(user_id, result_key, result['answers'])
+
+    def update_answers(self, records):
+        """Write {(user_id, question_id): {field: value}} into every matching answer (progress and results).
+
+        Returns the number of answers updated.
+        """
+        assignments = ', '.join(f'{column} = ?' for column in _ANSWER_COLUMNS)
+        updated = 0
+        with self._conn:
+            for (user_id, question_id), fields in records.items():
+                user = self._ids['user_ids'].get(user_id)
+                question = self._ids['question_ids'].get(question_id)
+                rows = self._conn.execute(
+                    f'SELECT result, {", ".join(_ANSWER_COLUMNS)} FROM answers '
+                    'WHERE user = ? AND question = ? AND raw IS NULL', (user, question)).fetchall()
+                for result, *row in rows:
+                    answer = self._answer_from_row(user_id, question_id, row)
+                    answer.update(fields)
+                    self._conn.execute(
+                        f'UPDATE answers SET {assignments} WHERE user = ? AND question = ? AND result = ?',
+                        self._answer_columns(user_id, question_id, answer) + (user, question, result))
+                    updated += 1
+        return updated
+
+    # Reading
+
+    def _answers(self, user, result):
+        user_id = self._values['user_ids'][user]
+        questions = self._values['question_ids']
+        rows = self._conn.execute(
+            f'SELECT question, {", ".join(_ANSWER_COLUMNS)} FROM answers '
+            'WHERE user = ? AND result = ? ORDER BY position', (user, result))
+        return {questions[question]: self._answer_from_row(user_id, questions[question], row)
+                for question, *row in rows}
+
+    def _progress(self, user, data, answers_at):
+        return _with_answers(json.loads(data), answers_at, self._answers(user, 0) if answers_at is not None else None)
+
+    def _result(self, user, result, data, answers_at):
+        return _with_answers(json.loads(data), answers_at,
+                             self._answers(user, result) if answers_at is not None else None)
+
+    def _results(self, user, raw):
+        if raw is not None:
+            return json.loads(raw)
+        return {result_id: self._result(user, result, data, answers_at)
+                for result, result_id, data, answers_at in self._conn.execute(
+                    'SELECT id, result_id, data, answers_at FROM results WHERE user = ? ORDER BY position', (user,))}
+
+    def load_export(self):
+        """The whole export as a dict, equal to json.load of the original file."""
+        user_ids = self._values['user_ids']
+        data = {}
+        for name, section in self._conn.execute('SELECT name, data FROM sections ORDER BY position').fetchall():
+            if name == 'examProgress':
+                data[name] = {user_ids[user]: self._progress(user, entry, answers_at)
+                              for user, entry, answers_at in self._conn.execute(
+                                  'SELECT user, data, answers_at FROM progress ORDER BY position').fetchall()}
+            elif name == 'examResults':
+                data[name] = {user_ids[user]: self._results(user, raw) for user, raw in self._conn.execute(
+                    'SELECT user, raw FROM result_users ORDER BY position').fetchall()}
+            elif name == 'users':
+                data[name] = {user_ids[user]: json.loads(info) for user, info in self._conn.execute(
+                    'SELECT user, info FROM users ORDER BY position')}
+            else:
+                data[name] = json.loads(section)
+        return data
+
+    def user_data(self, user_id):
+        """(user_data, is_submitted) of one user, resolved like export_stream.iter_user_records."""
+        user = self._ids['user_ids'].get(user_id)
+        row = self._conn.execute('SELECT data, answers_at, submitted FROM progress WHERE user = ?', (user,)).fetchone()
+        if row is None:
+            return None, False
+        data, answers_at, submitted = row
+        if not submitted:
+            progress = self._progress(user, data, answers_at)
+            return (progress if isinstance(progress, dict) else {}), False
+        first = self._conn.execute(
+            'SELECT id, data, answers_at FROM results WHERE user = ? ORDER BY position LIMIT 1', (user,)).fetchone()
+        if first is None:
+            return None, True
+        return self._result(user, *first), True
+
+    def audio_answers(self):
+        """Only the audio answers, nested like the export (examProgress / examResults -> answers).
+
+        Enough for audio_answers.iter_audio_answers, in the same order as on the
+        full export; changes are written back with update_answers.
+        """
+        columns = ', '.join(f'a.{column}' for column in _ANSWER_COLUMNS)
+        has_audio = "(a.url_prefix IS NOT NULL OR instr(a.extra, '\"audioUrl\"') > 0)"
+        data = {'examProgress': {}, 'examResults': {}}
+        for user, question, *row in self._conn.execute(
+                f'SELECT a.user, a.question, {columns} FROM answers a JOIN progress p ON p.user = a.user '
+                f'WHERE a.result = 0 AND {has_audio} ORDER BY p.position, a.position'):
+            user_id, question_id = self._values['user_ids'][user], self._values['question_ids'][question]
+            answer = self._answer_from_row(user_id, question_id, row)
+            if isinstance(answer, dict) and 'audioUrl' in answer:
+                data['examProgress'].setdefault(user_id, {'answers': {}})['answers'][question_id] = answer
+        for user, result_id, question, *row in self._conn.execute(
+                f'SELECT a.user, r.result_id, a.question, {columns} FROM answers a JOIN results r ON r.id = a.result '
+                f'JOIN result_users ru ON ru.user = a.user '
+                f'WHERE {has_audio} ORDER BY ru.position, r.position, a.position'):
+            user_id, question_id = self._values['user_ids'][user], self._values['question_ids'][question]
+            answer = self._answer_from_row(user_id, question_id, row)
+            if isinstance(answer, dict) and 'audioUrl' in answer:
+                results = data['examResults'].setdefault(user_id, {})
+                results.setdefault(result_id, {'answers': {}})['answers'][question_id] = answer
+        return data
+
+    def iter_user_records(self):
+        """Yield (user_id, user_data, is_submitted, email) like generate_csv.load_user_records."""
+        user_ids = self._values['user_ids']
+        emails = dict(self._conn.execute('SELECT user, email FROM users WHERE email IS NOT NULL'))
+        for user, in self._conn.execute('SELECT user FROM progress ORDER BY position').fetchall():
+            user_data, is_submitted = self.user_data(user_ids[user])
+            yield user_ids[user], user_data, is_submitted, emails.get(user, 'N/A')
+
+
+def load_export(path):
+    """Export dict from a JSON file or a store."""
+    if is_store(path):
+        with ExportStore(path) as store:
+            return store.load_export()
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def json_to_store(json_path, store_path):
+    """Convert an export JSON file into a store (written to a temporary file, then renamed)."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    store_path = Path(store_path)
+    tmp_path = store_path.with_suffix(store_path.suffix + '.tmp')
+    if tmp_path.exists():
+        tmp_path.unlink()
+    with ExportStore(tmp_path) as store:
+        store.import_export(data)
+        store._conn.execute('VACUUM')
+    os.replace(tmp_path, store_path)
+
+
+def store_to_json(store_path, json_path):
+    """Convert a store back into the indent=2 export JSON."""
+    data = load_export(store_path)
+    tmp_path = Path(str(json_path) + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, json_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the exam export between JSON and the SQLite store.")
+    parser.add_argument('direction', choices=('to-store', 'to-json'))
+    parser.add_argument('source')
+    parser.add_argument('target')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.direction == 'to-store':
+        json_to_store(args.source, args.target)
+    else:
+        store_to_json(args.source, args.target)
+    elapsed = time.perf_counter() - start
+    print(f"{args.source} ({os.path.getsize(args.source) / 1024:.0f} KB) -> "
+          f"{args.target} ({os.path.getsize(args.target) / 1024:.0f} KB) in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Streaming reader for the Firebase export (final.json / final_with_transcriptions.json).
+
+Instead of json.load-ing the whole export, the file is scanned incrementally and
+only one user subtree is parsed at a time. A first pass records the byte offset
+of every examResults entry and the user emails; a second pass walks examProgress
+and resolves the examProgress -> examResults indirection by seeking to the
+recorded offset.
+"""
+
+import json
+import re
+
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = b' \t\r\n'
+_STRUCTURAL = re.compile(rb'["{}\[\]]')
+_STRING_END = re.compile(rb'["\\]')
+_SCALAR_END = re.compile(rb'[,}\]\s]')
+
+
+class JsonByteStream:
+    """Forward-only JSON tokenizer over a binary file, with absolute offsets."""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._offset = f.tell()  # absolute offset of _buf[0]
+        self._buf = b''
+        self._pos = 0
+
+    def tell(self):
+        """Absolute file offset of the next unread byte."""
+        return self._offset + self._pos
+
+    def _more(self, keep_from):
+        """Drop the buffer before keep_from and append a new chunk. Returns the shift."""
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            raise ValueError(f'Unexpected end of JSON export at offset {self._offset + len(self._buf)}')
+        self._offset += keep_from
+        self._buf = self._buf[keep_from:] + chunk
+        self._pos -= keep_from
+        return keep_from
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return
+            self._more(self._pos)
+
+    def peek(self):
+        """Next non-whitespace byte, without consuming it."""
+        self._skip_whitespace()
+        return self._buf[self._pos:self._pos + 1]
+
+    def expect(self, token):
+        found = self.peek()
+        if found != token:
+            raise ValueError(f'Expected {token!r} at offset {self.tell()}, found {found!r}')
+        self._pos += 1
+
+    def _scan_string(self, i):
+        """Return the index just past the string that starts at buf[i] (an opening quote)."""
+        i += 1
+        while True:
+            match = _STRING_END.search(self._buf, i)
+            if match is None or (match.group() == b'\\' and match.end() >= len(self._buf)):
+                i -= self._more(self._pos)
+                continue
+            if match.group() == b'\\':
+                i = match.end() + 1
+                continue
+            return match.end()
+
+    def _scan_value(self, keep):
+        """Return the end index of the value at the current position.
+
+        With keep=False the consumed part of the buffer is dropped while scanning,
+        so skipping a large subtree (e.g. all of examResults) needs constant memory.
+        """
+        self._skip_whitespace()
+        first = self._buf[self._pos:self._pos + 1]
+
+        if first == b'"':
+            return self._scan_string(self._pos)
+
+        if first not in (b'{', b'['):
+            while True:
+                match = _SCALAR_END.search(self._buf, self._pos)
+                if match is not None:
+                    return match.start()
+                self._more(self._pos)
+
+        depth = 0
+        i = self._pos
+        while True:
+            match = _STRUCTURAL.search(self._buf, i)
+            if match is None:
+                if not keep:
+                    self._pos = i = len(self._buf)
+                i -= self._more(self._pos)
+                continue
+            char = match.group()
+            i = match.end()
+            if char == b'"':
+                if not keep:
+                    self._pos = i - 1
+                i = self._scan_string(i - 1)
+            elif char in (b'{', b'['):
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return i
+
+    def read_value(self):
+        """Parse and consume the next JSON value."""
+        end = self._scan_value(keep=True)
+        value = json.loads(self._buf[self._pos:end])
+        self._pos = end
+        return value
+
+    def skip_value(self):
+        """Consume the next JSON value without materializing it."""
+        end = self._scan_value(keep=False)
+        self._pos = end
+
+    def iter_keys(self):
+        """Iterate over the keys of the object at the current position.
+
+        The caller must consume each value (read_value / skip_value) before
+        asking for the next key.
+        """
+        self.expect(b'{')
+        if self.peek() == b'}':
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != b'"':
+                raise ValueError(f'Expected object key at offset {self.tell()}')
+            end = self._scan_string(self._pos)
+            key = json.loads(self._buf[self._pos:end])
+            self._pos = end
+            self.expect(b':')
+            yield key
+            if self.peek() == b'}':
+                self._pos += 1
+                return
+            self.expect(b',')
+
+
+def scan_export(path):
+    """First pass: examResults offsets and user emails, without parsing examProgress.
+
+    Returns a dict with 'results' (user_id -> byte offset of examResults[user_id])
+    and 'emails' (user_id -> email).
+    """
+    result_offsets = {}
+    emails = {}
+
+    with open(path, 'rb') as f:
+        stream = JsonByteStream(f)
+        for section in stream.iter_keys():
+            if section == 'examResults':
+                for user_id in stream.iter_keys():
+                    stream.peek()
+                    result_offsets[user_id] = stream.tell()
+                    stream.skip_value()
+            elif section == 'users':
+                for user_id in stream.iter_keys():
+                    user_info = stream.read_value()
+                    if isinstance(user_info, dict):
+                        emails[user_id] = user_info.get('email', 'N/A')
+            else:
+                stream.skip_value()
+
+    return {'results': result_offsets, 'emails': emails}
+
+
+def _read_at(f, offset):
+    f.seek(offset)
+    return JsonByteStream(f).read_value()
+
+
+def iter_user_locations(path, index=None):
+    """Yield (user_id, user_data, is_submitted, offset) for every user in examProgress.
+
+    Same resolution as the old get_user_complete_data: submitted users are read
+    from their first examResults entry (None if it is missing), everybody else
+    from examProgress. offset is the byte offset of the value user_data was read
+    from (None when there is none), so read_user_data can read it again later
+    without keeping it.
+    """
+    if index is None:
+        index = scan_export(path)
+    result_offsets = index['results']
+
+    with open(path, 'rb') as f, open(path, 'rb') as results_file:
+        stream = JsonByteStream(f)
+        for section in stream.iter_keys():
+            if section != 'examProgress':
+                stream.skip_value()
+                continue
+
+            for user_id in stream.iter_keys():
+                stream.peek()
+                offset = stream.tell()
+                exam_progress = stream.read_value()
+                if not isinstance(exam_progress, dict):
+                    exam_progress = {}
+
+                if exam_progress.get('submitted') == True:
+                    offset = result_offsets.get(user_id)
+                    user_data = None if offset is None else _first_result(_read_at(results_file, offset))
+                    yield user_id, user_data, True, offset
+                else:
+                    yield user_id, exam_progress, False, offset
+
+
+def iter_user_records(path, index=None):
+    """Yield (user_id, user_data, is_submitted) for every user in examProgress (see iter_user_locations)."""
+    for user_id, user_data, is_submitted, _ in iter_user_locations(path, index):
+        yield user_id, user_data, is_submitted
+
+
+def read_user_data(path, offset, is_submitted):
+    """user_data of one user, read again from its offset (iter_user_locations)."""
+    if offset is None:
+        return None
+    with open(path, 'rb') as f:
+        value = _read_at(f, offset)
+    if is_submitted:
+        return _first_result(value)
+    return value if isinstance(value, dict) else {}
+
+
+def _first_result(exam_results):
+    for result_data in (exam_results or {}).values():
+        return result_data
+    return None
@@ -1,25 +1,274 @@
+import argparse
+import hashlib
 import json
 import csv
+import glob
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from collections import defaultdict
+from functools import partial
 
-def load_data():
-    """Încarcă datele din final_with_transcriptions.json (sau final.json dacă nu există)"""
-    # Încearcă să încarce fișierul cu transcripții
-    import os
+from export_stream import scan_export, iter_user_locations, read_user_data
+from export_store import ExportStore, is_store
+from streaming_stats import TimeStats
+
+# Seriile de timpi din summary.csv și percentilele raportate pentru fiecare
+TIME_SERIES = (('all', 'Overall'), ('Text', 'Text'), ('Audio', 'Audio'))
+TIME_PERCENTILES = (50, 90, 99)
+
+def get_data_path(data_path=None):
+    """Alege exportul: --data dacă e dat, altfel final_with_transcriptions.json (sau final.json dacă nu există)"""
+    if data_path:
+        print(f'Using {data_path}')
+        return data_path
+    # Preferă fișierul cu transcripții
     if os.path.exists('../data/final_with_transcriptions.json'):
         print('Using final_with_transcriptions.json (with audio transcriptions)')
-        with open('../data/final_with_transcriptions.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return '../data/final_with_transcriptions.json'
+    print('Using final.json (no transcriptions yet)')
+    return '../data/final.json'
+
+def expand_data_paths(data_spec):
+    """Exporturile din --data: un director (toate *.json și *.sqlite din el), un glob sau un singur fișier"""
+    if os.path.isdir(data_spec):
+        paths = [os.path.join(data_spec, name) for name in os.listdir(data_spec)
+                 if name.endswith(('.json', '.sqlite'))]
+    elif glob.has_magic(data_spec):
+        paths = glob.glob(data_spec)
+    else:
+        paths = [data_spec]
+    if not paths:
+        raise SystemExit(f'No exports found for {data_spec}')
+    return sorted(paths)
+
+def load_user_entries(data_path):
+    """Citește exportul în flux: un (user_id, user_data, is_submitted, email, location) pe rând.
+
+    Exportul nu mai e încărcat integral cu json.load - vezi export_stream.py.
+    Un export în format SQLite (export_store.py) e citit direct din tabele.
+    location spune de unde pot fi recitite datele userului (load_user_answers):
+    (data_path, offset-ul în JSON) sau (data_path, user_id) pentru un store.
+    """
+    if is_store(data_path):
+        with ExportStore(data_path) as store:
+            for user_id, user_data, is_submitted, email in store.iter_user_records():
+                yield user_id, user_data, is_submitted, email, (data_path, user_id)
+        return
+    index = scan_export(data_path)
+    emails = index['emails']
+    for user_id, user_data, is_submitted, offset in iter_user_locations(data_path, index):
+        yield user_id, user_data, is_submitted, emails.get(user_id, 'N/A'), (data_path, offset)
+
+def load_user_records(data_path):
+    """Citește exportul în flux: un (user_id, user_data, is_submitted, email) pe rând"""
+    for user_id, user_data, is_submitted, email, _ in load_user_entries(data_path):
+        yield user_id, user_data, is_submitted, email
+
+def parse_iso_timestamp(timestamp):
+    """Parsează un timestamp ISO (cu 'Z') o singură dată, la construirea indexului"""
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+def build_answer_record(question_id, answer):
+    """Record compact pentru un răspuns (doar câmpurile folosite în rapoarte)"""
+    is_audio = 'audioUrl' in answer
+    return {
+        'question_id': question_id,
+        'answer_type': 'Audio' if is_audio else 'Text',
+        'text': answer.get('text'),
+        'audio_url': answer.get('audioUrl', ''),
+        'transcription': answer.get('transcription', 'Not transcribed yet') if is_audio else '',
+        'time_ms': answer.get('timeToAnswerMs'),
+        'answered_at': answer.get('answeredAt', ''),
+        'displayed_at': answer.get('questionDisplayedAt', ''),
+        'audio_duration_ms': answer.get('audioQuestionDurationMs', 0),
+    }
+
+def build_answer_records(user_data):
+    """Răspunsurile unui user ca record-uri compacte, sortate după question_id"""
+    return [build_answer_record(question_id, answer)
+            for question_id, answer in sorted(((user_data or {}).get('answers') or {}).items())]
+
+# Store-urile SQLite deschise de load_user_answers, câte o conexiune per proces
+_open_stores = {}
+
+def load_user_answers(record):
+    """Răspunsurile unui user (build_answer_records), recitite din export la cerere prin record['location']"""
+    if not record['has_data']:
+        return []
+    data_path, where = record['location']
+    if is_store(data_path):
+        key = (os.getpid(), data_path)
+        if key not in _open_stores:
+            _open_stores[key] = ExportStore(data_path)
+        user_data, _ = _open_stores[key].user_data(where)
+    else:
+        user_data = read_user_data(data_path, where, record['submitted'])
+    return build_answer_records(user_data)
+
+def content_hash(value):
+    """Hash SHA-256 stabil (chei sortate) al unei valori JSON"""
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def build_user_record(user_id, user_data, is_submitted, email, location=None, time_stats=None):
+    """Normalizează datele unui user într-un record compact.
+    
+    Câmpurile care lipsesc din export rămân None, ca rapoartele să poată
+    decide în continuare ce rânduri scriu. content_hash acoperă subarborele
+    examProgress/examResults al userului, folosit la regenerarea incrementală.
+    Răspunsurile nu sunt păstrate: record-ul are doar numărătorile și timpii
+    din users.csv, iar rândurile din answers.csv sunt construite la cerere
+    (load_user_answers, prin location). Timpii de răspuns sunt adăugați în
+    time_stats, dacă e dat.
+    """
+    user_hash = content_hash([user_data, is_submitted, email])
+    if not user_data:
+        return {'user_id': user_id, 'email': email, 'status': 'No Data', 'submitted': is_submitted,
+                'has_data': False, 'content_hash': user_hash}
+    
+    answers = build_answer_records(user_data)
+    if time_stats is not None:
+        accumulate_answer_times(answers, time_stats)
+    times = [answer['time_ms'] for answer in answers if answer['time_ms'] is not None]
+    answered_at = [parse_iso_timestamp(answer['answered_at']).timestamp()
+                   for answer in answers if answer['answered_at']]
+    start_timestamp = user_data.get('startTimestamp')
+    return {
+        'user_id': user_id,
+        'email': email,
+        'content_hash': user_hash,
+        'location': location,
+        'status': 'Submitted' if is_submitted else 'In Progress',
+        'submitted': is_submitted,
+        'has_data': True,
+        'submission_time': parse_iso_timestamp(user_data['timestamp']) if 'timestamp' in user_data else None,
+        'start_time': datetime.fromtimestamp(start_timestamp / 1000) if start_timestamp is not None else None,
+        'answered_count': user_data.get('answeredCount'),
+        'total_questions': user_data.get('totalQuestions'),
+        'time_spent': user_data.get('timeSpent'),
+        'tab_change_count': user_data.get('tabChangeCount'),
+        'current_section': user_data.get('currentSection'),
+        'current_question_index': user_data.get('currentQuestionIndex'),
+        'audio_question_ids': user_data.get('audioQuestionIds'),
+        'written_question_ids': user_data.get('writtenQuestionIds'),
+        'text_answers': sum(1 for answer in answers if answer['text'] is not None),
+        'audio_answers': sum(1 for answer in answers if answer['answer_type'] == 'Audio'),
+        'time_count': len(times),
+        'time_sum_ms': sum(times),
+        'last_answered_at': max(answered_at, default=None),
+    }
+
+def build_user_index(user_entries, time_stats=None):
+    """Construiește într-o singură trecere indexul user_id -> record compact.
+    
+    user_entries vin din load_user_entries; timpii de răspuns sunt adăugați
+    în time_stats (dacă e dat) în aceeași trecere.
+    """
+    return {
+        user_id: build_user_record(user_id, user_data, is_submitted, email, location, time_stats)
+        for user_id, user_data, is_submitted, email, location in user_entries
+    }
+
+def record_timestamp(record):
+    """Momentul ultimei activități a unui user (secunde epoch): submit, start sau ultimul răspuns"""
+    if not record['has_data']:
+        return float('-inf')
+    moments = [moment.timestamp() for moment in (record['submission_time'], record['start_time']) if moment]
+    if record['last_answered_at'] is not None:
+        moments.append(record['last_answered_at'])
+    return max(moments, default=float('-inf'))
+
+def build_shard_index(data_path):
+    """Indexul de useri al unui singur export (un shard), construit independent - și într-un proces separat.
+    
+    Întoarce (user_index, user_times): user_times are acumulatorii de timpi ai
+    fiecărui user, ca procesul părinte să-i combine doar pe ai userilor păstrați.
+    """
+    user_index, user_times = {}, {}
+    for user_id, user_data, is_submitted, email, location in load_user_entries(data_path):
+        user_times[user_id] = new_time_stats()
+        user_index[user_id] = build_user_record(user_id, user_data, is_submitted, email, location,
+                                                user_times[user_id])
+    return user_index, user_times
+
+def merge_shard_indexes(shard_indexes):
+    """Combină indexurile shard-urilor: un user prezent în mai multe exporturi e păstrat o singură dată.
+    
+    Câștigă record-ul cu activitatea cea mai recentă (record_timestamp); la
+    egalitate, cel din exportul care vine ultimul în ordinea sortată.
+    Întoarce (user_index, shard_of: user_id -> indexul shard-ului păstrat, duplicate).
+    """
+    user_index, shard_of, latest = {}, {}, {}
+    duplicates = 0
+    for shard, shard_index in enumerate(shard_indexes):
+        for user_id, record in shard_index.items():
+            timestamp = record_timestamp(record)
+            if user_id in user_index:
+                duplicates += 1
+                if timestamp < latest[user_id]:
+                    continue
+            user_index[user_id] = record
+            shard_of[user_id] = shard
+            latest[user_id] = timestamp
+    return user_index, shard_of, duplicates
+
+def load_sharded_index(data_paths, jobs=1):
+    """Citește mai multe exporturi în paralel (câte un proces per shard) și le combină.
+    
+    Întoarce (user_index, time_stats): fiecare shard își calculează acumulatorii
+    de timpi per user, iar aici sunt combinați (merge_time_stats) doar cei ai
+    userilor păstrați din fiecare shard.
+    """
+    if jobs > 1 and len(data_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(data_paths))) as executor:
+            shards = list(executor.map(build_shard_index, data_paths))
     else:
-        print('Using final.json (no transcriptions yet)')
-        with open('../data/final.json', 'r', encoding='utf-8') as f:
+        shards = [build_shard_index(data_path) for data_path in data_paths]
+    for data_path, (shard_index, _) in zip(data_paths, shards):
+        print(f'  {data_path}: {len(shard_index)} users')
+    
+    user_index, shard_of, duplicates = merge_shard_indexes(shard_index for shard_index, _ in shards)
+    print(f'{len(user_index)} unique users from {len(data_paths)} exports ({duplicates} duplicates resolved)')
+    
+    time_stats = merge_time_stats(*(shards[shard_of[user_id]][1][user_id] for user_id in user_index))
+    return user_index, time_stats
+
+def load_manifest(manifest_path='../output/manifest.json'):
+    """Încarcă manifestul cu hash-urile per user de la rularea anterioară"""
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
             return json.load(f)
+    return {}
+
+def save_manifest(manifest, manifest_path='../output/manifest.json'):
+    """Salvează manifestul atomic (fișier temporar + rename)"""
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def split_changed_users(records, manifest, questions_hash, output_dir='../output/user_csvs'):
+    """Împarte userii în (schimbați, rânduri users.csv refolosite din manifest).
+    
+    Un user e regenerat dacă hash-ul datelor lui s-a schimbat, dacă s-a schimbat
+    questions_map sau dacă CSV-urile lui lipsesc de pe disc.
+    """
+    previous = manifest.get('users', {}) if manifest.get('questions_hash') == questions_hash else {}
+    changed = []
+    reused_rows = {}
+    for record in records:
+        entry = previous.get(record['user_id'])
+        summary_path = os.path.join(output_dir, record['user_id'], 'summary.csv')
+        if entry and entry['hash'] == record['content_hash'] and os.path.exists(summary_path):
+            reused_rows[record['user_id']] = entry['row']
+        else:
+            changed.append(record)
+    return changed, reused_rows
 
 def load_questions():
     """Încarcă maparea întrebărilor din questions_map.json"""
-    import os
     if os.path.exists('../data/questions_map.json'):
         with open('../data/questions_map.json', 'r', encoding='utf-8') as f:
             return json.load(f)
@@ -42,29 +291,10 @@ def seconds_to_time_format(seconds):
     secs = int(seconds % 60)
     return f"{minutes}:{secs:02d}"
 
-def get_user_complete_data(user_id, data):
-    """Obține datele complete pentru un user, fie din examProgress, fie din examResults"""
-    exam_progress = data.get('examProgress', {}).get(user_id, {})
-    
-    # Dacă userul are submitted: true în examProgress, caută datele în examResults
-    if exam_progress.get('submitted') == True:
-        exam_results = data.get('examResults', {}).get(user_id, {})
-        if exam_results:
-            # Ia primul result (există un ID sub user_id)
-            for result_id, result_data in exam_results.items():
-                return result_data, True  # True înseamnă că e submitted
-        return None, True
-    
-    return exam_progress, False
-
-def get_user_email(user_id, data):
-    """Obține emailul unui user din secțiunea users"""
-    users = data.get('users', {})
-    user_info = users.get(user_id, {})
-    return user_info.get('email', 'N/A')
-
-def create_user_csv(user_id, data, questions_map, output_dir='../output/user_csvs'):
+def create_user_csv(record, questions_map, output_dir='../output/user_csvs'):
     """Creează două CSV-uri pentru un user specific: summary.csv și answers.csv"""
+    user_id = record['user_id']
+    
     # Creează un folder pentru acest user
     user_folder = os.path.join(output_dir, user_id)
     os.makedirs(user_folder, exist_ok=True)
@@ -72,10 +302,7 @@ def create_user_csv(user_id, data, questions_map, output_dir='../output/user_csv
     summary_path = os.path.join(user_folder, 'summary.csv')
     answers_path = os.path.join(user_folder, 'answers.csv')
     
-    # Obține datele complete pentru user
-    user_data, is_submitted = get_user_complete_data(user_id, data)
-    
-    if not user_data:
+    if not record['has_data']:
         # Nu există date pentru acest user
         with open(summary_path, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
@@ -91,20 +318,18 @@ def create_user_csv(user_id, data, questions_map, output_dir='../output/user_csv
         writer.writerow(['Metric', 'Value'])
         
         # Email (din secțiunea users)
-        email = get_user_email(user_id, data)
-        writer.writerow(['Email', email])
+        writer.writerow(['Email', record['email']])
         
         # Timestamp final (dacă există)
-        if 'timestamp' in user_data:
-            submit_time = datetime.fromisoformat(user_data['timestamp'].replace('Z', '+00:00'))
-            writer.writerow(['Submission Time (Date/Time)', submit_time.strftime('%Y-%m-%d %H:%M:%S')])
+        if record['submission_time'] is not None:
+            writer.writerow(['Submission Time (Date/Time)', record['submission_time'].strftime('%Y-%m-%d %H:%M:%S')])
         
         # Rezultate
-        if 'answeredCount' in user_data:
-            writer.writerow(['Answered Count (Total)', user_data['answeredCount']])
-        if 'totalQuestions' in user_data:
-            total_questions = user_data['totalQuestions']
-            answered_count = user_data.get('answeredCount', 0)
+        if record['answered_count'] is not None:
+            writer.writerow(['Answered Count (Total)', record['answered_count']])
+        if record['total_questions'] is not None:
+            total_questions = record['total_questions']
+            answered_count = record['answered_count'] or 0
             unanswered = total_questions - answered_count
             
             writer.writerow(['Total Questions (Count)', total_questions])
@@ -114,68 +339,60 @@ def create_user_csv(user_id, data, questions_map, output_dir='../output/user_csv
         writer.writerow(['Correct Answers (Count)', ''])  # Gol pentru completare manuală
         writer.writerow(['Wrong Answers (Count)', ''])    # Gol pentru completare manuală
         
-        if 'timeSpent' in user_data:
-            time_spent_formatted = seconds_to_time_format(user_data['timeSpent'])
+        if record['time_spent'] is not None:
+            time_spent_formatted = seconds_to_time_format(record['time_spent'])
             writer.writerow(['Time Spent (mm:ss)', time_spent_formatted])
         
         # Informații generale (pentru userii in progress)
-        if 'startTimestamp' in user_data:
-            start_time = datetime.fromtimestamp(user_data['startTimestamp'] / 1000)
-            writer.writerow(['Start Time (Date/Time)', start_time.strftime('%Y-%m-%d %H:%M:%S')])
+        if record['start_time'] is not None:
+            writer.writerow(['Start Time (Date/Time)', record['start_time'].strftime('%Y-%m-%d %H:%M:%S')])
         
-        if 'currentSection' in user_data:
-            writer.writerow(['Current Section', user_data['currentSection']])
+        if record['current_section'] is not None:
+            writer.writerow(['Current Section', record['current_section']])
         
-        if 'currentQuestionIndex' in user_data:
-            writer.writerow(['Current Question Index', user_data['currentQuestionIndex']])
+        if record['current_question_index'] is not None:
+            writer.writerow(['Current Question Index', record['current_question_index']])
         
-        if 'tabChangeCount' in user_data:
-            writer.writerow(['Tab Change Count (Total)', user_data['tabChangeCount']])
+        if record['tab_change_count'] is not None:
+            writer.writerow(['Tab Change Count (Total)', record['tab_change_count']])
         
         # Întrebări audio și written
-        if 'audioQuestionIds' in user_data:
-            writer.writerow(['Audio Question IDs', ', '.join(user_data['audioQuestionIds'])])
+        if record['audio_question_ids'] is not None:
+            writer.writerow(['Audio Question IDs', ', '.join(record['audio_question_ids'])])
         
-        if 'writtenQuestionIds' in user_data:
-            writer.writerow(['Written Question IDs', ', '.join(user_data['writtenQuestionIds'])])
+        if record['written_question_ids'] is not None:
+            writer.writerow(['Written Question IDs', ', '.join(record['written_question_ids'])])
     
-    # Creează answers.csv
-    if 'answers' in user_data and user_data['answers']:
+    # Creează answers.csv (răspunsurile sunt recitite din export doar pentru acest user)
+    answers = load_user_answers(record)
+    if answers:
         with open(answers_path, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(['Question ID', 'Question Text', 'Answer Type', 'User Answer (Text)', 'Audio URL', 
                            'Transcription (Audio Answers)', 'Time to Answer (mm:ss)', 'Answered At (Timestamp)', 
                            'Question Displayed At (Timestamp)', 'Audio Question Duration (mm:ss)', 'Correct', 'Wrong'])
             
-            for question_id, answer in sorted(user_data['answers'].items()):
-                answer_type = 'Audio' if 'audioUrl' in answer else 'Text'
+            for answer in answers:
+                question_id = answer['question_id']
                 
                 # Obține textul întrebării
                 question_text = questions_map.get(question_id, 'N/A')
                 
                 # Pentru text - pune în coloana "User Answer (Text)"
                 # Pentru audio - pune URL și transcripție separate
-                user_text = answer.get('text', '') if 'text' in answer else ''
-                audio_url = answer.get('audioUrl', '')
-                transcription = answer.get('transcription', 'Not transcribed yet') if 'audioUrl' in answer else ''
-                
-                time_to_answer_ms = answer.get('timeToAnswerMs', 0)
-                time_to_answer = ms_to_time_format(time_to_answer_ms) if time_to_answer_ms else ''
-                answered_at = answer.get('answeredAt', '')
-                displayed_at = answer.get('questionDisplayedAt', '')
-                audio_duration_ms = answer.get('audioQuestionDurationMs', 0)
-                audio_duration = ms_to_time_format(audio_duration_ms) if audio_duration_ms else ''
+                time_to_answer = ms_to_time_format(answer['time_ms']) if answer['time_ms'] else ''
+                audio_duration = ms_to_time_format(answer['audio_duration_ms']) if answer['audio_duration_ms'] else ''
                 
                 writer.writerow([
                     question_id,
                     question_text,
-                    answer_type,
-                    user_text,
-                    audio_url,
-                    transcription,
+                    answer['answer_type'],
+                    answer['text'] if answer['text'] is not None else '',
+                    answer['audio_url'],
+                    answer['transcription'],
                     time_to_answer,
-                    answered_at,
-                    displayed_at,
+                    answer['answered_at'],
+                    answer['displayed_at'],
                     audio_duration,
                     '',  # Correct - empty for manual verification
                     ''   # Wrong - empty for manual verification
@@ -183,65 +400,189 @@ def create_user_csv(user_id, data, questions_map, output_dir='../output/user_csv
     
     print(f'Created CSVs for user: {user_id}')
 
-def create_statistics_csv(data, output_dir='../output/general_statistics'):
-    """Creează două CSV-uri separate cu statistici: summary.csv și users.csv"""
+def build_users_csv_row(record):
+    """Construiește rândul din users.csv pentru un user"""
+    if not record['has_data']:
+        return [
+            record['user_id'],
+            record['email'],
+            'No Data',
+            'N/A', 'N/A', 'N/A', '', '', 'N/A', 'N/A', 'N/A', 'N/A', 'N/A', 'N/A', 'N/A'
+        ]
+    
+    # Calculează Total Questions și Unanswered
+    total_questions = record['total_questions'] if record['total_questions'] is not None else 'N/A'
+    answered_count = record['answered_count'] if record['answered_count'] is not None else 0
+    unanswered = total_questions - answered_count if isinstance(total_questions, int) else 'N/A'
+    
+    # Contorizare răspunsuri (calculate la construirea indexului)
+    text_answers = record['text_answers']
+    audio_answers = record['audio_answers']
+    
+    # Timp mediu de răspuns
+    time_count = record['time_count']
+    avg_time_ms = record['time_sum_ms'] / time_count if time_count else 0
+    avg_time_formatted = ms_to_time_format(avg_time_ms) if time_count else 'N/A'
+    
+    # Tab changes
+    tab_changes = record['tab_change_count'] if record['tab_change_count'] is not None else 0
+    
+    # Time spent
+    time_spent = record['time_spent'] or 0
+    time_spent_formatted = seconds_to_time_format(time_spent) if time_spent > 0 else 'N/A'
+    
+    # Secțiune curentă
+    current_section = record['current_section'] if record['current_section'] is not None else 'N/A'
+    
+    # Submission time
+    if record['submission_time'] is not None:
+        submission_time = record['submission_time'].strftime('%Y-%m-%d %H:%M:%S')
+    else:
+        submission_time = 'N/A'
+    
+    return [
+        record['user_id'],
+        record['email'],
+        record['status'],
+        total_questions,
+        answered_count,
+        unanswered,
+        '',  # Correct - gol pentru completare manuală
+        '',  # Wrong - gol pentru completare manuală
+        text_answers,
+        audio_answers,
+        avg_time_formatted,
+        tab_changes,
+        time_spent_formatted,
+        current_section,
+        submission_time
+    ]
+
+def write_user_csvs(record, questions_map, output_dir='../output/user_csvs'):
+    """Scrie CSV-urile unui user și întoarce (user_id, rândul lui din users.csv)"""
+    create_user_csv(record, questions_map, output_dir)
+    return record['user_id'], build_users_csv_row(record)
+
+def create_user_csvs(records, questions_map, jobs=1, output_dir='../output/user_csvs'):
+    """Creează CSV-urile pentru toți userii, serial sau pe un pool de `jobs` procese.
+    
+    Întoarce dict user_id -> rândul din users.csv, calculat deja de workeri,
+    ca create_statistics_csv să nu-l mai calculeze încă o dată.
+    """
+    worker = partial(write_user_csvs, questions_map=questions_map, output_dir=output_dir)
+    if jobs <= 1:
+        return dict(map(worker, records))
+    
+    records = list(records)
+    os.makedirs(output_dir, exist_ok=True)
+    chunksize = max(1, len(records) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return dict(executor.map(worker, records, chunksize=chunksize))
+
+def new_time_stats():
+    """Acumulatori goi pentru seriile din TIME_SERIES ('all', 'Text', 'Audio')"""
+    return {key: TimeStats() for key, _ in TIME_SERIES}
+
+def accumulate_answer_times(answers, time_stats=None):
+    """Adaugă timpii de răspuns din answer records în acumulatori (fără liste de timpi).
+    
+    Un răspuns cu câmpul 'text' e Text chiar dacă are și audioUrl, ca în
+    summary.csv dintotdeauna; răspunsurile fără timp sunt ignorate.
+    """
+    time_stats = new_time_stats() if time_stats is None else time_stats
+    for answer in answers:
+        time_ms = answer['time_ms']
+        if time_ms is None:
+            continue
+        time_stats['all'].add(time_ms)
+        if answer['text'] is not None:
+            time_stats['Text'].add(time_ms)
+        elif answer['answer_type'] == 'Audio':
+            time_stats['Audio'].add(time_ms)
+    return time_stats
+
+def merge_time_stats(*parts):
+    """Combină acumulatorii mai multor bucăți (procese, exporturi) într-unul singur"""
+    merged = new_time_stats()
+    for part in parts:
+        for key, stats in part.items():
+            merged[key].merge(stats)
+    return merged
+
+def create_statistics_csv(records, output_dir='../output/general_statistics', time_stats=None, users_rows=None):
+    """Creează două CSV-uri separate cu statistici: summary.csv și users.csv
+    
+    records sunt record-urile compacte din indexul de useri (build_user_index),
+    parcurse o singură dată. Timpii de răspuns sunt agregați în flux
+    (streaming_stats.TimeStats: număr, sumă, min/max și sketch pentru
+    percentile); time_stats vine de obicei de la construirea indexului (sau
+    combinat din mai multe bucăți, merge_time_stats), altfel răspunsurile sunt
+    recitite user cu user. users_rows (user_id -> rând din users.csv) poate
+    veni de la create_user_csvs.
+    """
     
     # Creează folderul pentru statistici
     os.makedirs(output_dir, exist_ok=True)
     
-    exam_progress = data.get('examProgress', {})
+    accumulate_times = time_stats is None
+    if accumulate_times:
+        time_stats = new_time_stats()
     
     # Calculează mai întâi toate statisticile generale
-    total_users = len(exam_progress)
+    total_users = 0
     submitted_count = 0
     in_progress_count = 0
     
-    all_text_times = []
-    all_audio_times = []
-    all_times = []
-    all_tab_changes = []
-    total_text_answers = 0
-    total_audio_answers = 0
+    tab_changes_count = tab_changes_sum = 0
+    tab_changes_max = tab_changes_min = None
+    users_without_tab_changes = 0
     total_answered = 0
     total_time_spent = 0
     
+    # Rândurile din users.csv (câte unul scurt per user, sortate la final)
+    build_rows = users_rows is None
+    if build_rows:
+        users_rows = {}
+    
     # Colectează date pentru statistici
-    for user_id in exam_progress.keys():
-        user_data, is_submitted = get_user_complete_data(user_id, data)
+    for record in records:
+        total_users += 1
+        if build_rows:
+            users_rows[record['user_id']] = build_users_csv_row(record)
+        if accumulate_times:
+            accumulate_answer_times(load_user_answers(record), time_stats)
         
-        if not user_data:
+        if not record['has_data']:
             submitted_count += 1
             continue
         
-        if is_submitted:
+        if record['submitted']:
             submitted_count += 1
         else:
             in_progress_count += 1
         
-        answers = user_data.get('answers', {})
-        
-        # Tipuri de răspunsuri și timpi
-        for ans in answers.values():
-            if 'timeToAnswerMs' in ans:
-                time = ans['timeToAnswerMs']
-                all_times.append(time)
-                
-                if 'text' in ans:
-                    total_text_answers += 1
-                    all_text_times.append(time)
-                elif 'audioUrl' in ans:
-                    total_audio_answers += 1
-                    all_audio_times.append(time)
-        
         # Tab changes
-        if 'tabChangeCount' in user_data:
-            all_tab_changes.append(user_data['tabChangeCount'])
+        if record['tab_change_count'] is not None:
+            tab_changes = record['tab_change_count']
+            tab_changes_count += 1
+            tab_changes_sum += tab_changes
+            tab_changes_max = tab_changes if tab_changes_max is None else max(tab_changes_max, tab_changes)
+            tab_changes_min = tab_changes if tab_changes_min is None else min(tab_changes_min, tab_changes)
+            if tab_changes == 0:
+                users_without_tab_changes += 1
         
         # Răspunsuri
-        if 'answeredCount' in user_data:
-            total_answered += user_data['answeredCount']
-        if 'timeSpent' in user_data:
-            total_time_spent += user_data['timeSpent']
+        if record['answered_count'] is not None:
+            total_answered += record['answered_count']
+        if record['time_spent'] is not None:
+            total_time_spent += record['time_spent']
+    
+    # Tipuri de răspunsuri și timpi (din acumulatori)
+    times_count, times_sum = time_stats['all'].count, time_stats['all'].stats.total
+    text_times_count, text_times_sum = time_stats['Text'].count, time_stats['Text'].stats.total
+    audio_times_count, audio_times_sum = time_stats['Audio'].count, time_stats['Audio'].stats.total
+    total_text_answers = text_times_count
+    total_audio_answers = audio_times_count
     
     # 1. Creează summary.csv cu statistici generale
     summary_path = os.path.join(output_dir, 'summary.csv')
@@ -261,30 +602,37 @@ def create_statistics_csv(data, output_dir='../output/general_statistics'):
         writer.writerow([])
         
         # Statistici timp de răspuns
-        if all_times:
-            avg_overall_ms = sum(all_times) / len(all_times)
+        if times_count:
+            avg_overall_ms = times_sum / times_count
             writer.writerow(['Average Time to Answer - Overall (mm:ss)', ms_to_time_format(avg_overall_ms)])
-        if all_text_times:
-            avg_text_ms = sum(all_text_times) / len(all_text_times)
+        if text_times_count:
+            avg_text_ms = text_times_sum / text_times_count
             writer.writerow(['Average Time to Answer - Text (mm:ss)', ms_to_time_format(avg_text_ms)])
-        if all_audio_times:
-            avg_audio_ms = sum(all_audio_times) / len(all_audio_times)
+        if audio_times_count:
+            avg_audio_ms = audio_times_sum / audio_times_count
             writer.writerow(['Average Time to Answer - Audio (mm:ss)', ms_to_time_format(avg_audio_ms)])
-        if all_text_times and all_audio_times:
-            avg_text = sum(all_text_times) / len(all_text_times)
-            avg_audio = sum(all_audio_times) / len(all_audio_times)
+        if text_times_count and audio_times_count:
+            avg_text = text_times_sum / text_times_count
+            avg_audio = audio_times_sum / audio_times_count
             diff_ms = avg_audio - avg_text
             writer.writerow(['Audio takes longer than Text by (mm:ss)', ms_to_time_format(diff_ms)])
             writer.writerow(['Audio/Text Time Ratio', round(avg_audio / avg_text, 2)])
+        
+        # Percentile ale timpului de răspuns (din sketch, eroare relativă < 0.5%)
+        for key, label in TIME_SERIES:
+            if time_stats[key].count:
+                for percentile in TIME_PERCENTILES:
+                    writer.writerow([f'p{percentile} Time to Answer - {label} (mm:ss)',
+                                     ms_to_time_format(time_stats[key].quantile(percentile / 100))])
         writer.writerow([])
         
         # Statistici tab changes
-        if all_tab_changes:
-            writer.writerow(['Average Tab Changes per User (Count)', round(sum(all_tab_changes) / len(all_tab_changes), 2)])
-            writer.writerow(['Max Tab Changes (Count)', max(all_tab_changes)])
-            writer.writerow(['Min Tab Changes (Count)', min(all_tab_changes)])
-            writer.writerow(['Users with 0 Tab Changes (Count)', sum(1 for tc in all_tab_changes if tc == 0)])
-            writer.writerow(['Users with Tab Changes (Count)', sum(1 for tc in all_tab_changes if tc > 0)])
+        if tab_changes_count:
+            writer.writerow(['Average Tab Changes per User (Count)', round(tab_changes_sum / tab_changes_count, 2)])
+            writer.writerow(['Max Tab Changes (Count)', tab_changes_max])
+            writer.writerow(['Min Tab Changes (Count)', tab_changes_min])
+            writer.writerow(['Users with 0 Tab Changes (Count)', users_without_tab_changes])
+            writer.writerow(['Users with Tab Changes (Count)', tab_changes_count - users_without_tab_changes])
         writer.writerow([])
         
         # Statistici răspunsuri
@@ -325,94 +673,64 @@ def create_statistics_csv(data, output_dir='../output/general_statistics'):
         ])
         
         # Procesează fiecare user
-        for user_id in sorted(exam_progress.keys()):
-            user_data, is_submitted = get_user_complete_data(user_id, data)
-            
-            if not user_data:
-                email = get_user_email(user_id, data)
-                writer.writerow([
-                    user_id,
-                    email,
-                    'No Data',
-                    'N/A', 'N/A', 'N/A', '', '', 'N/A', 'N/A', 'N/A', 'N/A', 'N/A', 'N/A', 'N/A'
-                ])
-                continue
-            
-            email = get_user_email(user_id, data)
-            status = 'Submitted' if is_submitted else 'In Progress'
-            
-            # Calculează Total Questions și Unanswered
-            total_questions = user_data.get('totalQuestions', 'N/A')
-            answered_count = user_data.get('answeredCount', 0)
-            unanswered = total_questions - answered_count if isinstance(total_questions, int) else 'N/A'
-            
-            # Contorizare răspunsuri
-            answers = user_data.get('answers', {})
-            
-            text_answers = sum(1 for ans in answers.values() if 'text' in ans)
-            audio_answers = sum(1 for ans in answers.values() if 'audioUrl' in ans)
-            
-            # Timp mediu de răspuns
-            times = [ans.get('timeToAnswerMs', 0) for ans in answers.values() if 'timeToAnswerMs' in ans]
-            avg_time_ms = sum(times) / len(times) if times else 0
-            avg_time_formatted = ms_to_time_format(avg_time_ms) if times else 'N/A'
-            
-            # Tab changes
-            tab_changes = user_data.get('tabChangeCount', 0)
-            
-            # Time spent
-            time_spent = user_data.get('timeSpent', 0)
-            time_spent_formatted = seconds_to_time_format(time_spent) if time_spent > 0 else 'N/A'
-            
-            # Secțiune curentă
-            current_section = user_data.get('currentSection', 'N/A')
-            
-            # Submission time
-            if 'timestamp' in user_data:
-                submission_time = datetime.fromisoformat(user_data['timestamp'].replace('Z', '+00:00')).strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                submission_time = 'N/A'
-            
-            writer.writerow([
-                user_id,
-                email,
-                status,
-                total_questions,
-                answered_count,
-                unanswered,
-                '',  # Correct - gol pentru completare manuală
-                '',  # Wrong - gol pentru completare manuală
-                text_answers,
-                audio_answers,
-                avg_time_formatted,
-                tab_changes,
-                time_spent_formatted,
-                current_section,
-                submission_time
-            ])
+        for user_id in sorted(users_rows):
+            writer.writerow(users_rows[user_id])
     
     print(f'Created {users_path}')
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generează CSV-urile per user și statisticile generale.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Numărul de procese pentru CSV-urile per user și pentru shard-uri (default: 1, serial)')
+    parser.add_argument('--force', action='store_true',
+                        help='Regenerează toți userii, ignorând manifestul cu hash-uri')
+    parser.add_argument('--data', default=None,
+                        help='Exportul citit: JSON sau store .sqlite (export_store.py), sau mai multe exporturi '
+                             '(un director ori un glob, ex. "../data/sessions/*.json"); '
+                             'implicit final_with_transcriptions.json / final.json')
+    return parser.parse_args()
+
 def main():
     """Funcție principală"""
-    print('Loading data from final.json...')
-    data = load_data()
+    args = parse_args()
+    data_paths = expand_data_paths(args.data) if args.data else []
     
     print('Loading questions map...')
     questions_map = load_questions()
     print(f'Loaded {len(questions_map)} questions\n')
     
-    print('\nGenerating individual user CSVs...')
-    exam_progress = data.get('examProgress', {})
+    print('Building user index...')
+    time_stats = None
+    if len(data_paths) <= 1:
+        data_path = get_data_path(data_paths[0] if data_paths else None)
+        time_stats = new_time_stats()
+        user_index = build_user_index(load_user_entries(data_path), time_stats)
+    else:
+        print(f'Reading {len(data_paths)} exports ({args.jobs} job(s))...')
+        user_index, time_stats = load_sharded_index(data_paths, jobs=args.jobs)
     
-    for user_id in exam_progress.keys():
-        create_user_csv(user_id, data, questions_map)
+    # Regenerare incrementală: doar userii al căror hash s-a schimbat
+    questions_hash = content_hash(questions_map)
+    manifest = {} if args.force else load_manifest()
+    changed, users_rows = split_changed_users(user_index.values(), manifest, questions_hash)
     
-    print(f'\nTotal users processed: {len(exam_progress)}')
+    print(f'\nGenerating individual user CSVs ({args.jobs} job(s))...')
+    print(f'{len(changed)} changed, {len(users_rows)} unchanged since the last run')
+    users_rows.update(create_user_csvs(changed, questions_map, jobs=args.jobs))
+    
+    save_manifest({
+        'questions_hash': questions_hash,
+        'users': {
+            user_id: {'hash': user_index[user_id]['content_hash'], 'row': row}
+            for user_id, row in users_rows.items()
+        }
+    })
+    
+    print(f'\nTotal users processed: {len(user_index)}')
     
     print('\nGenerating statistics CSVs...')
-    create_statistics_csv(data)
+    create_statistics_csv(user_index.values(), time_stats=time_stats, users_rows=users_rows)
     
     print('\nAll CSVs generated successfully!')
     print(f'- Individual user CSVs: user_csvs/<user_id>/summary.csv and answers.csv')
@@ -420,6 +738,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
-if __name__ == '__main__':
-    main()
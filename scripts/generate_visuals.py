@@ -1,27 +1,43 @@
 #!/usr/bin/env python3
 """
-Generate visual statistics from general_statistics/summary.csv
+Generate visual statistics from the corrected CSV tree (manual_corrected_csvs/)
 Creates clear and simple visualizations for exam analysis.
+The tree is read once into a dataset (visuals_dataset.py) that every chart takes.
 """
 
-import csv
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import matplotlib
+matplotlib.use('Agg')  # files only; the worker processes render with Agg too
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import numpy as np
 from pathlib import Path
 
+import statistical_tests
+import summary_intervals
+from answer_table import EXCLUDED_USERS
+from visuals_dataset import load_dataset
+
 # Set style
-plt.style.use('seaborn-v0_8-darkgrid')
-plt.rcParams['figure.figsize'] = (12, 8)
-plt.rcParams['font.size'] = 11
+STYLE_SHEET = 'seaborn-v0_8-darkgrid'
+RC_PARAMS = {'figure.figsize': (12, 8), 'font.size': 11}
+plt.style.use(STYLE_SHEET)
+plt.rcParams.update(RC_PARAMS)
 
 # Paths
 BASE_DIR = Path(__file__).parent.parent
-SUMMARY_FILE = BASE_DIR / 'manual_corrected_csvs' / 'general_statistics' / 'summary.csv'
-USERS_FILE = BASE_DIR / 'manual_corrected_csvs' / 'general_statistics' / 'users.csv'
-USER_CSVS_DIR = BASE_DIR / 'manual_corrected_csvs' / 'user_csvs'
+CORRECTED_DIR = BASE_DIR / 'manual_corrected_csvs'
 VISUALS_DIR = BASE_DIR / 'visuals'
 VISUALS_DIR.mkdir(exist_ok=True)
+MANIFEST_FILE = VISUALS_DIR / 'manifest.json'
 
 # Colors
 COLOR_CORRECT = '#4CAF50'  # Green
@@ -31,20 +47,6 @@ COLOR_AUDIO = '#FF9800'    # Orange
 COLOR_PARTIAL = '#FFC107'  # Yellow
 
 
-def load_summary_data():
-    """Load data from summary.csv into a dictionary."""
-    data = {}
-    
-    with open(SUMMARY_FILE, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            metric = row['Metric']
-            value = row['Value']
-            data[metric] = value
-    
-    return data
-
-
 def parse_number(value):
     """Parse a number from a string, handling percentages and counts."""
     if isinstance(value, (int, float)):
@@ -66,116 +68,49 @@ def parse_number(value):
         return 0
 
 
-def load_user_pair_data():
-    """Load pair statistics from each user's summary.csv."""
-    users_pairs = []
-    
-    for user_dir in sorted(USER_CSVS_DIR.glob('*')):
-        if not user_dir.is_dir():
-            continue
-        
-        summary_file = user_dir / 'summary.csv'
-        if not summary_file.exists():
+# Precision of the values in summary.csv (mm:ss in whole seconds, percentages and ratios in hundredths)
+VALUE_PRECISION = {'count': 0, '%': 0.005, 'ratio': 0.005, 'mm:ss': 1}
+
+
+def interval_errors(dataset, metrics, values):
+    """Asymmetric error bars (2 x len(metrics)): the bootstrap intervals of dataset['intervals'] around values.
+
+    values are the plotted values of the metrics. The intervals are computed on
+    the same users, so each bootstrap estimate should be the plotted value up to
+    the precision of summary.csv. When it is not, or when an interval does not
+    contain its value, a warning is printed and that bar gets no error bar,
+    rather than the spread of another population.
+    """
+    errors = np.zeros((2, len(metrics)))
+    for i, (metric, value) in enumerate(zip(metrics, values)):
+        interval = dataset['intervals'].get(metric)
+        if interval is None:
             continue
-        
-        user_id = user_dir.name
-        correct_pairs = 0
-        wrong_pairs = 0
-        partial_pairs = 0
-        
-        with open(summary_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                metric = row.get('Metric', '')
-                value = row.get('Value', '0')
-                
-                if metric == 'Correct Pairs (Both Correct)':
-                    correct_pairs = int(value) if value.isdigit() else 0
-                elif metric == 'Wrong Pairs (Both Wrong)':
-                    wrong_pairs = int(value) if value.isdigit() else 0
-                elif metric == 'Partial Pairs (One Correct)':
-                    partial_pairs = int(value) if value.isdigit() else 0
-        
-        # Only include users with at least some graded pairs
-        if correct_pairs + wrong_pairs + partial_pairs > 0:
-            users_pairs.append({
-                'user_id': user_id,
-                'correct_pairs': correct_pairs,
-                'wrong_pairs': wrong_pairs,
-                'partial_pairs': partial_pairs,
-                'total_pairs': correct_pairs + wrong_pairs + partial_pairs
-            })
-    
-    return users_pairs
-
-
-def calculate_standard_vs_control_accuracy():
-    """Calculate separate accuracy metrics for standard and control questions."""
-    total_correct = 0
-    total_wrong = 0
-    standard_correct = 0
-    standard_wrong = 0
-    control_correct = 0
-    control_wrong = 0
-    
-    for user_dir in sorted(USER_CSVS_DIR.glob('*')):
-        if not user_dir.is_dir():
+        if not abs(interval['estimate'] - value) <= VALUE_PRECISION[interval['unit']] + 1e-9:
+            print(f"Warning: {metric}: bootstrap estimate {interval['estimate']:.4g} "
+                  f"does not match the plotted value {value:.4g}, no error bar drawn")
             continue
-        
-        answers_file = user_dir / 'answers.csv'
-        if not answers_file.exists():
+        if not interval['low'] <= value <= interval['high']:
+            print(f"Warning: {metric}: {value:.4g} is outside its interval "
+                  f"[{interval['low']:.4g}, {interval['high']:.4g}], no error bar drawn")
             continue
-        
-        with open(answers_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                question_id = row.get('Question ID', '')
-                
-                # Skip accommodation questions
-                if 'accomodation' in question_id:
-                    continue
-                
-                is_correct = 'x' in row.get('Correct', '').lower()
-                is_wrong = 'x' in row.get('Wrong', '').lower()
-                
-                # Count totals
-                if is_correct:
-                    total_correct += 1
-                if is_wrong:
-                    total_wrong += 1
-                
-                # Separate standard and control
-                if '_standard_' in question_id:
-                    if is_correct:
-                        standard_correct += 1
-                    if is_wrong:
-                        standard_wrong += 1
-                elif '_control_' in question_id:
-                    if is_correct:
-                        control_correct += 1
-                    if is_wrong:
-                        control_wrong += 1
-    
-    # Calculate accuracies
-    overall_accuracy = (total_correct / (total_correct + total_wrong) * 100) if (total_correct + total_wrong) > 0 else 0
-    core_accuracy = (standard_correct / (standard_correct + standard_wrong) * 100) if (standard_correct + standard_wrong) > 0 else 0
-    control_accuracy = (control_correct / (control_correct + control_wrong) * 100) if (control_correct + control_wrong) > 0 else 0
-    
-    return {
-        'overall_accuracy': overall_accuracy,
-        'overall_correct': total_correct,
-        'overall_wrong': total_wrong,
-        'core_accuracy': core_accuracy,
-        'core_correct': standard_correct,
-        'core_wrong': standard_wrong,
-        'control_accuracy': control_accuracy,
-        'control_correct': control_correct,
-        'control_wrong': control_wrong
-    }
+        errors[:, i] = (value - interval['low'], interval['high'] - value)
+    return errors
+
+
+def draw_error_bars(ax, bars, errors):
+    """Draw 95% bootstrap error bars on bars; returns the top of each bar + error (for the value labels)."""
+    centers = [bar.get_x() + bar.get_width() / 2. for bar in bars]
+    heights = np.array([bar.get_height() for bar in bars])
+    ax.errorbar(centers, heights, yerr=errors, fmt='none', ecolor='black', elinewidth=1.5, capsize=8,
+                zorder=3, label='95% bootstrap CI')
+    tops = heights + errors[1]
+    return tops + 0.015 * tops.max()  # a little above the cap
 
 
-def generate_overall_accuracy_chart(data):
+def generate_overall_accuracy_chart(dataset):
     """Chart 1: Overall Correct vs Wrong Answers."""
+    data = dataset['summary']
     correct = parse_number(data.get('Total Correct Answers (Count)', 0))
     wrong = parse_number(data.get('Total Wrong Answers (Count)', 0))
     accuracy = parse_number(data.get('Overall Accuracy (%)', 0))
@@ -187,18 +122,20 @@ def generate_overall_accuracy_chart(data):
     colors = [COLOR_CORRECT, COLOR_WRONG]
     
     bars = ax.bar(categories, values, color=colors, width=0.6, edgecolor='black', linewidth=2)
+    tops = draw_error_bars(ax, bars, interval_errors(
+        dataset, ['Total Correct Answers (Count)', 'Total Wrong Answers (Count)'], values))
     
     # Add value labels on bars
-    for bar, val in zip(bars, values):
-        height = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width()/2., height,
+    for bar, val, top in zip(bars, values, tops):
+        ax.text(bar.get_x() + bar.get_width()/2., top,
                 f'{int(val)}',
                 ha='center', va='bottom', fontsize=16, fontweight='bold')
     
     ax.set_ylabel('Number of Answers', fontsize=14, fontweight='bold')
     ax.set_title(f'Overall Accuracy: {accuracy:.1f}%\n(Correct vs Wrong Answers)', 
                  fontsize=16, fontweight='bold', pad=20)
-    ax.set_ylim(0, max(values) * 1.15)
+    ax.set_ylim(0, max(tops) * 1.15)
+    ax.legend(fontsize=11, loc='upper right')
     
     # Add grid
     ax.yaxis.grid(True, alpha=0.3)
@@ -210,8 +147,9 @@ def generate_overall_accuracy_chart(data):
     print("Generated: 1_overall_accuracy.png")
 
 
-def generate_text_vs_audio_chart(data):
+def generate_text_vs_audio_chart(dataset):
     """Chart 2: Text vs Audio Comparison."""
+    data = dataset['summary']
     text_correct = parse_number(data.get('Text Answers - Correct (Count)', 0))
     text_wrong = parse_number(data.get('Text Answers - Wrong (Count)', 0))
     audio_correct = parse_number(data.get('Audio Answers - Correct (Count)', 0))
@@ -234,11 +172,16 @@ def generate_text_vs_audio_chart(data):
     bars2 = ax.bar(x + width/2, wrong_vals, width, label='Wrong', 
                    color=COLOR_WRONG, edgecolor='black', linewidth=2)
     
+    tops1 = draw_error_bars(ax, bars1, interval_errors(
+        dataset, ['Text Answers - Correct (Count)', 'Audio Answers - Correct (Count)'], correct_vals))
+    tops2 = draw_error_bars(ax, bars2, interval_errors(
+        dataset, ['Text Answers - Wrong (Count)', 'Audio Answers - Wrong (Count)'], wrong_vals))
+    
     # Add value labels
-    for bars in [bars1, bars2]:
-        for bar in bars:
+    for bars, tops in [(bars1, tops1), (bars2, tops2)]:
+        for bar, top in zip(bars, tops):
             height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
+            ax.text(bar.get_x() + bar.get_width()/2., top,
                     f'{int(height)}',
                     ha='center', va='bottom', fontsize=14, fontweight='bold')
     
@@ -246,11 +189,12 @@ def generate_text_vs_audio_chart(data):
     ax.set_title('Text vs Audio Performance Comparison', fontsize=16, fontweight='bold', pad=20)
     ax.set_xticks(x)
     ax.set_xticklabels(categories, fontsize=13, fontweight='bold')
-    ax.legend(fontsize=12, loc='upper right')
+    handles, labels = ax.get_legend_handles_labels()
+    ax.legend(handles[:3], labels[:3], fontsize=12, loc='upper right')  # one CI entry
     
     # Set ylim to make room for accuracy text at bottom
     max_val = max(correct_vals + wrong_vals)
-    ax.set_ylim(-max_val * 0.12, max_val * 1.15)
+    ax.set_ylim(-max_val * 0.12, max(max(tops1), max(tops2)) * 1.15)
     
     # Add accuracy percentages below x-axis (using axis coordinates for better positioning)
     y_pos = -max_val * 0.08
@@ -271,8 +215,9 @@ def generate_text_vs_audio_chart(data):
     print("Generated: 2_text_vs_audio.png")
 
 
-def generate_accuracy_comparison_chart(data):
+def generate_accuracy_comparison_chart(dataset):
     """Chart 3: Accuracy Percentage Comparison."""
+    data = dataset['summary']
     overall_acc = parse_number(data.get('Overall Accuracy (%)', 0))
     text_acc = parse_number(data.get('Text Accuracy (%)', 0))
     audio_acc = parse_number(data.get('Audio Accuracy (%)', 0))
@@ -285,18 +230,19 @@ def generate_accuracy_comparison_chart(data):
     
     bars = ax.bar(categories, accuracies, color=colors, width=0.6, 
                   edgecolor='black', linewidth=2)
+    tops = draw_error_bars(ax, bars, interval_errors(
+        dataset, ['Overall Accuracy (%)', 'Text Accuracy (%)', 'Audio Accuracy (%)'], accuracies))
     
     # Add percentage labels
-    for bar, acc in zip(bars, accuracies):
-        height = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width()/2., height,
+    for bar, acc, top in zip(bars, accuracies, tops):
+        ax.text(bar.get_x() + bar.get_width()/2., top,
                 f'{acc:.1f}%',
                 ha='center', va='bottom', fontsize=18, fontweight='bold')
     
     ax.set_ylabel('Accuracy (%)', fontsize=14, fontweight='bold')
     ax.set_title('Accuracy Comparison Across Question Types', 
                  fontsize=16, fontweight='bold', pad=20)
-    ax.set_ylim(0, 100)
+    ax.set_ylim(0, max(100, max(tops) * 1.08))
     
     # Add horizontal line at 75%
     ax.axhline(y=75, color='red', linestyle='--', linewidth=2, alpha=0.5, label='75% threshold')
@@ -312,8 +258,9 @@ def generate_accuracy_comparison_chart(data):
     print("Generated: 3_accuracy_comparison.png")
 
 
-def generate_time_analysis_chart(data):
+def generate_time_analysis_chart(dataset):
     """Chart 4: Time Analysis."""
+    data = dataset['summary']
     def parse_time(time_str):
         """Convert mm:ss to seconds."""
         try:
@@ -334,20 +281,23 @@ def generate_time_analysis_chart(data):
     
     bars = ax.bar(categories, times, color=colors, width=0.6, 
                   edgecolor='black', linewidth=2)
+    tops = draw_error_bars(ax, bars, interval_errors(
+        dataset, ['Average Time to Answer - Overall (mm:ss)', 'Average Time to Answer - Text (mm:ss)',
+                  'Average Time to Answer - Audio (mm:ss)'], times))
     
     # Add time labels
-    for bar, time_sec in zip(bars, times):
-        height = bar.get_height()
+    for bar, time_sec, top in zip(bars, times, tops):
         minutes = time_sec // 60
         seconds = time_sec % 60
-        ax.text(bar.get_x() + bar.get_width()/2., height,
+        ax.text(bar.get_x() + bar.get_width()/2., top,
                 f'{minutes}:{seconds:02d}',
                 ha='center', va='bottom', fontsize=16, fontweight='bold')
     
     ax.set_ylabel('Average Time (seconds)', fontsize=14, fontweight='bold')
     ax.set_title('Average Time to Answer Questions', 
                  fontsize=16, fontweight='bold', pad=20)
-    ax.set_ylim(0, max(times) * 1.15)
+    ax.set_ylim(0, max(tops) * 1.3)
+    ax.legend(fontsize=11, loc='upper left')
     
     # Add grid
     ax.yaxis.grid(True, alpha=0.3)
@@ -365,11 +315,12 @@ def generate_time_analysis_chart(data):
     print("Generated: 4_time_analysis.png")
 
 
-def generate_pairs_overview_chart(users_pairs):
+def generate_pairs_overview_chart(dataset):
     """Chart 5: Pairs Analysis Overview."""
-    total_correct = sum(u['correct_pairs'] for u in users_pairs)
-    total_wrong = sum(u['wrong_pairs'] for u in users_pairs)
-    total_partial = sum(u['partial_pairs'] for u in users_pairs)
+    pairs = dataset['pairs']
+    total_correct = int(pairs['correct'].sum())
+    total_wrong = int(pairs['wrong'].sum())
+    total_partial = int(pairs['partial'].sum())
     
     fig, ax = plt.subplots(figsize=(10, 7))
     
@@ -410,11 +361,12 @@ def generate_pairs_overview_chart(users_pairs):
     print("Generated: 5_pairs_overview.png")
 
 
-def generate_pairs_pie_chart(users_pairs):
+def generate_pairs_pie_chart(dataset):
     """Chart 6: Pairs Distribution Pie Chart."""
-    total_correct = sum(u['correct_pairs'] for u in users_pairs)
-    total_wrong = sum(u['wrong_pairs'] for u in users_pairs)
-    total_partial = sum(u['partial_pairs'] for u in users_pairs)
+    pairs = dataset['pairs']
+    total_correct = int(pairs['correct'].sum())
+    total_wrong = int(pairs['wrong'].sum())
+    total_partial = int(pairs['partial'].sum())
     
     fig, ax = plt.subplots(figsize=(10, 8))
     
@@ -453,20 +405,21 @@ def generate_pairs_pie_chart(users_pairs):
     print("Generated: 6_pairs_pie_chart.png")
 
 
-def generate_user_pairs_performance(users_pairs):
+def generate_user_pairs_performance(dataset):
     """Chart 7: Top Users by Correct Pairs."""
-    # Sort by correct pairs
-    sorted_users = sorted(users_pairs, key=lambda x: x['correct_pairs'], reverse=True)[:10]
+    pairs = dataset['pairs']
+    # Sort by correct pairs (stable, so ties keep the user order)
+    top = np.argsort(-pairs['correct'], kind='stable')[:10]
     
-    if not sorted_users:
+    if not len(top):
         return
     
     fig, ax = plt.subplots(figsize=(12, 8))
     
-    user_labels = [u['user_id'][:15] + '...' for u in sorted_users]
-    correct = [u['correct_pairs'] for u in sorted_users]
-    partial = [u['partial_pairs'] for u in sorted_users]
-    wrong = [u['wrong_pairs'] for u in sorted_users]
+    user_labels = [user_id[:15] + '...' for user_id in pairs['user_id'][top]]
+    correct = pairs['correct'][top]
+    partial = pairs['partial'][top]
+    wrong = pairs['wrong'][top]
     
     x = np.arange(len(user_labels))
     width = 0.25
@@ -504,8 +457,9 @@ def generate_user_pairs_performance(users_pairs):
     print("Generated: 7_user_pairs_performance.png")
 
 
-def generate_three_accuracy_metrics_chart(accuracy_data):
+def generate_three_accuracy_metrics_chart(dataset):
     """Chart 8: Three Accuracy Metrics Comparison (Overall, Control, Core)."""
+    accuracy_data = dataset['accuracy']
     fig, ax = plt.subplots(figsize=(14, 8))
     
     # Extract data
@@ -521,11 +475,12 @@ def generate_three_accuracy_metrics_chart(accuracy_data):
     
     bars = ax.bar(categories, accuracies, color=colors, width=0.6, 
                   edgecolor='black', linewidth=2)
+    tops = draw_error_bars(ax, bars, interval_errors(
+        dataset, ['Standard + Control Accuracy (%)', 'Control Accuracy (%)', 'Core Accuracy (%)'], accuracies))
     
     # Add percentage labels on bars
-    for bar, acc in zip(bars, accuracies):
-        height = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width()/2., height,
+    for bar, acc, top in zip(bars, accuracies, tops):
+        ax.text(bar.get_x() + bar.get_width()/2., top,
                 f'{acc:.2f}%',
                 ha='center', va='bottom', fontsize=20, fontweight='bold')
     
@@ -545,7 +500,8 @@ def generate_three_accuracy_metrics_chart(accuracy_data):
     ax.set_ylabel('Accuracy (%)', fontsize=14, fontweight='bold')
     ax.set_title('Three Accuracy Metrics Comparison\n(Based on Question Type)', 
                  fontsize=17, fontweight='bold', pad=20)
-    ax.set_ylim(-8, 105)
+    ax.set_ylim(-8, max(105, max(tops) + 8))
+    ax.legend(fontsize=11, loc='upper right')
     
     # Add grid
     ax.yaxis.grid(True, alpha=0.3)
@@ -568,36 +524,336 @@ def generate_three_accuracy_metrics_chart(accuracy_data):
     plt.close()
     print("Generated: 8_three_accuracy_metrics.png")
 
+def significance_label(p):
+    """'p < 0.001 ***' / 'p < 0.01 **' / 'p < 0.05 *' / 'Not significant'."""
+    if p < 0.001:
+        return 'p < 0.001 ***'
+    if p < 0.01:
+        return 'p < 0.01 **'
+    if p < 0.05:
+        return 'p < 0.05 *'
+    return 'Not significant'
+
+
+SIGNIFICANCE_COLORS = {'***': '#C8E6C9', '**': '#FFF9C4', '*': '#FFF9C4'}
+
+
+def significance_color(label):
+    return SIGNIFICANCE_COLORS.get(label.rsplit(' ', 1)[-1], '#FFCDD2')
+
+
+def paired_conclusion(row, difference):
+    """Plain-language outcome of a Text - Audio difference at p < 0.05."""
+    p = row['t_p'] if difference == 'mean_diff' else row['wilcoxon_p']
+    if not p < 0.05:
+        return 'No difference'
+    if row['metric'] == 'time':
+        return 'Audio slower' if row[difference] < 0 else 'Text slower'
+    return 'Text higher' if row[difference] > 0 else 'Audio higher'
+
+
+def paired_rows_of(dataset, grouping='all'):
+    """Paired test results of one question grouping, keyed by metric."""
+    return {row['metric']: row for row in dataset['tests']['paired'] if row['grouping'] == grouping}
+
+
+def draw_table_chart(title, formula, formula_note, header, rows, header_color, filename,
+                     subtitle=None, notes=()):
+    """Table-style chart: title, formula box, one table and explanation boxes.
+
+    rows: list of (cells, colors), colors None or one face color per cell.
+    notes: (x, text, face color, edge color) boxes along the bottom.
+    """
+    fig = plt.figure(figsize=(14, 10.5))
+    fig.text(0.5, 0.96, title, ha='center', va='top', fontsize=18, fontweight='bold')
+    if subtitle:
+        fig.text(0.5, 0.92, subtitle, ha='center', va='top', fontsize=13, style='italic', color='#555555')
+    fig.text(0.5, 0.83, formula, ha='center', va='center', fontsize=22,
+             bbox=dict(boxstyle='round,pad=0.8', facecolor='lightyellow', edgecolor='black', linewidth=2))
+    fig.text(0.5, 0.72, formula_note, ha='center', va='center', fontsize=11, style='italic')
+
+    ax = fig.add_axes([0.03, 0.3, 0.94, 0.36])
+    ax.axis('off')
+    table = ax.table(cellText=[cells for cells, _ in rows], colLabels=header, cellLoc='center', loc='center',
+                     bbox=[0, 0, 1, 1])
+    table.auto_set_font_size(False)
+    table.set_fontsize(10)
+    for column in range(len(header)):
+        cell = table[0, column]
+        cell.set_facecolor(header_color)
+        cell.set_text_props(color='white', fontweight='bold')
+    for row_index, (_, colors) in enumerate(rows, start=1):
+        for column in range(len(header)):
+            face = colors[column] if colors else '#F0F0F0'
+            table[row_index, column].set_facecolor(face or ('white' if row_index % 2 else '#F8F8F8'))
+
+    for x, text, face, edge in notes:
+        fig.text(x, 0.26, text, ha='center', va='top', fontsize=10,
+                 bbox=dict(boxstyle='round,pad=0.6', facecolor=face, edgecolor=edge, linewidth=1.5))
+
+    plt.savefig(VISUALS_DIR / filename, dpi=300, bbox_inches='tight')
+    plt.close()
+    print(f"Generated: {filename}")
+
+
+def generate_shapiro_wilk_chart(dataset):
+    """Chart 9: Shapiro-Wilk normality of the per-user Text/Audio metrics."""
+    normality = {(row['metric'], row['answer_type']): row
+                 for row in dataset['tests']['normality'] if row['grouping'] == 'all'}
+    labels = {'accuracy': 'Accuracy (%)', 'time': 'Response Time (s)'}
+    rows = []
+    for metric in ('accuracy', 'time'):
+        for answer_type in ('Text', 'Audio'):
+            row = normality[(metric, answer_type)]
+            normal = row['p'] > 0.05
+            rows.append(([f"{answer_type} {labels[metric]}",
+                          f"{row['w']:.4f} ({'High' if row['w'] >= 0.9 else 'Low'})",
+                          f"{row['p']:.4f}", str(row['n']),
+                          'Normal' if normal else 'Not Normal',
+                          'Parametric (t-test)' if normal else 'Non-parametric (Wilcoxon)'],
+                         [None, None, None, None, '#C8E6C9' if normal else '#FFCDD2', None]))
+
+    draw_table_chart(
+        'Shapiro-Wilk Normality Test Results',
+        r'$W = \frac{(\sum_{i=1}^{n} a_i x_{(i)})^2}{\sum_{i=1}^{n} (x_i - \bar{x})^2}$',
+        'where x(i) = ordered sample values, x̄ = sample mean, ai = constants from normal distribution',
+        ['METRIC', 'W STATISTIC', 'P-VALUE', 'N', 'NORMALITY', 'RECOMMENDED TEST'],
+        rows, COLOR_TEXT, '9_shapiro_wilk_test.png',
+        notes=[(0.5, 'Interpretation:\n- W close to 1 = data follows normal distribution\n'
+                     '- p > 0.05 = fail to reject normality (use parametric tests)\n'
+                     '- p <= 0.05 = reject normality (use non-parametric tests)', 'lightblue', 'black')])
+
+
+def generate_paired_t_test_chart(dataset):
+    """Chart 10: Paired t-test Text vs Audio, with permutation p and bootstrap CI."""
+    paired = paired_rows_of(dataset)
+    tests = dataset['tests']
+    rows = []
+    for metric, label, unit in (('accuracy', 'Accuracy (%)', '%'), ('time', 'Response Time (s)', 's')):
+        row = paired[metric]
+        significance = significance_label(row['t_p'])
+        rows.append(([label, f"{row['t']:.4f}", f"{row['t_p']:.4f}", f"{row['permutation_p']:.4f}",
+                      f"{row['mean_diff']:.2f}{unit}", f"[{row['ci_low']:.2f}, {row['ci_high']:.2f}]{unit}",
+                      str(row['n']), significance, paired_conclusion(row, 'mean_diff')],
+                     [None] * 7 + [significance_color(significance), None]))
+        rows.append((['', f"Text: {row['text_mean']:.2f}{unit}", f"Audio: {row['audio_mean']:.2f}{unit}",
+                      '', '', '', '', '', ''], None))
+
+    draw_table_chart(
+        'Paired t-test Results: Text vs Audio Comparison',
+        r'$t = \frac{\bar{d}}{s_d / \sqrt{n}}$',
+        'where d̄ = mean of within-subject differences, sd = standard deviation of differences, '
+        'n = paired observations',
+        ['METRIC', 't-STATISTIC', 'P-VALUE', 'PERM. P', 'MEAN DIFF', '95% CI', 'N', 'SIGNIFICANCE', 'CONCLUSION'],
+        rows, COLOR_TEXT, '10_paired_t_test.png',
+        notes=[(0.5, 'Interpretation:\n- Paired t-test compares the same participants on two conditions (Text vs Audio)\n'
+                     '- Positive mean difference = Text scores higher\n'
+                     f"- PERM. P: sign-flip permutation test; 95% CI: bootstrap over users "
+                     f"({tests['n_resamples']} resamples, seed {tests['seed']})\n"
+                     '- * p<0.05, ** p<0.01, *** p<0.001', 'lightblue', 'black')])
+
+
+def generate_wilcoxon_chart(dataset):
+    """Chart 11: Wilcoxon signed-rank test Text vs Audio."""
+    paired = paired_rows_of(dataset)
+    rows = []
+    for metric, label, unit in (('accuracy', 'Accuracy (%)', '%'), ('time', 'Response Time (s)', 's')):
+        row = paired[metric]
+        significance = significance_label(row['wilcoxon_p'])
+        rows.append(([label, f"{row['wilcoxon_w']:.1f}", f"{row['wilcoxon_p']:.4f}",
+                      f"{row['median_diff']:.2f}{unit}", str(row['n']), significance,
+                      paired_conclusion(row, 'median_diff')],
+                     [None] * 5 + [significance_color(significance), None]))
+        rows.append((['', f"Text median: {row['text_median']:.2f}{unit}",
+                      f"Audio median: {row['audio_median']:.2f}{unit}", '', '', '', ''], None))
+
+    draw_table_chart(
+        'Wilcoxon Signed-Rank Test Results: Text vs Audio',
+        r'$W = \sum_{i=1}^{n} \mathrm{sign}(d_i) \cdot R_i$',
+        'where di = difference between paired observations, Ri = rank of |di|, n = non-zero differences',
+        ['METRIC', 'W STATISTIC', 'P-VALUE', 'MEDIAN DIFF', 'N', 'SIGNIFICANCE', 'CONCLUSION'],
+        rows, '#FF5722', '11_wilcoxon_test.png',
+        subtitle='(Non-parametric alternative when normality is violated)',
+        notes=[(0.27, 'Interpretation:\n- Wilcoxon test is used when paired\ndifferences are NOT normally distributed\n'
+                      '- Tests if median difference differs\nsignificantly from zero\n'
+                      '- Uses ranks instead of raw values\n(more robust to outliers)\n'
+                      '- p < 0.05 = statistically significant', '#FFCCBC', 'black'),
+               (0.73, 'WHEN TO USE:\n\nT-TEST:\n- Shapiro-Wilk p > 0.05\n- Differences are normally distributed\n'
+                      '- Uses means\n\nWILCOXON:\n- Shapiro-Wilk p <= 0.05\n'
+                      '- Differences are NOT normally distributed\n- Uses medians and ranks',
+                '#E0F7FA', COLOR_TEXT)])
+
+
+# The bootstrap intervals and the significance tests are fingerprinted by what they are computed
+# from (per-user matrices and the module that resamples them), so checking the cache never runs them.
+
+def interval_inputs(dataset):
+    user_ids, components, extremes = summary_intervals.user_components(dataset['answers'], dataset['users'])
+    return {'users': list(user_ids), 'components': components.tolist(), 'extremes': extremes.tolist(),
+            'source': inspect.getsource(summary_intervals)}
+
+
+def test_inputs(dataset):
+    columns, values = statistical_tests.user_metrics(dataset['answers'])
+    return {'columns': columns, 'values': values.tolist(), 'source': inspect.getsource(statistical_tests)}
+
+
+def summary_inputs(*metrics):
+    """Input extractor: the listed summary.csv metrics, with what their bootstrap intervals are computed from."""
+    return lambda dataset: {'summary': [dataset['summary'].get(metric) for metric in metrics],
+                            'intervals': interval_inputs(dataset)}
+
+
+def pair_totals(dataset):
+    return {name: int(dataset['pairs'][name].sum()) for name in ('correct', 'wrong', 'partial')}
+
+
+def pair_counts(dataset):
+    return {name: values.tolist() for name, values in dataset['pairs'].items()}
+
+
+def accuracy_inputs(dataset):
+    return {'accuracy': dataset['accuracy'], 'intervals': interval_inputs(dataset)}
+
+
+# (render function, output file, extractor of the dataset values the chart is drawn from)
+CHARTS = (
+    (generate_overall_accuracy_chart, '1_overall_accuracy.png',
+     summary_inputs('Total Correct Answers (Count)', 'Total Wrong Answers (Count)', 'Overall Accuracy (%)')),
+    (generate_text_vs_audio_chart, '2_text_vs_audio.png',
+     summary_inputs('Text Answers - Correct (Count)', 'Text Answers - Wrong (Count)',
+                    'Audio Answers - Correct (Count)', 'Audio Answers - Wrong (Count)',
+                    'Text Accuracy (%)', 'Audio Accuracy (%)')),
+    (generate_accuracy_comparison_chart, '3_accuracy_comparison.png',
+     summary_inputs('Overall Accuracy (%)', 'Text Accuracy (%)', 'Audio Accuracy (%)')),
+    (generate_time_analysis_chart, '4_time_analysis.png',
+     summary_inputs('Average Time to Answer - Overall (mm:ss)', 'Average Time to Answer - Text (mm:ss)',
+                    'Average Time to Answer - Audio (mm:ss)', 'Audio/Text Time Ratio')),
+    (generate_pairs_overview_chart, '5_pairs_overview.png', pair_totals),
+    (generate_pairs_pie_chart, '6_pairs_pie_chart.png', pair_totals),
+    (generate_user_pairs_performance, '7_user_pairs_performance.png', pair_counts),
+    (generate_three_accuracy_metrics_chart, '8_three_accuracy_metrics.png', accuracy_inputs),
+    (generate_shapiro_wilk_chart, '9_shapiro_wilk_test.png', test_inputs),
+    (generate_paired_t_test_chart, '10_paired_t_test.png', test_inputs),
+    (generate_wilcoxon_chart, '11_wilcoxon_test.png', test_inputs),
+)
+
+# Lazy dataset entries (visuals_dataset.Dataset) -> the charts that read them
+LAZY_ENTRIES = {'intervals': (1, 2, 3, 4, 8), 'tests': (9, 10, 11)}
+
+
+def chart_fingerprint(number, dataset):
+    """SHA-256 of everything chart `number` depends on.
+
+    That is its input values, the source of its render function (and of the
+    module helpers it calls) and the shared style (style sheet, rcParams,
+    colors, matplotlib version). Editing one chart's styling changes only that
+    chart's fingerprint.
+    """
+    generate_chart, _, inputs = CHARTS[number - 1]
+    helpers = [globals()[name] for name in generate_chart.__code__.co_names
+               if inspect.isfunction(globals().get(name)) and globals()[name].__module__ == __name__]
+    payload = {
+        'inputs': inputs(dataset),
+        'source': [inspect.getsource(function) for function in [generate_chart] + helpers],
+        'style': [STYLE_SHEET, RC_PARAMS, COLOR_CORRECT, COLOR_WRONG, COLOR_TEXT, COLOR_AUDIO, COLOR_PARTIAL,
+                  matplotlib.__version__],
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def load_manifest(manifest_path=MANIFEST_FILE):
+    """Output file -> fingerprint of the data it was rendered from."""
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_FILE):
+    """Save the manifest atomically (temporary file + rename)."""
+    tmp_path = manifest_path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def render_chart(number, dataset):
+    """Render chart `number` (1-based position in CHARTS); returns (number, seconds)."""
+    start = time.perf_counter()
+    CHARTS[number - 1][0](dataset)
+    return number, time.perf_counter() - start
+
+
+def render_charts(numbers, dataset, jobs=1):
+    """Render the charts serially or on a pool of `jobs` processes; [(number, seconds)] in order."""
+    worker = partial(render_chart, dataset=dataset)
+    if jobs <= 1 or len(numbers) <= 1:
+        return list(map(worker, numbers))
+    # Compute the lazy entries these charts read once, here, rather than in every worker
+    for key, charts in LAZY_ENTRIES.items():
+        if set(charts) & set(numbers):
+            dataset[key]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(numbers))) as executor:
+        return list(executor.map(worker, numbers))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate the statistics charts into visuals/.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of processes rendering charts in parallel (default: 1, serial)')
+    parser.add_argument('--charts', type=int, nargs='+', metavar='N',
+                        help=f'Only render these charts (1-{len(CHARTS)}, default: all)')
+    parser.add_argument('--force', action='store_true',
+                        help='Re-render the charts even if their fingerprint in visuals/manifest.json is unchanged')
+    args = parser.parse_args()
+    invalid = [n for n in args.charts or () if not 1 <= n <= len(CHARTS)]
+    if invalid:
+        parser.error(f"unknown chart number(s): {', '.join(map(str, invalid))} (valid: 1-{len(CHARTS)})")
+    return args
+
 
 def main():
     """Main function to generate all visualizations."""
+    args = parse_args()
+    numbers = sorted(set(args.charts)) if args.charts else list(range(1, len(CHARTS) + 1))
+    
     print("\n" + "="*60)
     print("  GENERATING STATISTICS VISUALIZATIONS")
     print("="*60 + "\n")
     
-    print("Loading data from summary.csv...")
-    data = load_summary_data()
-    print(f"Loaded {len(data)} metrics\n")
-    
-    print("Loading user pair statistics...")
-    users_pairs = load_user_pair_data()
-    print(f"Loaded pair data for {len(users_pairs)} users\n")
-    
-    print("Calculating standard vs control accuracy...")
-    accuracy_metrics = calculate_standard_vs_control_accuracy()
+    print(f"Loading {CORRECTED_DIR} (single pass)...")
+    dataset = load_dataset(CORRECTED_DIR, EXCLUDED_USERS)
+    accuracy_metrics = dataset['accuracy']
+    print(f"Loaded {len(dataset['summary'])} metrics, {len(dataset['answers'])} answers, "
+          f"pair data for {len(dataset['pairs']['user_id'])} users")
     print(f"Overall: {accuracy_metrics['overall_accuracy']:.2f}%, Control: {accuracy_metrics['control_accuracy']:.2f}%, Core: {accuracy_metrics['core_accuracy']:.2f}%\n")
     
-    print("Generating charts...\n")
-    
-    # Generate all charts
-    generate_overall_accuracy_chart(data)
-    generate_text_vs_audio_chart(data)
-    generate_accuracy_comparison_chart(data)
-    generate_time_analysis_chart(data)
-    generate_pairs_overview_chart(users_pairs)
-    generate_pairs_pie_chart(users_pairs)
-    generate_user_pairs_performance(users_pairs)
-    generate_three_accuracy_metrics_chart(accuracy_metrics)
+    # Render cache: skip charts whose fingerprint matches the manifest and whose PNG exists
+    manifest = {} if args.force else load_manifest()
+    fingerprints = {number: chart_fingerprint(number, dataset) for number in numbers}
+    unchanged = [number for number in numbers
+                 if manifest.get(CHARTS[number - 1][1]) == fingerprints[number]
+                 and (VISUALS_DIR / CHARTS[number - 1][1]).exists()]
+    numbers = [number for number in numbers if number not in unchanged]
+    for number in unchanged:
+        print(f"Unchanged: {CHARTS[number - 1][1]}")
+    
+    print(f"Generating {len(numbers)} chart(s) ({args.jobs} job(s)), {len(unchanged)} unchanged...\n")
+    
+    start = time.perf_counter()
+    timings = render_charts(numbers, dataset, jobs=args.jobs)
+    elapsed = time.perf_counter() - start
+    
+    manifest.update({CHARTS[number - 1][1]: fingerprints[number] for number in numbers})
+    save_manifest(manifest)
+    
+    if timings:
+        print("\nRender time per chart:")
+        for number, seconds in timings:
+            print(f"  {number}. {CHARTS[number - 1][0].__name__}: {seconds:.2f}s")
+        print(f"Total: {elapsed:.2f}s wall clock, {sum(seconds for _, seconds in timings):.2f}s summed over charts")
     
     print("\n" + "="*60)
     print(f"All visualizations saved to: {VISUALS_DIR}")
@@ -81,6 +81,82 @@ def parse_exam_questions():
     
     return questions
 
+def parse_question_details():
+    """Parse examQuestions.ts și extrage tipul, răspunsurile așteptate și opțiunile fiecărei întrebări
+    
+    Returnează {question_id: {'type': ..., 'answers': [...], 'options': [...]}}.
+    Listele answers/options pot fi pe aceeași linie sau pe mai multe linii.
+    """
+    
+    with open('../data/examQuestions.ts', 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    
+    details = {}
+    current_section = None
+    current = None  # detaliile întrebării curente
+    open_array = None  # (câmp, text acumulat) pentru o listă pe mai multe linii
+    
+    for line in lines:
+        # Continuă o listă începută pe o linie anterioară
+        if open_array:
+            field, text = open_array
+            text += line
+            if ']' in line:
+                current[field] = re.findall(r'"([^"]*)"', text.split(']')[0])
+                open_array = None
+            else:
+                open_array = (field, text)
+            continue
+        
+        section_match = re.match(r'\s*(section\d+_\w+):\s*\{', line)
+        if section_match:
+            current_section = section_match.group(1)
+            current = None
+            continue
+        
+        question_match = re.match(r'\s*(Q\d+)\s*:\s*\{', line)
+        if question_match and current_section:
+            current = {'type': None, 'answers': [], 'options': []}
+            details[f"{current_section}_{question_match.group(1)}"] = current
+        
+        if current is None:
+            continue
+        
+        type_match = re.search(r'type:\s*"(\w+)"', line)
+        if type_match:
+            current['type'] = type_match.group(1)
+        
+        for field in ('answers', 'options'):
+            array_match = re.search(field + r':\s*\[(.*)', line)
+            if not array_match:
+                continue
+            if ']' in array_match.group(1):
+                current[field] = re.findall(r'"([^"]*)"', array_match.group(1).split(']')[0])
+            else:
+                open_array = (field, array_match.group(1))
+    
+    return details
+
+def build_question_prompts(questions=None, details=None):
+    """Construiește un prompt scurt pentru Whisper pentru fiecare întrebare
+    
+    Promptul conține textul întrebării (tts_text dacă există) urmat de răspunsurile
+    și opțiunile așteptate, fără duplicate: "Which software manages computer hardware? Operating system, OS."
+    """
+    questions = questions if questions is not None else parse_exam_questions()
+    details = details if details is not None else parse_question_details()
+    
+    prompts = {}
+    for question_id, text in questions.items():
+        question = details.get(question_id, {})
+        terms = []
+        for term in question.get('answers', []) + question.get('options', []):
+            term = term.rstrip('.')
+            if term.lower() not in (t.lower() for t in terms):
+                terms.append(term)
+        prompts[question_id] = f"{text} {', '.join(terms)}." if terms else text
+    return prompts
+
 if __name__ == '__main__':
     questions = parse_exam_questions()
     
@@ -88,7 +164,16 @@ if __name__ == '__main__':
     with open('../data/questions_map.json', 'w', encoding='utf-8') as f:
         json.dump(questions, f, indent=2, ensure_ascii=False)
     
-    print(f"Parsed {len(questions)} questions")
+    # Răspunsurile așteptate, folosite de transcribe_audio.py --tiered
+    details = parse_question_details()
+    with open('../data/question_answers.json', 'w', encoding='utf-8') as f:
+        json.dump(details, f, indent=2, ensure_ascii=False)
+    
+    # Prompturi scurte per întrebare, folosite de scripturile de transcriere
+    with open('../data/question_prompts.json', 'w', encoding='utf-8') as f:
+        json.dump(build_question_prompts(questions, details), f, indent=2, ensure_ascii=False)
+    
+    print(f"Parsed {len(questions)} questions ({sum(1 for d in details.values() if d['answers'])} with expected answers)")
     print("\nSample questions:")
     for i, (qid, text) in enumerate(list(questions.items())[:5]):
         print(f"  {qid}: {text[:60]}...")
@@ -0,0 +1,40 @@
+"""
+Short per-question Whisper prompts.
+
+Instead of one long initial_prompt listing every technical term of the exam,
+each clip is transcribed with a prompt made of its own question text and the
+expected answers/options of that question (examQuestions.ts, see
+parse_questions.py). Fewer prompt tokens mean a shorter decoder prefix per
+clip, and the model is only biased towards terms that can actually occur.
+
+The index is built once into data/question_prompts.json (next to
+questions_map.json) and rebuilt when examQuestions.ts changes.
+"""
+
+import json
+from pathlib import Path
+
+from parse_questions import build_question_prompts
+
+QUESTION_PROMPTS_FILE = Path('../data/question_prompts.json')
+EXAM_QUESTIONS_FILE = Path('../data/examQuestions.ts')
+
+
+def load_question_prompts(path=QUESTION_PROMPTS_FILE):
+    """question_id -> prompt, from question_prompts.json (rebuilt if missing or older than examQuestions.ts)."""
+    path = Path(path)
+    if path.exists() and (not EXAM_QUESTIONS_FILE.exists()
+                          or path.stat().st_mtime_ns >= EXAM_QUESTIONS_FILE.stat().st_mtime_ns):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    print(f"Building per-question prompts from {EXAM_QUESTIONS_FILE} ...")
+    prompts = build_question_prompts()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(prompts, f, indent=2, ensure_ascii=False)
+    return prompts
+
+
+def prompt_options(options, prompt):
+    """transcribe() options with initial_prompt replaced by a question prompt (unchanged if prompt is None)."""
+    return {**options, 'initial_prompt': prompt} if prompt else options
@@ -0,0 +1,401 @@
+"""
+Indexed SQLite database of the exam results, for cross-user queries.
+
+The per-user answers.csv / summary.csv trees are the only other queryable
+form of the results, and a question across users ("all audio answers to
+section2_standard_Q6 slower than 30 s") means opening every file. This
+module loads, into one table per entity:
+    users      -> one row per user (export, or corrected general_statistics/users.csv)
+    questions  -> question text, section and kind (questions_map.json)
+    answers    -> one row per (user, question): the export fields, the Whisper
+                  transcription and the manual Correct/Wrong marks of
+                  manual_corrected_csvs/user_csvs/<user_id>/answers.csv
+with indexes on the columns the reports filter and group by.
+
+    python3 results_store.py build
+    python3 results_store.py answers --question section2_standard_Q6 --type Audio --min-time 30
+    python3 results_store.py accuracy --by section --kind standard
+    python3 results_store.py sql "SELECT user_id, COUNT(*) FROM answers WHERE wrong GROUP BY user_id"
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from answer_table import parse_mmss_to_ms, split_question_id
+from generate_csv import build_answer_records, build_user_record, get_data_path, load_user_records
+
+RESULTS_DB = '../output/results.sqlite'
+CORRECTED_DIR = '../manual_corrected_csvs'
+QUESTIONS_FILE = '../data/questions_map.json'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id          TEXT PRIMARY KEY,
+    email            TEXT,
+    status           TEXT,           -- 'Submitted' / 'In Progress' / 'No Data'
+    submitted        INTEGER NOT NULL DEFAULT 0,
+    submission_time  TEXT,           -- ISO timestamp
+    answered_count   INTEGER,
+    total_questions  INTEGER,
+    time_spent_s     INTEGER,
+    tab_change_count INTEGER,
+    current_section  TEXT
+);
+CREATE TABLE IF NOT EXISTS questions (
+    question_id TEXT PRIMARY KEY,
+    text        TEXT,
+    section     TEXT,
+    kind        TEXT                 -- standard / control / accomodation
+);
+CREATE TABLE IF NOT EXISTS answers (
+    user_id                 TEXT NOT NULL,
+    question_id             TEXT NOT NULL,
+    section                 TEXT,
+    kind                    TEXT,
+    answer_type             TEXT,    -- 'Text' / 'Audio'
+    text                    TEXT,
+    audio_url               TEXT,
+    transcription           TEXT,    -- Whisper transcription from the export
+    corrected_transcription TEXT,    -- transcription column of the corrected answers.csv
+    time_ms                 REAL,
+    audio_duration_ms       INTEGER,
+    answered_at             TEXT,    -- ISO timestamps, sortable as text
+    displayed_at            TEXT,
+    correct                 INTEGER NOT NULL DEFAULT 0,
+    wrong                   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, question_id)
+);
+CREATE INDEX IF NOT EXISTS answers_question ON answers (question_id, answer_type, time_ms);
+CREATE INDEX IF NOT EXISTS answers_kind ON answers (kind, answer_type);
+CREATE INDEX IF NOT EXISTS answers_section ON answers (section, answer_type);
+CREATE INDEX IF NOT EXISTS answers_marks ON answers (correct, wrong);
+CREATE INDEX IF NOT EXISTS users_status ON users (status);
+"""
+
+# Filters of answers() / accuracy(): argument -> SQL condition on the answers table
+_EQUAL_FILTERS = ('user_id', 'question_id', 'section', 'kind', 'answer_type')
+GROUP_COLUMNS = ('question_id', 'user_id', 'section', 'kind', 'answer_type')
+
+
+def _answer_row(user_id, answer):
+    """answers row (without marks) of a generate_csv answer record."""
+    section, kind = split_question_id(answer['question_id'])
+    # Same rule as the Text count of generate_csv.build_user_record: a 'text' field makes the answer Text
+    answer_type = 'Text' if answer['text'] is not None else answer['answer_type']
+    return {
+        'user_id': user_id,
+        'question_id': answer['question_id'],
+        'section': section,
+        'kind': kind,
+        'answer_type': answer_type,
+        'text': answer['text'],
+        'audio_url': answer['audio_url'] or None,
+        'transcription': answer['transcription'] or None,
+        'time_ms': answer['time_ms'],
+        'audio_duration_ms': answer['audio_duration_ms'] or None,
+        'answered_at': answer['answered_at'] or None,
+        'displayed_at': answer['displayed_at'] or None,
+    }
+
+
+def _csv_answer_row(user_id, row):
+    """answers row of a corrected answers.csv line (times are only known to the second)."""
+    question_id = row.get('Question ID', '')
+    section, kind = split_question_id(question_id)
+    time_ms = parse_mmss_to_ms(row.get('Time to Answer (mm:ss)', ''))
+    duration_ms = parse_mmss_to_ms(row.get('Audio Question Duration (mm:ss)', ''))
+    return {
+        'user_id': user_id,
+        'question_id': question_id,
+        'section': section,
+        'kind': kind,
+        'answer_type': row.get('Answer Type', '').strip() or None,
+        'text': row.get('User Answer (Text)') or None,
+        'audio_url': row.get('Audio URL') or None,
+        'transcription': row.get('Transcription (Audio Answers)') or None,
+        'time_ms': None if time_ms != time_ms else time_ms,
+        'audio_duration_ms': None if duration_ms != duration_ms else int(duration_ms),
+        'answered_at': row.get('Answered At (Timestamp)') or None,
+        'displayed_at': row.get('Question Displayed At (Timestamp)') or None,
+    }
+
+
+def _insert(conn, table, rows, on_conflict='OR REPLACE'):
+    rows = list(rows)
+    if not rows:
+        return
+    columns = list(rows[0])
+    conn.executemany(f'INSERT {on_conflict} INTO {table} ({", ".join(columns)}) '
+                     f'VALUES ({", ".join("?" * len(columns))})',
+                     [tuple(row[column] for column in columns) for row in rows])
+
+
+class ResultsStore:
+    """Query API over the results database."""
+
+    def __init__(self, path=RESULTS_DB, read_only=False):
+        """Open (and create) the database; read_only opens an existing one for queries only, schema untouched."""
+        self.path = Path(path)
+        if read_only:
+            self._conn = sqlite3.connect(f'{self.path.resolve().as_uri()}?mode=ro', uri=True)
+        else:
+            self._conn = sqlite3.connect(str(self.path))
+        self._conn.row_factory = sqlite3.Row
+        if not read_only:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Import
+
+    def import_questions(self, questions_map):
+        """questions_map.json: question_id -> text."""
+        with self._conn:
+            _insert(self._conn, 'questions', (
+                dict(zip(('question_id', 'text', 'section', 'kind'),
+                         (question_id, text) + split_question_id(question_id)))
+                for question_id, text in questions_map.items()))
+
+    def import_export(self, user_records):
+        """Users and answers of the export: (user_id, user_data, is_submitted, email) as yielded by
+        generate_csv.load_user_records. Returns the number of users imported."""
+        count = 0
+        with self._conn:
+            for user_id, user_data, is_submitted, email in user_records:
+                record = build_user_record(user_id, user_data, is_submitted, email)
+                submission_time = record.get('submission_time')
+                _insert(self._conn, 'users', [{
+                    'user_id': user_id,
+                    'email': email,
+                    'status': record['status'],
+                    'submitted': int(bool(is_submitted)),
+                    'submission_time': submission_time.isoformat() if submission_time else None,
+                    'answered_count': record.get('answered_count'),
+                    'total_questions': record.get('total_questions'),
+                    'time_spent_s': record.get('time_spent'),
+                    'tab_change_count': record.get('tab_change_count'),
+                    'current_section': record.get('current_section'),
+                }])
+                self._conn.execute('DELETE FROM answers WHERE user_id = ?', (user_id,))
+                _insert(self._conn, 'answers',
+                        (_answer_row(user_id, answer) for answer in build_answer_records(user_data)))
+                count += 1
+        return count
+
+    def import_corrections(self, corrected_dir=CORRECTED_DIR):
+        """Manual Correct/Wrong marks (and corrected transcriptions) of a corrected CSV tree.
+
+        Answers that are not in the database yet (no export imported) are added
+        from the CSV; users missing from it come from general_statistics/users.csv.
+        Returns the number of answers with a mark.
+        """
+        corrected_dir = Path(corrected_dir)
+        users_file = corrected_dir / 'general_statistics' / 'users.csv'
+        marked = 0
+        with self._conn:
+            if users_file.exists():
+                with open(users_file, 'r', encoding='utf-8', newline='') as f:
+                    _insert(self._conn, 'users', ({
+                        'user_id': row['User ID'],
+                        'email': row.get('Email'),
+                        'status': row.get('Status'),
+                        'submitted': int(row.get('Status') == 'Submitted'),
+                        'tab_change_count': _int_or_none(row.get('Tab Changes (Count)')),
+                        'current_section': _value_or_none(row.get('Current Section')),
+                    } for row in csv.DictReader(f)), on_conflict='OR IGNORE')
+
+            for answers_file in sorted(corrected_dir.glob('user_csvs/*/answers.csv')):
+                user_id = answers_file.parent.name
+                with open(answers_file, 'r', encoding='utf-8', newline='') as f:
+                    rows = list(csv.DictReader(f))
+                _insert(self._conn, 'answers', (_csv_answer_row(user_id, row) for row in rows),
+                        on_conflict='OR IGNORE')
+                marks = [((row.get('Correct') or '').strip() != '', (row.get('Wrong') or '').strip() != '',
+                          row.get('Transcription (Audio Answers)') or None, user_id, row.get('Question ID', ''))
+                         for row in rows]
+                self._conn.executemany(
+                    'UPDATE answers SET correct = ?, wrong = ?, corrected_transcription = ? '
+                    'WHERE user_id = ? AND question_id = ?', marks)
+                marked += sum(1 for correct, wrong, *_ in marks if correct or wrong)
+        return marked
+
+    # Queries
+
+    def query(self, sql, params=()):
+        """Run a SELECT; rows as dicts (open the store read_only to rule out any other statement)."""
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def _where(self, filters):
+        """WHERE clause and parameters of the answers filters (None = not filtered)."""
+        conditions, params = [], []
+        for column in _EQUAL_FILTERS:
+            if filters.get(column) is not None:
+                conditions.append(f'{column} = ?')
+                params.append(filters[column])
+        if filters.get('min_time_ms') is not None:
+            conditions.append('time_ms >= ?')
+            params.append(filters['min_time_ms'])
+        if filters.get('max_time_ms') is not None:
+            conditions.append('time_ms <= ?')
+            params.append(filters['max_time_ms'])
+        if filters.get('graded') is not None:
+            conditions.append('(correct OR wrong)' if filters['graded'] else 'NOT (correct OR wrong)')
+        if filters.get('exclude_users'):
+            conditions.append(f'user_id NOT IN ({", ".join("?" * len(filters["exclude_users"]))})')
+            params.extend(filters['exclude_users'])
+        return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+    def answers(self, **filters):
+        """Answers matching the filters, ordered by user and question.
+
+        Filters: user_id, question_id, section, kind, answer_type (equality),
+        min_time_ms / max_time_ms, graded (True/False), exclude_users.
+        """
+        where, params = self._where(filters)
+        return self.query(f'SELECT * FROM answers{where} ORDER BY user_id, question_id', params)
+
+    def accuracy(self, by='question_id', **filters):
+        """Correct/wrong counts, accuracy (%) and average time per group of `by` (one of GROUP_COLUMNS).
+
+        An answer marked both Correct and Wrong counts as Correct, as in
+        standard_accuracy_per_user.py.
+        """
+        if by not in GROUP_COLUMNS:
+            raise ValueError(f"by must be one of {GROUP_COLUMNS}, not {by!r}")
+        where, params = self._where(filters)
+        return self.query(
+            f'SELECT {by}, COUNT(*) AS answers, SUM(correct) AS correct, SUM(wrong AND NOT correct) AS wrong, '
+            f'ROUND(100.0 * SUM(correct) / NULLIF(SUM(correct OR wrong), 0), 2) AS accuracy, '
+            f'ROUND(AVG(time_ms)) AS avg_time_ms '
+            f'FROM answers{where} GROUP BY {by} ORDER BY {by}', params)
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _value_or_none(value):
+    return None if value in (None, '', 'N/A') else value
+
+
+def build_results_store(db_path=RESULTS_DB, data_path=None, corrected_dir=CORRECTED_DIR,
+                        questions_file=QUESTIONS_FILE):
+    """(Re)build the database from the export, questions_map.json and the corrected CSV tree.
+
+    Each source is optional; the database is written to a temporary file and renamed.
+    """
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_suffix(db_path.suffix + '.tmp')
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    with ResultsStore(tmp_path) as store:
+        if os.path.exists(questions_file):
+            with open(questions_file, 'r', encoding='utf-8') as f:
+                store.import_questions(json.load(f))
+        data_path = get_data_path(data_path)
+        if os.path.exists(data_path):
+            print(f'Imported {store.import_export(load_user_records(data_path))} users from {data_path}')
+        else:
+            print(f'{data_path} not found, answers are read from the corrected CSVs only')
+        if Path(corrected_dir).exists():
+            print(f'Imported {store.import_corrections(corrected_dir)} manual marks from {corrected_dir}')
+        store._conn.execute('ANALYZE')
+    os.replace(tmp_path, db_path)
+
+
+def _write_rows(rows):
+    """Rows as CSV on stdout."""
+    if not rows:
+        return
+    writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def _add_filters(parser):
+    parser.add_argument('--user', dest='user_id')
+    parser.add_argument('--question', dest='question_id')
+    parser.add_argument('--section')
+    parser.add_argument('--kind', choices=('standard', 'control', 'accomodation'))
+    parser.add_argument('--type', dest='answer_type', choices=('Text', 'Audio'))
+    parser.add_argument('--min-time', type=float, help="Minimum time to answer, in seconds")
+    parser.add_argument('--max-time', type=float, help="Maximum time to answer, in seconds")
+    parser.add_argument('--graded', action='store_true', default=None, help="Only answers marked Correct or Wrong")
+    parser.add_argument('--exclude', nargs='+', default=(), metavar='USER_ID', help="Users to leave out")
+
+
+def _filters(args):
+    return {
+        'user_id': args.user_id, 'question_id': args.question_id, 'section': args.section,
+        'kind': args.kind, 'answer_type': args.answer_type, 'graded': args.graded,
+        'min_time_ms': None if args.min_time is None else args.min_time * 1000,
+        'max_time_ms': None if args.max_time is None else args.max_time * 1000,
+        'exclude_users': args.exclude,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build and query the SQLite results database.")
+    parser.add_argument('--db', default=RESULTS_DB, help=f"Database file (default: {RESULTS_DB})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="Import the export, transcriptions and manual marks")
+    build.add_argument('--data', default=None, help="Export, JSON or .sqlite store (default: as generate_csv.py)")
+    build.add_argument('--corrected', default=CORRECTED_DIR, help=f"Corrected CSV tree (default: {CORRECTED_DIR})")
+
+    answers = commands.add_parser('answers', help="Print the matching answers as CSV")
+    _add_filters(answers)
+
+    accuracy = commands.add_parser('accuracy', help="Print accuracy per group as CSV")
+    accuracy.add_argument('--by', default='question_id', choices=GROUP_COLUMNS)
+    _add_filters(accuracy)
+
+    sql = commands.add_parser('sql', help="Run a SELECT and print the rows as CSV")
+    sql.add_argument('query')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    if args.command == 'build':
+        build_results_store(args.db, args.data, args.corrected)
+        print(f"Results database written to {args.db} in {time.perf_counter() - start:.2f}s")
+        return
+
+    if not Path(args.db).exists():
+        sys.exit(f"{args.db} not found; run 'python3 results_store.py build' first")
+    with ResultsStore(args.db, read_only=True) as store:
+        if args.command == 'answers':
+            rows = store.answers(**_filters(args))
+        elif args.command == 'accuracy':
+            rows = store.accuracy(args.by, **_filters(args))
+        else:
+            try:
+                rows = store.query(args.query)
+            except sqlite3.OperationalError as error:  # e.g. a write on the read-only database
+                sys.exit(f"sql: {error}")
+    _write_rows(rows)
+    print(f"{len(rows)} rows in {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
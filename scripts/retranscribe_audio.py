@@ -1,148 +1,246 @@
+import argparse
 import json
 import whisper
-from pathlib import Path
-
-print("=" * 70)
-print("RE-TRANSCRIBING AUDIO FILES WITH MAXIMUM ACCURACY")
-print("=" * 70)
-
-# Load the existing transcriptions
-print("\nLoading existing data...")
-with open('../data/final_with_transcriptions.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
-
-# Load Whisper model
-print("\nLoading Whisper 'small' model (high accuracy)...")
-print("   This will take longer but provide much better results")
-print("   Model: 'small' (244M parameters - excellent for technical terms)\n")
-try:
-    model = whisper.load_model("small")
-    print("Small model loaded!\n")
-except Exception as e:
-    print(f"Failed to load 'small' model: {e}")
-    print("   Falling back to 'base' model...")
-    model = whisper.load_model("base")
-    print("Base model loaded!\n")
-
-audio_dir = Path('../data/audio_files')
-total_audio = 0
-retranscribed = 0
-failed = 0
-
-def transcribe_audio(audio_path, model):
-    """Transcribe with maximum accuracy settings"""
+
+from audio_answers import AUDIO_DIR, audio_path_for, iter_audio_answers
+from audio_features import FEATURES_DIR, audio_input, prepare_features
+from batched_transcription import transcribe_batched
+from export_store import ExportStore, is_store
+from question_prompts import QUESTION_PROMPTS_FILE, load_question_prompts, prompt_options
+from transcription_cache import DEFAULT_CACHE_PATH, TranscriptionCache, cache_options
+from transcription_journal import TranscriptionJournal, apply_records, merge_journal
+from transcription_workers import DEFAULT_MODEL_NAMES, default_threads_per_worker, transcribe_parallel
+from voice_activity import NO_SPEECH, VAD_OPTIONS, trim_silence
+
+DATA_FILE = '../data/final_with_transcriptions.json'
+JOURNAL_FILE = '../data/retranscribe_audio.journal.jsonl'  # results of an unfinished run
+
+# Maximum accuracy decoding settings (also part of the transcription cache key); the
+# exam-wide initial_prompt is replaced by the question's own prompt unless --static-prompt
+WHISPER_OPTIONS = {
+    'language': "en",
+    'initial_prompt': "Computer science exam. Technical terms: merge sort, heap sort, bubble sort, quick sort, insertion sort, binary search, linear search, polymorphism, inheritance, encapsulation, overloading, overriding, abstraction, polymorphism, interface, abstract, RAM, ROM, DRAM, SRAM, CPU, ALU, cache, control unit, LAN, WAN, MAN, VPN, network, router, switch, HTTP, HTTPS, FTP, TCP, UDP, IP, port, MAC, binary, algorithm, data structure, queue, stack, tree, graph, linked list, array, complexity, Big O notation, SQL, WHERE, SELECT, INSERT, DELETE, UPDATE, TRUNCATE, kernel, driver, compiler, interpreter, operating system, Dijkstra, Prim, Kruskal, greedy, dynamic programming, divide and conquer, recursion, iteration, round robin, FCFS, SJF, priority scheduling, IPv4, IPv6, MAC address, destructor, constructor, delete, new, malloc, free, Saturday, Sunday, Monday, Tuesday, Wednesday, Thursday, Friday, January, February, March, April, May, June, July, August, September, October, November, December.",
+    'temperature': 0.0,  # Deterministic
+    'beam_size': 5,  # Better beam search
+    'best_of': 5,  # Consider multiple candidates
+    'fp16': False,  # Use FP32 for better accuracy
+    'condition_on_previous_text': True,  # Use context
+    'compression_ratio_threshold': 2.4,  # Detect and skip repetitive transcriptions
+    'logprob_threshold': -1.0,  # More conservative confidence threshold
+    'no_speech_threshold': 0.6,  # Better silence detection
+    'word_timestamps': False,  # Focus on accuracy, not timing
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Re-transcribe every downloaded audio answer with maximum accuracy settings.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Whisper worker processes, each loading its own model (default: 1)")
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help="Torch threads per worker process (default: cores / workers)")
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help="Decode up to N short clips per Whisper forward pass (default: 1, per-file transcribe())")
+    parser.add_argument('--use-features', action='store_true',
+                        help=f"Feed Whisper the decoded PCM in {FEATURES_DIR}/ (each file is decoded with ffmpeg only once)")
+    parser.add_argument('--vad', action='store_true',
+                        help="Trim leading/trailing silence and skip silent clips before Whisper (energy-based VAD)")
+    parser.add_argument('--static-prompt', action='store_true',
+                        help=f"Use the exam-wide initial_prompt for every clip instead of the per-question prompts ({QUESTION_PROMPTS_FILE})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f"Re-decode every file, ignoring the transcription cache ({DEFAULT_CACHE_PATH})")
+    parser.add_argument('--store', default=None,
+                        help=f"Re-transcribe the answers of this export store (export_store.py) in place, instead of {DATA_FILE}")
+    parser.add_argument('--restart', action='store_true',
+                        help=f"Discard the journal of an interrupted run ({JOURNAL_FILE}) instead of resuming it")
+    return parser.parse_args()
+
+def load_model():
+    """Load Whisper 'small', falling back to 'base'. Returns (model, model_name)"""
+    print("\nLoading Whisper 'small' model (high accuracy)...")
+    print("   This will take longer but provide much better results")
+    print("   Model: 'small' (244M parameters - excellent for technical terms)\n")
+    try:
+        model = whisper.load_model("small")
+        print("Small model loaded!\n")
+        return model, "small"
+    except Exception as e:
+        print(f"Failed to load 'small' model: {e}")
+        print("   Falling back to 'base' model...")
+        model = whisper.load_model("base")
+        print("Base model loaded!\n")
+        return model, "base"
+
+def transcribe_audio(audio_path, model, prompt=None):
+    """Transcribe with maximum accuracy settings (and the question's prompt)"""
     try:
-        result = model.transcribe(
-            str(audio_path),
-            language="en",
-            initial_prompt="Computer science exam. Technical terms: merge sort, heap sort, bubble sort, quick sort, insertion sort, binary search, linear search, polymorphism, inheritance, encapsulation, overloading, overriding, abstraction, polymorphism, interface, abstract, RAM, ROM, DRAM, SRAM, CPU, ALU, cache, control unit, LAN, WAN, MAN, VPN, network, router, switch, HTTP, HTTPS, FTP, TCP, UDP, IP, port, MAC, binary, algorithm, data structure, queue, stack, tree, graph, linked list, array, complexity, Big O notation, SQL, WHERE, SELECT, INSERT, DELETE, UPDATE, TRUNCATE, kernel, driver, compiler, interpreter, operating system, Dijkstra, Prim, Kruskal, greedy, dynamic programming, divide and conquer, recursion, iteration, round robin, FCFS, SJF, priority scheduling, IPv4, IPv6, MAC address, destructor, constructor, delete, new, malloc, free, Saturday, Sunday, Monday, Tuesday, Wednesday, Thursday, Friday, January, February, March, April, May, June, July, August, September, October, November, December.",
-            verbose=False,
-            temperature=0.0,  # Deterministic
-            beam_size=5,  # Better beam search
-            best_of=5,  # Consider multiple candidates
-            fp16=False,  # Use FP32 for better accuracy
-            condition_on_previous_text=True,  # Use context
-            compression_ratio_threshold=2.4,  # Detect and skip repetitive transcriptions
-            logprob_threshold=-1.0,  # More conservative confidence threshold
-            no_speech_threshold=0.6,  # Better silence detection
-            word_timestamps=False  # Focus on accuracy, not timing
-        )
+        result = model.transcribe(audio_input(audio_path), verbose=False, **prompt_options(WHISPER_OPTIONS, prompt))
         return result["text"].strip()
     except Exception as e:
         print(f"      Failed: {e}")
         return None
 
-print("=" * 70)
-print("Re-transcribing audio files from examProgress...")
-print("=" * 70)
+def report(user_id, question_id, answer, new_transcription, stats, journal):
+    """Store the new transcription (and journal it), printing the old/new comparison"""
+    old_transcription = answer.get('transcription', '')
+    print(f"\n  {user_id[:15]}... / {question_id}")
+    print(f"     Old: '{old_transcription}'")
+
+    if new_transcription:
+        answer['transcription'] = new_transcription
+        journal.append(user_id, question_id, answer)
+        print(f"     New: '{new_transcription}'")
+        stats['retranscribed'] += 1
+
+        if old_transcription != new_transcription:
+            print(f"     IMPROVED!")
+        else:
+            print(f"     Same")
+    else:
+        stats['failed'] += 1
+
+def main():
+    args = parse_args()
+
+    print("=" * 70)
+    print("RE-TRANSCRIBING AUDIO FILES WITH MAXIMUM ACCURACY")
+    print("=" * 70)
+
+    # Load the existing transcriptions (only the audio answers of an export store)
+    data_file = args.store or DATA_FILE
+    print(f"\nLoading existing data from {data_file}...")
+    if is_store(data_file):
+        with ExportStore(data_file) as store:
+            data = store.audio_answers()
+    else:
+        with open(data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
 
-for user_id, user_data in data.get('examProgress', {}).items():
-    if not isinstance(user_data, dict) or 'answers' not in user_data:
-        continue
-    
-    for question_id, answer in user_data['answers'].items():
-        if 'audioUrl' not in answer:
+    audio_dir = AUDIO_DIR
+    stats = {'total': 0, 'retranscribed': 0, 'failed': 0, 'silent': 0, 'resumed': 0}
+
+    # Resume an interrupted run: answers in its journal are already re-transcribed
+    journal = TranscriptionJournal(JOURNAL_FILE)
+    if args.restart:
+        journal.remove()
+    records = journal.load()
+    if records:
+        apply_records(data, records)
+        print(f"Resuming interrupted run: {len(records)} transcriptions from {JOURNAL_FILE}")
+
+    # Audio answers that have a local file
+    pending = []
+    for user_id, question_id, answer in iter_audio_answers(data):
+        stats['total'] += 1
+        if (user_id, question_id) in records:
+            stats['resumed'] += 1
             continue
-        
-        total_audio += 1
-        audio_filename = f"{user_id}_{question_id}.webm"
-        audio_path = audio_dir / audio_filename
-        
+        audio_path = audio_path_for(user_id, question_id, audio_dir)
         if not audio_path.exists():
             print(f"  {user_id[:15]}... / {question_id}: Audio file not found")
-            failed += 1
+            stats['failed'] += 1
             continue
-        
-        old_transcription = answer.get('transcription', '')
-        print(f"\n  {user_id[:15]}... / {question_id}")
-        print(f"     Old: '{old_transcription}'")
-        
-        new_transcription = transcribe_audio(audio_path, model)
-        
-        if new_transcription:
-            answer['transcription'] = new_transcription
-            print(f"     New: '{new_transcription}'")
-            retranscribed += 1
-            
-            if old_transcription != new_transcription:
-                print(f"     IMPROVED!")
-            else:
-                print(f"     Same")
-        else:
-            failed += 1
+        pending.append((user_id, question_id, answer, audio_path))
 
-print("\n" + "=" * 70)
-print("Re-transcribing audio files from examResults...")
-print("=" * 70)
+    # Trim silence around the speech; silent clips never reach Whisper
+    sources = {}
+    if args.vad and pending:
+        print(f"\nDetecting speech (VAD)...")
+        features = prepare_features([audio_path for _, _, _, audio_path in pending]) if args.use_features else {}
+        vad = trim_silence([audio_path for _, _, _, audio_path in pending], sources=features)
+        speech = []
+        for user_id, question_id, answer, audio_path in pending:
+            result = vad.get(audio_path)
+            if result is not None:
+                answer['speechSpan'] = result['span']
+                if result['path'] is None:
+                    print(f"  {user_id[:15]}... / {question_id}: No speech detected")
+                    answer['transcription'] = NO_SPEECH
+                    journal.append(user_id, question_id, answer)
+                    stats['silent'] += 1
+                    continue
+                sources[audio_path] = result['path']
+            speech.append((user_id, question_id, answer, audio_path))
+        pending = speech
 
-for user_id, results in data.get('examResults', {}).items():
-    for result_id, result_data in results.items():
-        if 'answers' not in result_data:
-            continue
-        
-        for question_id, answer in result_data['answers'].items():
-            if 'audioUrl' not in answer:
-                continue
-            
-            total_audio += 1
-            audio_filename = f"{user_id}_{question_id}.webm"
-            audio_path = audio_dir / audio_filename
-            
-            if not audio_path.exists():
-                print(f"  {user_id[:15]}... / {question_id}: Audio file not found")
-                failed += 1
-                continue
-            
-            old_transcription = answer.get('transcription', '')
-            print(f"\n  {user_id[:15]}... / {question_id}")
-            print(f"     Old: '{old_transcription}'")
-            
-            new_transcription = transcribe_audio(audio_path, model)
-            
-            if new_transcription:
-                answer['transcription'] = new_transcription
-                print(f"     New: '{new_transcription}'")
-                retranscribed += 1
-                
-                if old_transcription != new_transcription:
-                    print(f"     IMPROVED!")
-                else:
-                    print(f"     Same")
+    # Short question-specific prompts instead of the exam-wide one
+    question_prompts = {} if args.static_prompt else load_question_prompts()
+    prompts = {audio_path: question_prompts.get(question_id) for _, question_id, _, audio_path in pending}
+
+    # Files whose bytes and settings are unchanged are served from the cache
+    cache = None if args.no_cache else TranscriptionCache()
+    options = cache_options(WHISPER_OPTIONS, batched=args.batch_size > 1, pcm_features=args.use_features,
+                            vad=VAD_OPTIONS if args.vad else None)
+    if cache is not None:
+        uncached = []
+        for user_id, question_id, answer, audio_path in pending:
+            cached = cache.get(audio_path, DEFAULT_MODEL_NAMES[0], prompt_options(options, prompts[audio_path]))
+            if cached is None:
+                uncached.append((user_id, question_id, answer, audio_path))
             else:
-                failed += 1
-
-# Save updated data
-print("\n" + "=" * 70)
-print("Saving improved transcriptions...")
-with open('../data/final_with_transcriptions.json', 'w', encoding='utf-8') as f:
-    json.dump(data, f, indent=2, ensure_ascii=False)
-
-print("\n" + "=" * 70)
-print("RE-TRANSCRIPTION COMPLETE!")
-print("=" * 70)
-print(f"Statistics:")
-print(f"  - Total audio files: {total_audio}")
-print(f"  - Successfully re-transcribed: {retranscribed}")
-print(f"  - Failed: {failed}")
-print(f"\nUpdated data saved to: ../data/final_with_transcriptions.json")
-print(f"Run 'cd scripts && python3 generate_csv.py' to update CSVs with new transcriptions")
+                report(user_id, question_id, answer, cached, stats, journal)
+        print(f"\n{cache.hits} transcriptions served from {cache.path}")
+        pending = uncached
+
+    # Decode each file once; the model then reads the memory-mapped PCM
+    if args.use_features and not args.vad and pending:
+        print(f"\nDecoding audio into {FEATURES_DIR}/ ...")
+        sources.update(prepare_features([audio_path for _, _, _, audio_path in pending]))
+    sources = {audio_path: sources.get(audio_path, audio_path) for _, _, _, audio_path in pending}
+
+    print("=" * 70)
+    print(f"Re-transcribing {len(pending)} audio files...")
+    print("=" * 70)
+
+    if args.workers > 1:
+        threads = args.threads_per_worker or default_threads_per_worker(args.workers)
+        print(f"Starting {args.workers} Whisper workers ({threads} thread(s) each)...")
+        answers = {(user_id, question_id): answer for user_id, question_id, answer, _ in pending}
+        paths = {(user_id, question_id): audio_path for user_id, question_id, _, audio_path in pending}
+        tasks = [(key, str(sources[audio_path])) for key, audio_path in paths.items()]
+        results = transcribe_parallel(tasks, transcribe_audio, args.workers, threads,
+                                      batch_size=args.batch_size, options=WHISPER_OPTIONS,
+                                      prompts={key: prompts[audio_path] for key, audio_path in paths.items()})
+        for (user_id, question_id), new_transcription, model_name in results:
+            audio_path = paths[(user_id, question_id)]
+            report(user_id, question_id, answers[(user_id, question_id)], new_transcription, stats, journal)
+            if cache is not None and model_name:
+                cache.put(audio_path, model_name, prompt_options(options, prompts[audio_path]), new_transcription)
+    elif pending:
+        model, model_name = load_model()
+        answers = {sources[audio_path]: (user_id, question_id, answer, audio_path)
+                   for user_id, question_id, answer, audio_path in pending}
+        results = transcribe_batched(model, list(answers), WHISPER_OPTIONS, transcribe_audio, args.batch_size,
+                                     {source: prompts[entry[3]] for source, entry in answers.items()})
+        for source, new_transcription in results:
+            user_id, question_id, answer, audio_path = answers[source]
+            report(user_id, question_id, answer, new_transcription, stats, journal)
+            if cache is not None:
+                cache.put(audio_path, model_name, prompt_options(options, prompts[audio_path]), new_transcription)
+
+    if cache is not None:
+        cache.close()
+    journal.close()
+
+    # Merge step: the journal is written into the data file once; the run is then complete
+    print("\n" + "=" * 70)
+    print("Saving improved transcriptions...")
+    merge_journal(data_file, JOURNAL_FILE, data_file)
+    journal.remove()
+
+    print("\n" + "=" * 70)
+    print("RE-TRANSCRIPTION COMPLETE!")
+    print("=" * 70)
+    print(f"Statistics:")
+    print(f"  - Total audio files: {stats['total']}")
+    print(f"  - Successfully re-transcribed: {stats['retranscribed']}")
+    print(f"  - Failed: {stats['failed']}")
+    if stats['resumed']:
+        print(f"  - Resumed from journal: {stats['resumed']}")
+    if args.vad:
+        print(f"  - Silent (no speech detected): {stats['silent']}")
+    if cache is not None:
+        print(f"  - Served from cache: {cache.hits}")
+    print(f"\nUpdated data saved to: {data_file}")
+    print(f"Run 'cd scripts && python3 generate_csv.py' to update CSVs with new transcriptions")
+
+if __name__ == '__main__':
+    main()
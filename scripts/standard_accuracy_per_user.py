@@ -1,55 +1,35 @@
 # Script pentru calculul accuracy-ului pe user, doar pentru întrebări STANDARD
 import csv
-import os
 
-def is_standard(qid):
-    return 'standard' in qid
+from answer_table import EXCLUDED_USERS, AnswerTable
 
-def process_user_answers(user_id, answers_path):
-    text_right = text_wrong = audio_right = audio_wrong = 0
-    with open(answers_path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            qid = row['Question ID']
-            if not is_standard(qid):
-                continue
-            answer_type = row['Answer Type'].strip()
-            correct = row['Correct'].strip()
-            wrong = row['Wrong'].strip()
-            if answer_type == 'Text':
-                if correct:
-                    text_right += 1
-                elif wrong:
-                    text_wrong += 1
-            elif answer_type == 'Audio':
-                if correct:
-                    audio_right += 1
-                elif wrong:
-                    audio_wrong += 1
-    text_total = text_right + text_wrong
-    audio_total = audio_right + audio_wrong
-    text_acc = round(text_right / text_total, 3) if text_total else ''
-    audio_acc = round(audio_right / audio_total, 3) if audio_total else ''
-    return [user_id, text_right, text_wrong, text_acc, audio_right, audio_wrong, audio_acc]
+def compute_standard_accuracy(table):
+    """Accuracy text/audio per user, vectorizat (group-by pe user_id)"""
+    rows = []
+    standard = table.mask(kind='standard')
+    # Un răspuns marcat și Correct și Wrong contează ca Correct
+    right = table.correct & standard
+    wrong = table.wrong & ~table.correct & standard
+    by_type = {}
+    for answer_type in ('Text', 'Audio'):
+        of_type = table.mask(answer_type=answer_type)
+        by_type[answer_type] = (table.group_count('user_id', right & of_type),
+                                table.group_count('user_id', wrong & of_type))
+    for code, user_id in enumerate(table.labels['user_id']):
+        row = [user_id]
+        for answer_type in ('Text', 'Audio'):
+            n_right = int(by_type[answer_type][0][code])
+            n_wrong = int(by_type[answer_type][1][code])
+            total = n_right + n_wrong
+            row += [n_right, n_wrong, round(n_right / total, 3) if total else '']
+        rows.append(row)
+    return rows
 
 def main():
     base = 'manual_corrected_csvs/user_csvs'
     out_csv = 'output/general_statistics/standard_accuracy_per_user.csv'
-    exclude_users = {
-        'yskSrWOMY1dMfleJ1demTFRwmaB3',
-        'kzHpKFHMcPPnV8KAKZX4skbzRlM2',
-        'dwtLwhIgAyQAfqgq6BGgRYDqwdi2',
-        'I95XongADMhnGoykzUkcFxfx2Zg1',
-        '2jx38lBdkJZAffOTjapIJUOkcmT2',
-    }
-    user_dirs = [d for d in os.listdir(base) if os.path.isdir(os.path.join(base, d))]
-    results = []
-    for user_id in sorted(user_dirs):
-        if user_id in exclude_users:
-            continue
-        answers_path = os.path.join(base, user_id, 'answers.csv')
-        if os.path.exists(answers_path):
-            results.append(process_user_answers(user_id, answers_path))
+    table = AnswerTable.from_csv_tree(base, exclude_users=EXCLUDED_USERS)
+    results = compute_standard_accuracy(table)
     with open(out_csv, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
         writer.writerow(['user_id','text_right','text_wrong','text_accuracy','audio_right','audio_wrong','audio_accuracy'])
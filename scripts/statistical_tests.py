@@ -0,0 +1,443 @@
+"""
+Vectorized Text vs Audio significance tests.
+
+Per-user metrics (accuracy % and mean response time in seconds, for Text and
+for Audio answers) of the summary.csv users (EXCLUDED_USERS left out) are
+computed from an AnswerTable for every question grouping at once and stored
+as a (metric column x user) matrix, with NaN where a user has no graded /
+timed answer of that kind. Every test then runs on
+whole rows of that matrix instead of looping over users:
+    shapiro_wilk        -> normality of each column (Royston's approximation)
+    paired_t_test       -> Text vs Audio, users that have both
+    wilcoxon            -> signed-rank test on the same pairs
+    permutation_test    -> sign-flip null distribution of the mean difference
+    bootstrap_ci        -> percentile CI of the mean difference (resampled users)
+The resampling variants draw their (resamples x users) sign / index matrices
+in chunks of at most CHUNK_CELLS cells, each seeded from its own
+SeedSequence.spawn child, so memory stays bounded and there is still no
+Python loop per resample.
+
+scipy is optional: when it is installed its special functions are used for
+the distribution tails, otherwise equivalent NumPy / math implementations.
+
+    python3 statistical_tests.py   # writes output/general_statistics/statistical_tests.csv
+    python3 statistical_tests.py --resamples 20000 --seed 1
+"""
+
+import argparse
+import csv
+import math
+import warnings
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+
+from answer_table import EXCLUDED_USERS, AnswerTable
+
+try:
+    from scipy import special
+except ImportError:  # optional dependency
+    special = None
+
+USER_CSVS_DIR = '../manual_corrected_csvs/user_csvs'
+TESTS_FILE = '../output/general_statistics/statistical_tests.csv'
+
+# Question groupings tested; 'all' is standard + control (accommodation questions are never graded)
+GROUPINGS = {'all': ('standard', 'control'), 'standard': ('standard',), 'control': ('control',)}
+METRICS = ('accuracy', 'time')
+ANSWER_TYPES = ('Text', 'Audio')
+ALPHA = 0.05
+N_RESAMPLES = 10000
+SEED = 0
+CHUNK_CELLS = 4_000_000  # resamples x values per sign / index matrix (~32 MB)
+
+
+# Distribution functions (scipy when available)
+
+def normal_sf(z):
+    z = np.asarray(z, dtype=np.float64)
+    if special is not None:
+        return special.ndtr(-z)
+    return 0.5 * np.vectorize(math.erfc)(z / math.sqrt(2))
+
+
+def normal_ppf(q):
+    q = np.asarray(q, dtype=np.float64)
+    if special is not None:
+        return special.ndtri(q)
+    return np.vectorize(NormalDist().inv_cdf)(q)
+
+
+def _betainc(a, b, x, iterations=300):
+    """Regularized incomplete beta I_x(a, b), vectorized continued fraction (Numerical Recipes)."""
+    a, b, x = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (a, b, x)))
+    # Use the symmetry I_x(a, b) = 1 - I_{1-x}(b, a) where the fraction converges faster
+    swap = x > (a + 1) / (a + b + 2)
+    a, b, x = np.where(swap, b, a), np.where(swap, a, b), np.where(swap, 1 - x, x)
+    lgamma = np.vectorize(math.lgamma)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        front = np.exp(lgamma(a + b) - lgamma(a) - lgamma(b) + a * np.log(x) + b * np.log1p(-x)) / a
+        tiny = 1e-300
+        f = np.ones_like(x)
+        c = np.ones_like(x)
+        d = np.zeros_like(x)
+        for i in range(iterations * 2 + 1):
+            m = i // 2
+            if i == 0:
+                numerator = np.ones_like(x)
+            elif i % 2 == 0:
+                numerator = m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m))
+            else:
+                numerator = -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))
+            d = 1 + numerator * d
+            d = np.where(np.abs(d) < tiny, tiny, d)
+            c = 1 + numerator / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            d = 1 / d
+            f = f * c * d
+        result = front * (f - 1)
+    result = np.where(x <= 0, 0.0, np.where(x >= 1, 1.0, result))
+    return np.where(swap, 1 - result, result)
+
+
+def t_sf_two_sided(t, df):
+    """P(|T| >= |t|) for Student's t with df degrees of freedom."""
+    t, df = np.asarray(t, dtype=np.float64), np.asarray(df, dtype=np.float64)
+    x = df / (df + t ** 2)
+    if special is not None:
+        return special.betainc(df / 2, 0.5, x)
+    return _betainc(df / 2, 0.5, x)
+
+
+# Per-user metric matrix
+
+def user_metrics(table, groupings=GROUPINGS):
+    """Per-user metrics for every grouping, metric and answer type.
+
+    Returns (columns, values): columns is a list of (grouping, metric,
+    answer_type) and values a (len(columns), n_users) float array, NaN where
+    the user has no answer of that kind. Accuracy is a percentage (an answer
+    marked both Correct and Wrong counts as Correct), time is in seconds.
+    """
+    columns, rows = [], []
+    for grouping, kinds in groupings.items():
+        in_grouping = np.zeros(len(table), dtype=bool)
+        for kind in kinds:
+            in_grouping |= table.mask(kind=kind)
+        for answer_type in ANSWER_TYPES:
+            mask = in_grouping & table.mask(answer_type=answer_type)
+            correct = table.group_count('user_id', table.correct & mask)
+            wrong = table.group_count('user_id', table.wrong & ~table.correct & mask)
+            graded = correct + wrong
+            with np.errstate(invalid='ignore', divide='ignore'):
+                accuracy = np.where(graded > 0, correct / np.maximum(graded, 1) * 100, np.nan)
+            _, _, mean_ms = table.time_stats('user_id', mask)
+            columns += [(grouping, 'accuracy', answer_type), (grouping, 'time', answer_type)]
+            rows += [accuracy, mean_ms / 1000]
+    return columns, np.vstack(rows) if rows else np.empty((0, len(table.labels['user_id'])))
+
+
+def paired_rows(columns, values):
+    """(pairs, text, audio): Text and Audio rows of each (grouping, metric), NaN where either is missing."""
+    index = {column: i for i, column in enumerate(columns)}
+    pairs = sorted({(grouping, metric) for grouping, metric, _ in columns},
+                   key=lambda pair: (list(GROUPINGS).index(pair[0]) if pair[0] in GROUPINGS else len(GROUPINGS),
+                                     METRICS.index(pair[1])))
+    text = values[[index[(grouping, metric, 'Text')] for grouping, metric in pairs]]
+    audio = values[[index[(grouping, metric, 'Audio')] for grouping, metric in pairs]]
+    both = ~np.isnan(text) & ~np.isnan(audio)
+    return pairs, np.where(both, text, np.nan), np.where(both, audio, np.nan)
+
+
+def _compact(values):
+    """Sort each row ascending with NaN last; returns (sorted rows, valid count per row)."""
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    return np.sort(values, axis=1), np.sum(~np.isnan(values), axis=1)
+
+
+# Tests
+
+def _shapiro_coefficients(n):
+    """Royston (1992) coefficients a_1..a_n of the Shapiro-Wilk W statistic."""
+    if n == 3:
+        return np.array([-math.sqrt(0.5), 0.0, math.sqrt(0.5)])
+    m = normal_ppf((np.arange(1, n + 1) - 0.375) / (n + 0.25))
+    mm = np.dot(m, m)
+    u = 1 / math.sqrt(n)
+    a = m.copy()
+    a_n = m[-1] / math.sqrt(mm) + np.polyval([-2.706056, 4.434685, -2.071190, -0.147981, 0.221157, 0], u)
+    if n > 5:
+        a_n1 = m[-2] / math.sqrt(mm) + np.polyval([-3.582633, 5.682633, -1.752461, -0.293762, 0.042981, 0], u)
+        eps = (mm - 2 * m[-1] ** 2 - 2 * m[-2] ** 2) / (1 - 2 * a_n ** 2 - 2 * a_n1 ** 2)
+        a[2:-2] = m[2:-2] / math.sqrt(eps)
+        a[[0, 1, -2, -1]] = -a_n, -a_n1, a_n1, a_n
+    else:
+        eps = (mm - 2 * m[-1] ** 2) / (1 - 2 * a_n ** 2)
+        a[1:-1] = m[1:-1] / math.sqrt(eps)
+        a[[0, -1]] = -a_n, a_n
+    return a
+
+
+def _shapiro_p(w, n):
+    """Royston (1995) p-value approximation of W for sample size n."""
+    w = np.asarray(w, dtype=np.float64)
+    if n == 3:
+        return np.clip(6 / math.pi * (np.arcsin(np.sqrt(w)) - math.asin(math.sqrt(0.75))), 0, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if n <= 11:
+            gamma = -2.273 + 0.459 * n
+            mu = np.polyval([-0.0006714, 0.025054, -0.39978, 0.5440], n)
+            sigma = math.exp(np.polyval([-0.0020322, 0.062767, -0.77857, 1.3822], n))
+            z = (-np.log(gamma - np.log1p(-w)) - mu) / sigma
+        else:
+            log_n = math.log(n)
+            mu = np.polyval([0.0038915, -0.083751, -0.31082, -1.5861], log_n)
+            sigma = math.exp(np.polyval([0.0030302, -0.082676, -0.4803], log_n))
+            z = (np.log1p(-w) - mu) / sigma
+    return normal_sf(z)
+
+
+def shapiro_wilk(values):
+    """Shapiro-Wilk W, p-value and n of every row (NaN = missing); rows with n < 3 get NaN.
+
+    Rows with the same number of values share one coefficient vector and are
+    computed as one matrix product.
+    """
+    ordered, counts = _compact(values)
+    w = np.full(len(counts), np.nan)
+    p = np.full(len(counts), np.nan)
+    for n in np.unique(counts[counts >= 3]):
+        rows = counts == n
+        x = ordered[rows, :n]
+        ss = np.sum((x - x.mean(axis=1, keepdims=True)) ** 2, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w[rows] = np.minimum((x @ _shapiro_coefficients(int(n))) ** 2 / ss, 1.0)
+        p[rows] = _shapiro_p(w[rows], int(n))
+    return w, p, counts
+
+
+def paired_t_test(x, y):
+    """Paired t-test of every row pair: (t, two-sided p, mean difference x - y, n)."""
+    d = np.atleast_2d(np.asarray(x, dtype=np.float64) - np.asarray(y, dtype=np.float64))
+    n = np.sum(~np.isnan(d), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(d, axis=1) / n
+        sd = np.sqrt(np.nansum((d - mean[:, None]) ** 2, axis=1) / (n - 1))
+        t = mean / (sd / np.sqrt(n))
+    p = np.where(n >= 2, t_sf_two_sided(t, n - 1), np.nan)
+    return t, p, mean, n
+
+
+def _rank_sum_cdf(n):
+    """P(R+ <= k) for k = 0..n(n+1)/2 under the null of the signed-rank test (no ties)."""
+    counts = np.zeros(n * (n + 1) // 2 + 1)
+    counts[0] = 1
+    for rank in range(1, n + 1):
+        counts[rank:] = counts[rank:] + counts[:-rank].copy()
+    return np.cumsum(counts) / 2.0 ** n
+
+
+def _sign_flip_p(ranks, observed):
+    """Two-sided p of a rank sum over all 2**n sign assignments (exact, also with ties)."""
+    n = len(ranks)
+    signs = (np.arange(2 ** n)[:, None] >> np.arange(n)) & 1
+    null = signs @ ranks
+    tolerance = 1e-12 * max(1.0, abs(observed))
+    return min(1.0, 2 * min(np.mean(null <= observed + tolerance), np.mean(null >= observed - tolerance)))
+
+
+def _average_ranks(values):
+    """1-based ranks within each row, tied values sharing their average rank (NaN ranked last, apart)."""
+    order = np.argsort(values, axis=1, kind='stable')
+    ordered = np.take_along_axis(values, order, axis=1)
+    position = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+    starts = np.ones(values.shape, dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    ends = np.ones(values.shape, dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    # First and last position of the tie group of every sorted value
+    first = np.maximum.accumulate(np.where(starts, position, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, position, values.shape[1])[:, ::-1], axis=1)[:, ::-1]
+    ranks = np.empty(values.shape)
+    np.put_along_axis(ranks, order, (first + last) / 2 + 1, axis=1)
+    return ranks
+
+
+def wilcoxon(x, y):
+    """Wilcoxon signed-rank test of every row pair: (W, two-sided p, median difference, n).
+
+    Zero differences are dropped and tied |d| get average ranks; W is the
+    smaller of the positive and negative rank sums. The p-value follows
+    scipy.stats.wilcoxon: exact null distribution without ties or zeros (up to
+    50 pairs), exact sign-flip enumeration with ties or zeros (up to 13 pairs),
+    otherwise the normal approximation with a tie correction.
+    """
+    d = np.atleast_2d(np.asarray(x, dtype=np.float64) - np.asarray(y, dtype=np.float64))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN rows
+        median = np.nanmedian(d, axis=1)
+    pairs = np.sum(~np.isnan(d), axis=1)
+    valid = ~np.isnan(d) & (d != 0)
+    magnitude = np.where(valid, np.abs(d), np.nan)
+    ranks = np.where(valid, _average_ranks(magnitude), 0.0)
+    r_plus = np.sum(np.where(d > 0, ranks, 0.0), axis=1)
+    r_minus = np.sum(np.where(d < 0, ranks, 0.0), axis=1)
+    w = np.minimum(r_plus, r_minus)
+    n = valid.sum(axis=1)
+
+    p = np.full(len(n), np.nan)
+    for i in np.flatnonzero(n):
+        n_i = int(n[i])
+        row_ranks = ranks[i][valid[i]]
+        has_ties = len(np.unique(row_ranks)) < n_i
+        if not has_ties and pairs[i] == n_i and n_i <= 50:
+            cdf = _rank_sum_cdf(n_i)
+            p[i] = min(1.0, 2 * cdf[int(w[i])])
+        elif pairs[i] <= 13:
+            p[i] = _sign_flip_p(row_ranks, r_plus[i])
+        else:
+            _, tie_counts = np.unique(row_ranks, return_counts=True)
+            variance = n_i * (n_i + 1) * (2 * n_i + 1) / 24 - np.sum(tie_counts ** 3 - tie_counts) / 48
+            z = (r_plus[i] - n_i * (n_i + 1) / 4) / math.sqrt(variance)
+            p[i] = min(1.0, 2 * float(normal_sf(abs(z))))
+    return w, p, median, n
+
+
+def _resample_chunks(n_resamples, cells_per_resample, seed):
+    """(chunk size, Generator) pairs covering n_resamples, at most CHUNK_CELLS cells per chunk."""
+    chunk = max(1, min(n_resamples, CHUNK_CELLS // max(cells_per_resample, 1)))
+    sizes = [chunk] * (n_resamples // chunk) + ([n_resamples % chunk] if n_resamples % chunk else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    return [(size, np.random.default_rng(child)) for size, child in zip(sizes, seeds)]
+
+
+def permutation_test(x, y, n_resamples=N_RESAMPLES, seed=SEED):
+    """Sign-flip permutation test of the mean paired difference of every row: two-sided p.
+
+    Each chunk of (resamples x users) random signs is applied to all rows as a
+    single matrix product; missing pairs contribute 0.
+    """
+    d = np.atleast_2d(np.asarray(x, dtype=np.float64) - np.asarray(y, dtype=np.float64))
+    n = np.sum(~np.isnan(d), axis=1)
+    d0 = np.nan_to_num(d)
+    extreme = np.zeros(len(d), dtype=np.int64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed = d0.sum(axis=1) / n
+        for size, rng in _resample_chunks(n_resamples, d.shape[1], seed):
+            signs = rng.choice([-1.0, 1.0], size=(size, d.shape[1]))
+            null = (signs @ d0.T) / n  # (size, rows)
+            extreme += np.sum(np.abs(null) >= np.abs(observed) - 1e-12, axis=0)
+    return np.where(n > 0, (extreme + 1) / (n_resamples + 1), np.nan)
+
+
+def bootstrap_ci(x, y=None, n_resamples=N_RESAMPLES, confidence=0.95, seed=SEED, statistic='mean'):
+    """Percentile bootstrap CI of the mean (or median) of every row, resampling users.
+
+    With y given the rows are paired differences x - y. Each row's valid values
+    are moved to the front and resampled with (rows x resamples x n) index
+    matrices, one per chunk. Returns (low, high).
+    """
+    values = np.asarray(x, dtype=np.float64)
+    if y is not None:
+        values = values - np.asarray(y, dtype=np.float64)
+    ordered, counts = _compact(values)
+    width = max(int(counts.max()) if counts.size else 0, 1)
+    in_sample = np.arange(width) < counts[:, None, None]
+    estimates = []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN rows
+        for size, rng in _resample_chunks(n_resamples, len(counts) * width, seed):
+            index = np.floor(rng.random((len(counts), size, width)) * counts[:, None, None]).astype(np.intp)
+            samples = np.where(in_sample, np.take_along_axis(ordered[:, None, :width], index, axis=2), np.nan)
+            estimates.append(np.nanmedian(samples, axis=2) if statistic == 'median' else np.nanmean(samples, axis=2))
+        estimates = np.concatenate(estimates, axis=1)
+        tail = (1 - confidence) / 2 * 100
+        low, high = np.nanpercentile(estimates, [tail, 100 - tail], axis=1)
+    empty = counts == 0
+    return np.where(empty, np.nan, low), np.where(empty, np.nan, high)
+
+
+# All tests at once
+
+def run_tests(table, n_resamples=N_RESAMPLES, seed=SEED):
+    """Every test for every grouping and metric.
+
+    Returns a dict with the metric matrix ('columns', 'values'), the
+    per-column Shapiro-Wilk results ('normality') and the paired results
+    ('paired'), one dict per (grouping, metric) with Text/Audio means and
+    medians, t-test, Wilcoxon, permutation p and bootstrap CI.
+    """
+    columns, values = user_metrics(table)
+    w, p, n = shapiro_wilk(values)
+    normality = [{'grouping': grouping, 'metric': metric, 'answer_type': answer_type,
+                  'w': w[i], 'p': p[i], 'n': int(n[i])}
+                 for i, (grouping, metric, answer_type) in enumerate(columns)]
+
+    pairs, text, audio = paired_rows(columns, values)
+    t, t_p, mean_diff, t_n = paired_t_test(text, audio)
+    wx, wx_p, median_diff, wx_n = wilcoxon(text, audio)
+    perm_p = permutation_test(text, audio, n_resamples, seed)
+    ci_low, ci_high = bootstrap_ci(text, audio, n_resamples, seed=seed)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN rows
+        means = np.nanmean(text, axis=1), np.nanmean(audio, axis=1)
+        medians = np.nanmedian(text, axis=1), np.nanmedian(audio, axis=1)
+    paired = [{'grouping': grouping, 'metric': metric, 'n': int(t_n[i]),
+               'text_mean': means[0][i], 'audio_mean': means[1][i],
+               'text_median': medians[0][i], 'audio_median': medians[1][i],
+               't': t[i], 't_p': t_p[i], 'mean_diff': mean_diff[i],
+               'wilcoxon_w': wx[i], 'wilcoxon_p': wx_p[i], 'median_diff': median_diff[i],
+               'wilcoxon_n': int(wx_n[i]), 'permutation_p': perm_p[i],
+               'ci_low': ci_low[i], 'ci_high': ci_high[i]}
+              for i, (grouping, metric) in enumerate(pairs)]
+    return {'columns': columns, 'values': values, 'normality': normality, 'paired': paired,
+            'n_resamples': n_resamples, 'seed': seed}
+
+
+def _fmt(value):
+    return '' if value is None or (isinstance(value, float) and math.isnan(value)) else f'{value:.6g}'
+
+
+def write_tests_csv(tests, path=TESTS_FILE):
+    """One row per test: Shapiro-Wilk per (grouping, metric, answer type), then paired tests."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['test', 'grouping', 'metric', 'answer_type', 'n', 'statistic', 'p_value',
+                         'effect', 'ci_low', 'ci_high', 'significant'])
+        for row in tests['normality']:
+            writer.writerow(['shapiro_wilk', row['grouping'], row['metric'], row['answer_type'], row['n'],
+                             _fmt(row['w']), _fmt(row['p']), '', '', '',
+                             '' if math.isnan(row['p']) else row['p'] <= ALPHA])
+        for row in tests['paired']:
+            for test, statistic, p, effect, ci, n in (
+                    ('paired_t_test', row['t'], row['t_p'], row['mean_diff'], (row['ci_low'], row['ci_high']), row['n']),
+                    ('wilcoxon', row['wilcoxon_w'], row['wilcoxon_p'], row['median_diff'], (None, None),
+                     row['wilcoxon_n']),
+                    ('permutation', None, row['permutation_p'], row['mean_diff'], (row['ci_low'], row['ci_high']),
+                     row['n'])):
+                writer.writerow([test, row['grouping'], row['metric'], 'Text-Audio', n, _fmt(statistic), _fmt(p),
+                                 _fmt(effect), _fmt(ci[0]), _fmt(ci[1]),
+                                 '' if math.isnan(p) else p < ALPHA])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text vs Audio significance tests on the corrected CSVs.")
+    parser.add_argument('--resamples', type=int, default=N_RESAMPLES,
+                        help=f"Permutation / bootstrap resamples (default: {N_RESAMPLES})")
+    parser.add_argument('--seed', type=int, default=SEED, help=f"Resampling seed (default: {SEED})")
+    args = parser.parse_args()
+
+    table = AnswerTable.from_csv_tree(USER_CSVS_DIR, exclude_users=EXCLUDED_USERS)
+    tests = run_tests(table, n_resamples=args.resamples, seed=args.seed)
+    write_tests_csv(tests)
+    for row in tests['paired']:
+        print(f"{row['grouping']:>8} {row['metric']:<8} n={row['n']:<3} t={row['t']:.4f} p={row['t_p']:.4f}  "
+              f"W={row['wilcoxon_w']:.1f} p={row['wilcoxon_p']:.4f}  perm p={row['permutation_p']:.4f}  "
+              f"95% CI [{row['ci_low']:.2f}, {row['ci_high']:.2f}]")
+    print(f"Saved {TESTS_FILE}")
+
+
+if __name__ == '__main__':
+    main()
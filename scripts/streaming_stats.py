@@ -0,0 +1,138 @@
+"""
+Mergeable streaming accumulators for the summary statistics.
+
+Values are added one at a time and never kept:
+    RunningStats   -> count, sum, min and max
+    QuantileSketch -> log-bucketed histogram for quantiles (p50 / p90 / p99)
+    TimeStats      -> both, for one series of response times
+Memory is O(1) for RunningStats and O(log(max / min) / alpha) buckets for the
+sketch, independent of the number of answers.
+
+Every accumulator has merge(): statistics of separate shards (processes,
+export files, incremental runs) combine into the statistics of their union.
+The sketch buckets are fixed by alpha alone (no random compaction, unlike KLL
+or t-digest), so a merged sketch is identical to the sketch of the whole
+stream, whatever the split and the order. The sum is exact for integer values
+(milliseconds), so means do not depend on the split either.
+"""
+
+import math
+
+SKETCH_ALPHA = 0.005  # relative accuracy of the quantiles (0.5%)
+
+
+class RunningStats:
+    """count / sum / min / max / mean of a stream of numbers."""
+
+    __slots__ = ('count', 'total', 'minimum', 'maximum')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def merge(self, other):
+        """Fold other into self; returns self."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.total = other.count, other.total
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return self
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+
+class QuantileSketch:
+    """Quantiles within a relative error alpha, from a log-bucketed histogram.
+
+    A positive value x falls in bucket ceil(log(x) / log(gamma)), gamma =
+    (1 + alpha) / (1 - alpha); each bucket is reported by the value within
+    alpha of all its members. Values <= 0 are counted separately.
+    """
+
+    __slots__ = ('alpha', 'gamma', 'log_gamma', 'buckets', 'zero_count', 'count')
+
+    def __init__(self, alpha=SKETCH_ALPHA):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other):
+        """Fold other into self; both must use the same alpha. Returns self."""
+        if other.alpha != self.alpha:
+            raise ValueError(f'Cannot merge sketches with alpha {self.alpha} and {other.alpha}')
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        return self
+
+    def quantile(self, q):
+        """Value at quantile q (0..1): the bucket holding the value of rank floor(q * (count - 1))."""
+        if self.count == 0:
+            return None
+        rank = math.floor(q * (self.count - 1))
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class TimeStats:
+    """RunningStats + QuantileSketch of one series (e.g. Text response times in ms)."""
+
+    __slots__ = ('stats', 'sketch')
+
+    def __init__(self, alpha=SKETCH_ALPHA):
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch(alpha)
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    @property
+    def mean(self):
+        return self.stats.mean
+
+    def add(self, value):
+        self.stats.add(value)
+        self.sketch.add(value)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
@@ -0,0 +1,331 @@
+"""
+Bootstrap confidence intervals for every metric of summary.csv.
+
+The numbers in general_statistics/summary.csv (and the standard / control
+accuracies of the charts) are point estimates over one cohort of users. Here
+every user of a corrected CSV tree is reduced to one row of additive
+components (answers, timed answers, time sums, Correct/Wrong marks per answer
+type and per question kind, tab changes, time spent, ...). Each metric is a
+function of the column totals, e.g. Text Accuracy = text_correct /
+(text_correct + text_wrong).
+
+Resampling users (not answers) with replacement then only needs, per chunk of
+resamples, one (resamples x users) index matrix: it is turned into
+multiplicity weights with np.bincount, and the totals of all resamples come
+from a single weights @ components product. Chunks have a fixed size and their
+own seed (SeedSequence.spawn), so the intervals are the same whether they run
+in one process or in a pool (--jobs).
+
+    python3 summary_intervals.py                    # -> output/general_statistics/summary_ci.csv
+    python3 summary_intervals.py --resamples 50000 --jobs 4
+"""
+
+import argparse
+import csv
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from answer_table import EXCLUDED_USERS, AnswerTable, parse_mmss_to_ms
+
+CORRECTED_DIR = '../manual_corrected_csvs'
+INTERVALS_FILE = '../output/general_statistics/summary_ci.csv'
+N_RESAMPLES = 10000
+SEED = 0
+CONFIDENCE = 0.95
+CHUNK_CELLS = 4_000_000  # resamples x users per index matrix (~32 MB)
+
+COMPONENTS = (
+    'users', 'submitted', 'in_progress', 'answered', 'time_spent_s',
+    'tab_users', 'tab_sum', 'tab_zero',
+    'text_answers', 'audio_answers',
+    'text_timed', 'text_time_s', 'audio_timed', 'audio_time_s',
+    'text_correct', 'text_wrong', 'audio_correct', 'audio_wrong',
+    'standard_correct', 'standard_wrong', 'control_correct', 'control_wrong',
+)
+# Per-user values whose max / min (not sum) over the resampled users is needed
+EXTREMES = ('tab_changes',)
+
+
+def _ratio(numerator, denominator, scale=1.0):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator > 0, numerator * scale / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+def _accuracy(correct, wrong):
+    return _ratio(correct, correct + wrong, 100.0)
+
+
+# summary.csv metric -> (unit, function of the totals). Units: 'count', 'ratio', '%', 'mm:ss' (seconds).
+# 'Text performs better than Audio' (Yes/No) has no interval and is left out.
+# 'Total Users (Count)' is the same in every resample and has no interval either.
+METRICS = {
+    'Submitted Users (Count)': ('count', lambda t: t['submitted']),
+    'In Progress Users (Count)': ('count', lambda t: t['in_progress']),
+    'Total Answers (Count)': ('count', lambda t: t['text_answers'] + t['audio_answers']),
+    'Total Text Answers (Count)': ('count', lambda t: t['text_answers']),
+    'Total Audio Answers (Count)': ('count', lambda t: t['audio_answers']),
+    'Text vs Audio Ratio': ('ratio', lambda t: _ratio(t['text_answers'], t['audio_answers'])),
+    'Average Time to Answer - Overall (mm:ss)':
+        ('mm:ss', lambda t: _ratio(t['text_time_s'] + t['audio_time_s'], t['text_timed'] + t['audio_timed'])),
+    'Average Time to Answer - Text (mm:ss)': ('mm:ss', lambda t: _ratio(t['text_time_s'], t['text_timed'])),
+    'Average Time to Answer - Audio (mm:ss)': ('mm:ss', lambda t: _ratio(t['audio_time_s'], t['audio_timed'])),
+    'Audio takes longer than Text by (mm:ss)':
+        ('mm:ss', lambda t: _ratio(t['audio_time_s'], t['audio_timed']) - _ratio(t['text_time_s'], t['text_timed'])),
+    'Audio/Text Time Ratio':
+        ('ratio', lambda t: _ratio(_ratio(t['audio_time_s'], t['audio_timed']), _ratio(t['text_time_s'], t['text_timed']))),
+    'Total Graded Answers (Count)':
+        ('count', lambda t: t['text_correct'] + t['text_wrong'] + t['audio_correct'] + t['audio_wrong']),
+    'Total Correct Answers (Count)': ('count', lambda t: t['text_correct'] + t['audio_correct']),
+    'Total Wrong Answers (Count)': ('count', lambda t: t['text_wrong'] + t['audio_wrong']),
+    'Overall Accuracy (%)':
+        ('%', lambda t: _accuracy(t['text_correct'] + t['audio_correct'], t['text_wrong'] + t['audio_wrong'])),
+    'Text Answers - Graded (Count)': ('count', lambda t: t['text_correct'] + t['text_wrong']),
+    'Text Answers - Correct (Count)': ('count', lambda t: t['text_correct']),
+    'Text Answers - Wrong (Count)': ('count', lambda t: t['text_wrong']),
+    'Text Accuracy (%)': ('%', lambda t: _accuracy(t['text_correct'], t['text_wrong'])),
+    'Audio Answers - Graded (Count)': ('count', lambda t: t['audio_correct'] + t['audio_wrong']),
+    'Audio Answers - Correct (Count)': ('count', lambda t: t['audio_correct']),
+    'Audio Answers - Wrong (Count)': ('count', lambda t: t['audio_wrong']),
+    'Audio Accuracy (%)': ('%', lambda t: _accuracy(t['audio_correct'], t['audio_wrong'])),
+    'Text vs Audio Performance Gap (%)':
+        ('%', lambda t: _accuracy(t['text_correct'], t['text_wrong']) - _accuracy(t['audio_correct'], t['audio_wrong'])),
+    'Average Tab Changes per User (Count)': ('ratio', lambda t: _ratio(t['tab_sum'], t['tab_users'])),
+    'Max Tab Changes (Count)': ('count', lambda t: t['tab_changes_max']),
+    'Min Tab Changes (Count)': ('count', lambda t: t['tab_changes_min']),
+    'Users with 0 Tab Changes (Count)': ('count', lambda t: t['tab_zero']),
+    'Users with Tab Changes (Count)': ('count', lambda t: t['tab_users'] - t['tab_zero']),
+    'Total Answered Questions (Count)': ('count', lambda t: t['answered']),
+    'Total Time Spent by All Users (mm:ss)': ('mm:ss', lambda t: t['time_spent_s']),
+    'Average Time Spent per User (mm:ss)': ('mm:ss', lambda t: _ratio(t['time_spent_s'], t['submitted'])),
+    # The three accuracy metrics of chart 8 (visuals_dataset.accuracy_metrics)
+    'Standard + Control Accuracy (%)':
+        ('%', lambda t: _accuracy(t['standard_correct'] + t['control_correct'], t['standard_wrong'] + t['control_wrong'])),
+    'Control Accuracy (%)': ('%', lambda t: _accuracy(t['control_correct'], t['control_wrong'])),
+    'Core Accuracy (%)': ('%', lambda t: _accuracy(t['standard_correct'], t['standard_wrong'])),
+}
+
+
+def _number(value):
+    """Integer cell of users.csv, None for 'N/A' / empty."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def user_components(answers, users_rows):
+    """Per-user component matrix of a corrected tree.
+
+    answers: AnswerTable of the answers.csv files; users_rows: rows of
+    general_statistics/users.csv (csv.DictReader). Users of either source are
+    included, so both must leave out the same users (EXCLUDED_USERS for the
+    cohort of summary.csv). Returns (user_ids, components (users x len(COMPONENTS)),
+    extremes (users x len(EXTREMES), NaN = no value)). Users without data count
+    as submitted and are left out of the tab statistics, as in summary.csv.
+    """
+    user_ids = sorted(set(answers.labels['user_id']) | {row['User ID'] for row in users_rows})
+    index = {user_id: i for i, user_id in enumerate(user_ids)}
+    components = np.zeros((len(user_ids), len(COMPONENTS)))
+    extremes = np.full((len(user_ids), len(EXTREMES)), np.nan)
+    column = {name: i for i, name in enumerate(COMPONENTS)}
+    components[:, column['users']] = 1
+
+    for row in users_rows:
+        i = index[row['User ID']]
+        status = row.get('Status', '')
+        components[i, column['submitted']] = status in ('Submitted', 'No Data')
+        components[i, column['in_progress']] = status not in ('Submitted', 'No Data')
+        components[i, column['answered']] = _number(row.get('Answered (Count)')) or 0
+        time_spent_ms = parse_mmss_to_ms(row.get('Time Spent (mm:ss)', ''))
+        components[i, column['time_spent_s']] = 0 if np.isnan(time_spent_ms) else time_spent_ms / 1000
+        tab_changes = _number(row.get('Tab Changes (Count)'))
+        if status != 'No Data' and tab_changes is not None:
+            components[i, column['tab_users']] = 1
+            components[i, column['tab_sum']] = tab_changes
+            components[i, column['tab_zero']] = tab_changes == 0
+            extremes[i, EXTREMES.index('tab_changes')] = tab_changes
+
+    # Per-user group-bys of the answer table, mapped onto user_ids
+    rows = np.array([index[user_id] for user_id in answers.labels['user_id']], dtype=np.intp)
+    for answer_type in ('Text', 'Audio'):
+        prefix = answer_type.lower()
+        of_type = answers.mask(answer_type=answer_type)
+        timed, time_ms, _ = answers.time_stats('user_id', of_type)
+        correct, wrong = answers.accuracy_counts('user_id', of_type)
+        components[rows, column[f'{prefix}_answers']] = answers.group_count('user_id', of_type)
+        components[rows, column[f'{prefix}_timed']] = timed
+        components[rows, column[f'{prefix}_time_s']] = time_ms / 1000
+        components[rows, column[f'{prefix}_correct']] = correct
+        components[rows, column[f'{prefix}_wrong']] = wrong
+    for kind in ('standard', 'control'):
+        correct, wrong = answers.accuracy_counts('user_id', answers.mask(kind=kind))
+        components[rows, column[f'{kind}_correct']] = correct
+        components[rows, column[f'{kind}_wrong']] = wrong
+    return user_ids, components, extremes
+
+
+def _totals(weights, components, extremes):
+    """Column totals (and extremes) of each row of multiplicity weights: name -> array."""
+    sums = weights @ components
+    totals = {name: sums[:, i] for i, name in enumerate(COMPONENTS)}
+    present = weights > 0
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # resamples without any value
+        for i, name in enumerate(EXTREMES):
+            values = np.where(present, extremes[:, i], np.nan)
+            totals[f'{name}_max'] = np.nanmax(values, axis=1)
+            totals[f'{name}_min'] = np.nanmin(values, axis=1)
+    return totals
+
+
+def _evaluate(totals):
+    """(len(METRICS), resamples) matrix of metric values."""
+    return np.array([np.broadcast_to(np.asarray(function(totals), dtype=np.float64), len(totals['users']))
+                     for _, function in METRICS.values()])
+
+
+def resample_chunk(components, extremes, size, seed):
+    """Metric values of `size` bootstrap resamples of the users (one index matrix)."""
+    n_users = len(components)
+    index = np.random.default_rng(seed).integers(0, n_users, size=(size, n_users))
+    offsets = np.arange(size)[:, None] * n_users
+    weights = np.bincount((index + offsets).ravel(), minlength=size * n_users).reshape(size, n_users)
+    return _evaluate(_totals(weights.astype(np.float64), components, extremes))
+
+
+def bootstrap_metrics(components, extremes, n_resamples=N_RESAMPLES, seed=SEED, jobs=1):
+    """(len(METRICS), n_resamples) matrix of bootstrap metric values.
+
+    Chunk sizes depend only on the number of users, and every chunk has its
+    own child seed, so the result does not depend on jobs.
+    """
+    n_users = max(len(components), 1)
+    chunk = max(1, min(n_resamples, CHUNK_CELLS // n_users))
+    sizes = [chunk] * (n_resamples // chunk) + ([n_resamples % chunk] if n_resamples % chunk else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    run = partial(resample_chunk, components, extremes)
+    if jobs > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            chunks = list(pool.map(run, sizes, seeds))
+    else:
+        chunks = [run(size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+    return np.concatenate(chunks, axis=1)
+
+
+def summary_estimates(answers, users_rows):
+    """metric -> value of every metric of METRICS on the whole cohort (no resampling)."""
+    _, components, extremes = user_components(answers, users_rows)
+    estimates = _evaluate(_totals(np.ones((1, len(components))), components, extremes))[:, 0]
+    return {name: float(estimates[i]) for i, name in enumerate(METRICS)}
+
+
+def summary_intervals(answers, users_rows, n_resamples=N_RESAMPLES, seed=SEED, confidence=CONFIDENCE, jobs=1):
+    """metric -> {'unit', 'estimate', 'low', 'high'} for the metrics of METRICS.
+
+    estimate is the metric on the whole cohort; low / high the percentile
+    bootstrap interval over resampled users (NaN when undefined). Metrics
+    whose interval is a single value (e.g. a minimum of 0 tab changes) are
+    left out.
+    """
+    _, components, extremes = user_components(answers, users_rows)
+    estimates = _evaluate(_totals(np.ones((1, len(components))), components, extremes))[:, 0]
+    samples = bootstrap_metrics(components, extremes, n_resamples, seed, jobs)
+    tail = (1 - confidence) / 2 * 100
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # metrics undefined in every resample
+        low, high = np.nanpercentile(samples, [tail, 100 - tail], axis=1)
+    return {name: {'unit': unit, 'estimate': float(estimates[i]), 'low': float(low[i]), 'high': float(high[i])}
+            for i, (name, (unit, _)) in enumerate(METRICS.items()) if not low[i] == high[i]}
+
+
+def format_value(value, unit):
+    """A value in the notation of summary.csv ('76.85%', '0:19', '1.98').
+
+    mm:ss drops the fraction of a second, as generate_csv.ms_to_time_format does.
+    """
+    if np.isnan(value):
+        return 'N/A'
+    if unit == '%':
+        return f'{value:.2f}%'
+    if unit == 'mm:ss':
+        sign, seconds = ('-' if value < 0 else ''), int(abs(value))
+        return f'{sign}{seconds // 60}:{seconds % 60:02d}'
+    if unit == 'count' and value == int(value):
+        return str(int(value))
+    return f'{round(value, 2):g}'
+
+
+def write_intervals_csv(intervals, path=INTERVALS_FILE, confidence=CONFIDENCE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    level = f'{confidence * 100:g}%'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Metric', 'Estimate', f'CI Low ({level})', f'CI High ({level})'])
+        for name, interval in intervals.items():
+            unit = interval['unit']
+            writer.writerow([name, format_value(interval['estimate'], unit),
+                             format_value(interval['low'], unit), format_value(interval['high'], unit)])
+
+
+def load_users_rows(corrected_dir=CORRECTED_DIR, exclude_users=()):
+    users_file = Path(corrected_dir) / 'general_statistics' / 'users.csv'
+    if not users_file.exists():
+        return []
+    with open(users_file, 'r', encoding='utf-8', newline='') as f:
+        return [row for row in csv.DictReader(f) if row['User ID'] not in exclude_users]
+
+
+def summary_mismatches(intervals, corrected_dir=CORRECTED_DIR):
+    """[(metric, estimate, summary.csv value)] of the metrics whose estimate is not the value in summary.csv."""
+    summary_file = Path(corrected_dir) / 'general_statistics' / 'summary.csv'
+    if not summary_file.exists():
+        return []
+    with open(summary_file, 'r', encoding='utf-8', newline='') as f:
+        summary = {row['Metric']: row['Value'] for row in csv.DictReader(f)}
+    mismatches = []
+    for name, interval in intervals.items():
+        estimate = format_value(interval['estimate'], interval['unit'])
+        reported = summary.get(name)
+        # Count ratios are written as '1.98:1'
+        if reported is not None and reported.removesuffix(':1') != estimate:
+            mismatches.append((name, estimate, reported))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals for the summary.csv metrics.")
+    parser.add_argument('--corrected', default=CORRECTED_DIR,
+                        help=f"Corrected CSV tree (default: {CORRECTED_DIR})")
+    parser.add_argument('--output', default=INTERVALS_FILE, help=f"Output CSV (default: {INTERVALS_FILE})")
+    parser.add_argument('--resamples', type=int, default=N_RESAMPLES,
+                        help=f"Bootstrap resamples of the users (default: {N_RESAMPLES})")
+    parser.add_argument('--seed', type=int, default=SEED, help=f"Resampling seed (default: {SEED})")
+    parser.add_argument('--confidence', type=float, default=CONFIDENCE,
+                        help=f"Confidence level (default: {CONFIDENCE})")
+    parser.add_argument('--jobs', type=int, default=1, help="Worker processes for the resampling (default: 1)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    answers = AnswerTable.from_csv_tree(Path(args.corrected) / 'user_csvs', exclude_users=EXCLUDED_USERS)
+    users_rows = load_users_rows(args.corrected, EXCLUDED_USERS)
+    intervals = summary_intervals(answers, users_rows, args.resamples, args.seed, args.confidence, args.jobs)
+    write_intervals_csv(intervals, args.output, args.confidence)
+
+    for name, interval in intervals.items():
+        unit = interval['unit']
+        print(f"{name:<45} {format_value(interval['estimate'], unit):>8}  "
+              f"[{format_value(interval['low'], unit)}, {format_value(interval['high'], unit)}]")
+    for name, estimate, reported in summary_mismatches(intervals, args.corrected):
+        print(f"Warning: {name} is {estimate} on the answers, {reported} in summary.csv")
+    print(f"{args.resamples} resamples in {time.perf_counter() - start:.2f}s")
+    print(f"Saved {args.output}")
+
+
+if __name__ == '__main__':
+    main()
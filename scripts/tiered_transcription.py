@@ -0,0 +1,90 @@
+"""
+Fast-model-first transcription with confidence-gated escalation.
+
+Most audio answers are one or two technical terms that the small Whisper
+models already get right. A clip is first transcribed with a fast model
+(tiny/base); the result is kept when Whisper is confident about it and it
+matches the expected-answer vocabulary of that question (examQuestions.ts,
+see parse_questions.py). Otherwise the clip is transcribed again with the
+accurate model (small or larger), which is only loaded on the first escalation.
+"""
+
+import json
+import re
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from parse_questions import parse_question_details
+
+EXPECTED_ANSWERS_FILE = Path('../data/question_answers.json')
+
+DEFAULT_FAST_MODEL = 'base'
+DEFAULT_ACCURATE_MODEL = 'small'
+
+MIN_AVG_LOGPROB = -0.5  # any segment below this escalates
+MAX_COMPRESSION_RATIO = 2.0  # any segment above this (repetitions) escalates
+MIN_MATCH_RATIO = 0.8  # fuzzy similarity needed to count as an expected answer
+
+
+def load_expected_answers(path=EXPECTED_ANSWERS_FILE):
+    """question_id -> expected answers and options (question_answers.json, or parsed from examQuestions.ts)."""
+    if Path(path).exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            details = json.load(f)
+    else:
+        details = parse_question_details()
+    return {question_id: question['answers'] + question['options']
+            for question_id, question in details.items()}
+
+
+def normalize(text):
+    """Lowercase words without punctuation: "Prim's algorithm." -> "prims algorithm"."""
+    text = re.sub(r"[^\w\s]", '', text.lower())
+    return ' '.join(text.split())
+
+
+def matches_vocabulary(text, expected):
+    """True if the transcription contains (or closely resembles) one of the expected answers.
+
+    Questions without expected answers always match.
+    """
+    if not expected:
+        return True
+    words = normalize(text).split()
+    for answer in expected:
+        target = normalize(answer)
+        n = len(target.split())
+        if not target:
+            continue
+        # Compare against every window of the same number of words
+        for start in range(max(1, len(words) - n + 1)):
+            window = ' '.join(words[start:start + n])
+            if window == target or SequenceMatcher(None, window, target).ratio() >= MIN_MATCH_RATIO:
+                return True
+    return False
+
+
+def is_confident(result, min_avg_logprob=MIN_AVG_LOGPROB, max_compression_ratio=MAX_COMPRESSION_RATIO):
+    """Whisper's own confidence for a transcribe() result: every segment must pass both thresholds."""
+    segments = result.get('segments') or []
+    if not segments or not result.get('text', '').strip():
+        return False
+    return all(segment['avg_logprob'] >= min_avg_logprob and segment['compression_ratio'] <= max_compression_ratio
+               for segment in segments)
+
+
+def transcribe_tiered(audio, question_id, get_model, options, expected_answers,
+                      fast_model=DEFAULT_FAST_MODEL, accurate_model=DEFAULT_ACCURATE_MODEL):
+    """Transcribe with the fast model, escalating to the accurate one when needed.
+
+    get_model(name) returns a loaded Whisper model (loading it on first use).
+    Returns (transcription, model_name) of the result that was kept.
+    """
+    result = get_model(fast_model).transcribe(audio, verbose=False, **options)
+    text = result['text'].strip()
+    if is_confident(result) and matches_vocabulary(text, expected_answers.get(question_id, [])):
+        return text, fast_model
+
+    print(f"    Escalating to '{accurate_model}' (fast result: '{text[:40]}')")
+    result = get_model(accurate_model).transcribe(audio, verbose=False, **options)
+    return result['text'].strip(), accurate_model
@@ -1,8 +1,22 @@
+import argparse
 import json
 import os
-import requests
-import tempfile
-from pathlib import Path
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_answers import AUDIO_DIR, audio_path_for, iter_audio_answers
+from audio_downloader import DEFAULT_WORKERS, create_session, download_all, download_file
+from audio_features import FEATURES_DIR, audio_input, prepare_features, prepare_one
+from batched_transcription import transcribe_batched
+from export_store import ExportStore, is_store
+from question_prompts import QUESTION_PROMPTS_FILE, load_question_prompts, prompt_options
+from transcription_cache import DEFAULT_CACHE_PATH, TranscriptionCache, cache_options
+from transcription_journal import TranscriptionJournal, apply_records, merge_journal
+from tiered_transcription import (DEFAULT_ACCURATE_MODEL, DEFAULT_FAST_MODEL, MAX_COMPRESSION_RATIO,
+                                  MIN_AVG_LOGPROB, MIN_MATCH_RATIO, load_expected_answers, transcribe_tiered)
+from transcription_workers import DEFAULT_MODEL_NAMES, default_threads_per_worker, transcribe_parallel
+from voice_activity import NO_SPEECH, VAD_OPTIONS, trim_silence
 
 try:
     import whisper
@@ -18,45 +32,88 @@ except ImportError:
     SR_AVAILABLE = False
     print("SpeechRecognition not installed. Run: pip install SpeechRecognition")
 
-# Load the JSON data
-print("Loading data from final.json...")
-with open('../data/final.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
+INPUT_FILE = '../data/final.json'
+OUTPUT_FILE = '../data/final_with_transcriptions.json'
+JOURNAL_FILE = '../data/transcribe_audio.journal.jsonl'  # results of an unfinished run
 
 # Audio files directory already exists
-audio_dir = Path('../data/audio_files')
+audio_dir = AUDIO_DIR
 
-def download_audio(url, output_path):
-    """Download audio file from URL"""
-    try:
-        print(f"    Downloading audio...")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
-        return True
-    except Exception as e:
-        print(f"    Error downloading: {e}")
-        return False
+DEFAULT_QUEUE_SIZE = 16
+
+# Whisper decoding settings (also part of the transcription cache key); the
+# exam-wide initial_prompt is replaced by the question's own prompt unless --static-prompt
+WHISPER_OPTIONS = {
+    'language': "en",  # Force English for better technical term recognition
+    'initial_prompt': "Computer science exam. Technical terms: merge sort, heap sort, bubble sort, quick sort, insertion sort, binary search, linear search, polymorphism, inheritance, encapsulation, overloading, overriding, RAM, ROM, DRAM, SRAM, CPU, ALU, cache, control unit, LAN, WAN, network, router, switch, HTTP, HTTPS, port, binary, algorithm, data structure, queue, stack, tree, graph, complexity, Big O notation, SQL, WHERE, TRUNCATE, destructor, constructor, delete, new, kernel, driver, compiler, operating system, Dijkstra, greedy, round robin, scheduling, IPv4, IPv6, MAC address, Saturday, Sunday, Monday, Tuesday, Wednesday, Thursday, Friday.",
+    'temperature': 0.0,  # More deterministic (less creative guessing)
+    'beam_size': 5,  # Better beam search for accuracy
+    'best_of': 5,  # Consider multiple candidates
+    'fp16': False,  # Use FP32 for better accuracy on CPU
+    'compression_ratio_threshold': 2.4,  # Detect and avoid repetitions
+    'logprob_threshold': -1.0,  # Filter out low confidence results
+    'no_speech_threshold': 0.6,  # Better silence detection
+    'condition_on_previous_text': True,  # Use context from previous segments
+    'word_timestamps': False,  # Focus on transcription accuracy, not timing
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download and transcribe the audio answers.")
+    parser.add_argument('--download-workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent audio downloads (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Overlap downloads and transcription (producer/consumer with a bounded queue)")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Downloaded files waiting for transcription in --pipeline mode (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Whisper worker processes, each loading its own model (default: 1)")
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help="Torch threads per worker process (default: cores / workers)")
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help="Decode up to N short clips per Whisper forward pass (default: 1, per-file transcribe())")
+    parser.add_argument('--use-features', action='store_true',
+                        help=f"Feed Whisper the decoded PCM in {FEATURES_DIR}/ (each file is decoded with ffmpeg only once)")
+    parser.add_argument('--tiered', action='store_true',
+                        help="Transcribe with a fast model first and escalate uncertain or unexpected answers")
+    parser.add_argument('--fast-model', default=DEFAULT_FAST_MODEL, choices=('tiny', 'base'),
+                        help=f"First-pass model in --tiered mode (default: {DEFAULT_FAST_MODEL})")
+    parser.add_argument('--accurate-model', default=DEFAULT_ACCURATE_MODEL, choices=('small', 'medium', 'large'),
+                        help=f"Escalation model in --tiered mode (default: {DEFAULT_ACCURATE_MODEL})")
+    parser.add_argument('--vad', action='store_true',
+                        help="Trim leading/trailing silence and skip silent clips before Whisper (energy-based VAD)")
+    parser.add_argument('--static-prompt', action='store_true',
+                        help=f"Use the exam-wide initial_prompt for every clip instead of the per-question prompts ({QUESTION_PROMPTS_FILE})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f"Do not read or write the transcription cache ({DEFAULT_CACHE_PATH})")
+    parser.add_argument('--input', default=INPUT_FILE,
+                        help=f"Export to transcribe, e.g. one exam session of several (default: {INPUT_FILE})")
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help=f"Export written with the transcriptions (default: {OUTPUT_FILE})")
+    parser.add_argument('--store', default=None,
+                        help="Read and update this export store (export_store.py) in place, instead of "
+                             "--input -> --output")
+    parser.add_argument('--restart', action='store_true',
+                        help=f"Discard the journal of an interrupted run ({JOURNAL_FILE}) instead of resuming it")
+    args = parser.parse_args()
+    if args.tiered and (args.workers > 1 or args.batch_size > 1):
+        parser.error("--tiered runs in a single process, one file at a time (no --workers / --batch-size)")
+    if args.pipeline and args.workers > 1:
+        parser.error("--pipeline feeds a single transcription loop (no --workers)")
+    return args
+
+def download_audio(url, output_path, session):
+    """Download audio file from URL (streamed, atomic, with retries)"""
+    print(f"    Downloading audio...")
+    return download_file(session, url, output_path)
 
-def transcribe_with_whisper(audio_path, model):
-    """Transcribe audio using Whisper with optimized settings for accuracy"""
+def transcribe_with_whisper(audio_path, model, prompt=None):
+    """Transcribe audio using Whisper with optimized settings for accuracy (and the question's prompt)"""
     try:
         print(f"    Transcribing with Whisper (high accuracy mode)...")
         result = model.transcribe(
-            str(audio_path),
-            language="en",  # Force English for better technical term recognition
-            initial_prompt="Computer science exam. Technical terms: merge sort, heap sort, bubble sort, quick sort, insertion sort, binary search, linear search, polymorphism, inheritance, encapsulation, overloading, overriding, RAM, ROM, DRAM, SRAM, CPU, ALU, cache, control unit, LAN, WAN, network, router, switch, HTTP, HTTPS, port, binary, algorithm, data structure, queue, stack, tree, graph, complexity, Big O notation, SQL, WHERE, TRUNCATE, destructor, constructor, delete, new, kernel, driver, compiler, operating system, Dijkstra, greedy, round robin, scheduling, IPv4, IPv6, MAC address, Saturday, Sunday, Monday, Tuesday, Wednesday, Thursday, Friday.",
+            audio_input(audio_path),  # .webm path, or the decoded PCM of a .npy feature file
             verbose=False,  # Don't print progress bar
-            temperature=0.0,  # More deterministic (less creative guessing)
-            beam_size=5,  # Better beam search for accuracy
-            best_of=5,  # Consider multiple candidates
-            fp16=False,  # Use FP32 for better accuracy on CPU
-            compression_ratio_threshold=2.4,  # Detect and avoid repetitions
-            logprob_threshold=-1.0,  # Filter out low confidence results
-            no_speech_threshold=0.6,  # Better silence detection
-            condition_on_previous_text=True,  # Use context from previous segments
-            word_timestamps=False  # Focus on transcription accuracy, not timing
+            **prompt_options(WHISPER_OPTIONS, prompt)
         )
         return result["text"].strip()
     except Exception as e:
@@ -78,187 +135,464 @@ def transcribe_with_speech_recognition(audio_path):
 
 def count_audio_answers(data):
     """Count total audio answers in the dataset"""
-    count = 0
-    
-    # Count in examProgress
-    for user_id, user_data in data.get('examProgress', {}).items():
-        if isinstance(user_data, dict) and 'answers' in user_data:
-            for answer in user_data['answers'].values():
-                if 'audioUrl' in answer:
-                    count += 1
-    
-    # Count in examResults
-    for user_id, results in data.get('examResults', {}).items():
-        for result_id, result_data in results.items():
-            if 'answers' in result_data:
-                for answer in result_data['answers'].values():
-                    if 'audioUrl' in answer:
-                        count += 1
-    
-    return count
+    return sum(1 for _ in iter_audio_answers(data))
 
-# Count audio answers
-audio_count = count_audio_answers(data)
-print(f"\nFound {audio_count} audio answers to transcribe\n")
-
-if audio_count == 0:
-    print("No audio files need transcription!")
-    exit(0)
-
-# Check if we have transcription tools available
-if not WHISPER_AVAILABLE and not SR_AVAILABLE:
-    print("No transcription libraries available!")
-    print("\nTo transcribe audio, install one of these:")
-    print("  1. OpenAI Whisper (recommended): pip install openai-whisper")
-    print("  2. SpeechRecognition: pip install SpeechRecognition")
-    exit(1)
-
-print(f"Using transcription method: {'Whisper (offline) - SMALL model (high accuracy)' if WHISPER_AVAILABLE else 'Google Speech Recognition (online)'}\n")
-
-# Load Whisper model once if available
-whisper_model = None
-if WHISPER_AVAILABLE:
+def load_whisper_model():
+    """Load the Whisper model once ('small', falling back to 'base').
+    
+    Returns (model, model_name), or (None, None) if unavailable.
+    """
+    if not WHISPER_AVAILABLE:
+        return None, None
     print("Loading Whisper model (this may take a moment)...")
     print("   Using 'small' model for high accuracy (slower but much better)")
     print("   Model sizes: tiny < base < small < medium < large")
     print("   'small' provides excellent accuracy for technical terms\n")
     try:
-        whisper_model = whisper.load_model("small")  # small model - high accuracy
+        model = whisper.load_model("small")  # small model - high accuracy
         print("Whisper model loaded!\n")
+        return model, "small"
     except Exception as e:
         print(f"Failed to load Whisper model: {e}")
         print("   Falling back to 'base' model...")
         try:
-            whisper_model = whisper.load_model("base")
+            model = whisper.load_model("base")
             print("Base model loaded!\n")
+            return model, "base"
         except:
-            WHISPER_AVAILABLE = False
+            return None, None
 
-transcribed_count = 0
-failed_count = 0
-skipped_count = 0
+def transcribe_answer(audio_path, whisper_model, prompt=None):
+    """Transcribe one file with the best available engine"""
+    if whisper_model:
+        return transcribe_with_whisper(audio_path, whisper_model, prompt)
+    if SR_AVAILABLE:
+        return transcribe_with_speech_recognition(audio_path)
+    return None
 
-# Process examProgress users
-print("=" * 60)
-print("Processing users in examProgress...")
-print("=" * 60)
-
-for user_id, user_data in data.get('examProgress', {}).items():
-    if not isinstance(user_data, dict) or 'answers' not in user_data:
-        continue
+def prepare_inputs(ready, cache, options, model_name, use_features=False, use_vad=False, prompts=None):
+    """Everything that does not need the Whisper model, for {audio_path: answer}.
     
-    print(f"\nUser: {user_id[:20]}...")
+    Runs the VAD (recording speechSpan in the answers), decodes features and
+    looks up the cache (under each file's own prompt, if prompts maps paths to
+    question prompts). Returns (resolved, misses): resolved is a list of
+    (audio_path, transcription) that need no decoding, misses maps each
+    remaining audio_path to the file the model should read.
+    """
+    audio_paths = list(ready)
+    inputs = {}
+    resolved = []
     
-    for question_id, answer in user_data['answers'].items():
-        if 'audioUrl' not in answer:
-            continue
-        
-        # Check if already transcribed
-        if 'transcription' in answer and answer['transcription']:
-            print(f"  ⏭️  {question_id}: Already transcribed, skipping")
-            skipped_count += 1
+    if use_vad and WHISPER_AVAILABLE:
+        features = prepare_features(audio_paths) if use_features else {}
+        for audio_path, result in trim_silence(audio_paths, sources=features).items():
+            ready[audio_path]['speechSpan'] = result['span']
+            if result['path'] is None:
+                resolved.append((audio_path, NO_SPEECH))
+            else:
+                inputs[audio_path] = result['path']
+    
+    silent = {audio_path for audio_path, _ in resolved}
+    misses = {}
+    for audio_path in audio_paths:
+        if audio_path in silent:
             continue
-        
-        audio_url = answer['audioUrl']
-        print(f"  {question_id}:")
-        
-        # Use filename from audio_files directory if exists
-        audio_filename = f"{user_id}_{question_id}.webm"
-        audio_path = audio_dir / audio_filename
-        
-        # Download if not exists
-        if not audio_path.exists():
-            if not download_audio(audio_url, audio_path):
-                failed_count += 1
-                continue
+        cached = None
+        if cache is not None and WHISPER_AVAILABLE:
+            cached = cache.get(audio_path, model_name, prompt_options(options, (prompts or {}).get(audio_path)))
+        if cached is not None:
+            print(f"    Using cached transcription")
+            resolved.append((audio_path, cached))
         else:
-            print(f"    Using existing audio file")
+            misses[audio_path] = inputs.get(audio_path, audio_path)
+    
+    if use_features and not use_vad and misses and WHISPER_AVAILABLE:
+        features = prepare_features(misses)
+        misses = {audio_path: features.get(audio_path, audio_path) for audio_path in misses}
+    return resolved, misses
+
+def make_transcriber(cache, batch_size=1, use_features=False, use_vad=False, prompts=None):
+    """{audio_path: answer} -> (audio_path, transcription) pairs, served from the cache when possible.
+    
+    The Whisper model is loaded on the first cache miss, so a run whose
+    answers are all cached never loads it. With batch_size > 1 the misses
+    are decoded in batches (see batched_transcription.py); with use_features
+    the model reads the decoded PCM of data/audio_features/ instead of the
+    .webm, and with use_vad only the trimmed speech (silent clips are skipped).
+    prompts maps audio paths to their question prompt (None: WHISPER_OPTIONS' prompt).
+    """
+    state = {'loaded': False, 'model': None, 'model_name': DEFAULT_MODEL_NAMES[0]}
+    options = cache_options(WHISPER_OPTIONS, batched=batch_size > 1, pcm_features=use_features,
+                            vad=VAD_OPTIONS if use_vad else None)
+    
+    prompts = prompts or {}
+    
+    def options_for(audio_path):
+        return prompt_options(options, prompts.get(audio_path))
+    
+    def transcribe_many(ready):
+        resolved, misses = prepare_inputs(ready, cache, options, state['model_name'], use_features, use_vad, prompts)
+        yield from resolved
+        if not misses:
+            return
         
-        # Transcribe
-        transcription = None
-        if WHISPER_AVAILABLE and whisper_model:
-            transcription = transcribe_with_whisper(audio_path, whisper_model)
-        elif SR_AVAILABLE:
-            transcription = transcribe_with_speech_recognition(audio_path)
+        if not state['loaded']:
+            state['model'], model_name = load_whisper_model()
+            state['model_name'] = model_name or state['model_name']
+            state['loaded'] = True
+            if model_name not in (None, DEFAULT_MODEL_NAMES[0]) and cache is not None:
+                # Fell back to another model: it may have its own cache entries
+                for audio_path in list(misses):
+                    cached = cache.get(audio_path, model_name, options_for(audio_path))
+                    if cached is not None:
+                        del misses[audio_path]
+                        yield audio_path, cached
         
-        if transcription:
-            answer['transcription'] = transcription
-            transcribed_count += 1
-            print(f"    Transcribed: '{transcription[:60]}{'...' if len(transcription) > 60 else ''}'")
+        model = state['model']
+        sources = {source: audio_path for audio_path, source in misses.items()}
+        source_prompts = {source: prompts.get(audio_path) for source, audio_path in sources.items()}
+        if model is not None and batch_size > 1:
+            results = transcribe_batched(model, list(sources), WHISPER_OPTIONS, transcribe_with_whisper, batch_size,
+                                         source_prompts)
         else:
-            answer['transcription'] = "TRANSCRIPTION_FAILED"
-            failed_count += 1
-            print(f"    Failed to transcribe")
+            results = ((source, transcribe_answer(source, model, source_prompts[source])) for source in sources)
+        for source, transcription in results:
+            audio_path = sources[source]
+            if cache is not None and model is not None:
+                cache.put(audio_path, state['model_name'], options_for(audio_path), transcription)
+            yield audio_path, transcription
+    
+    return transcribe_many
+
+def make_tiered_transcriber(cache, stats, question_ids, fast_model, accurate_model,
+                            use_features=False, use_vad=False, prompts=None):
+    """Same protocol as make_transcriber, but fast model first (see tiered_transcription.py).
+    
+    question_ids maps each audio path to its question, whose expected answers
+    decide (together with Whisper's confidence) whether to escalate.
+    """
+    prompts = prompts or {}
+    models = {}
+    expected_answers = load_expected_answers()
+    tier_name = f"{fast_model}>{accurate_model}"
+    options = cache_options(WHISPER_OPTIONS, pcm_features=use_features, vad=VAD_OPTIONS if use_vad else None,
+                            tiered={'min_avg_logprob': MIN_AVG_LOGPROB, 'max_compression_ratio': MAX_COMPRESSION_RATIO,
+                                    'min_match_ratio': MIN_MATCH_RATIO})
+    
+    def get_model(name):
+        if name not in models:
+            print(f"Loading Whisper '{name}' model...")
+            models[name] = whisper.load_model(name)
+        return models[name]
+    
+    def transcribe_many(ready):
+        resolved, misses = prepare_inputs(ready, cache, options, tier_name, use_features, use_vad, prompts)
+        yield from resolved
+        for audio_path, source in misses.items():
+            print(f"    Transcribing with Whisper ('{fast_model}' first)...")
+            prompt = prompts.get(audio_path)
+            try:
+                transcription, model_name = transcribe_tiered(audio_input(source), question_ids.get(audio_path),
+                                                              get_model, prompt_options(WHISPER_OPTIONS, prompt),
+                                                              expected_answers, fast_model, accurate_model)
+            except Exception as e:
+                print(f"    Whisper transcription failed: {e}")
+                yield audio_path, None
+                continue
+            if model_name != fast_model:
+                stats['escalated'] += 1
+            if cache is not None:
+                cache.put(audio_path, tier_name, prompt_options(options, prompt), transcription)
+            yield audio_path, transcription
+    
+    return transcribe_many
 
-# Process examResults users
-print("\n" + "=" * 60)
-print("Processing users in examResults...")
-print("=" * 60)
+def store_transcription(answer, transcription, stats, journal, key):
+    """Write the result back into the answer, append it to the journal and update the counters"""
+    if transcription == NO_SPEECH:
+        answer['transcription'] = NO_SPEECH
+        stats['silent'] += 1
+        print(f"    No speech detected, skipped Whisper")
+    elif transcription:
+        answer['transcription'] = transcription
+        stats['transcribed'] += 1
+        print(f"    Transcribed: '{transcription[:60]}{'...' if len(transcription) > 60 else ''}'")
+    else:
+        answer['transcription'] = "TRANSCRIPTION_FAILED"
+        stats['failed'] += 1
+        print(f"    Failed to transcribe")
+    journal.append(*key, answer)
 
-for user_id, results in data.get('examResults', {}).items():
-    for result_id, result_data in results.items():
-        if 'answers' not in result_data:
+def store_shared_transcription(sharing, transcription, stats, journal):
+    """store_transcription for every (key, answer) of one audio file.
+    
+    The examProgress and examResults answers of the same (user, question)
+    share one file: it is transcribed once, and every answer gets (and counts)
+    the result. The VAD span is recorded on the first answer only, so it is
+    copied to the others.
+    """
+    first = sharing[0][1]
+    for key, answer in sharing:
+        if 'speechSpan' in first:
+            answer['speechSpan'] = first['speechSpan']
+        store_transcription(answer, transcription, stats, journal, key)
+
+def pending_audio_answers(data, stats):
+    """Audio answers that still need a transcription, with their local audio path"""
+    pending = []
+    for user_id, question_id, answer in iter_audio_answers(data):
+        # Check if already transcribed
+        if 'transcription' in answer and answer['transcription']:
+            print(f"  ⏭️  {user_id[:20]}... / {question_id}: Already transcribed, skipping")
+            stats['skipped'] += 1
             continue
-        
-        print(f"\nUser: {user_id[:20]}...")
-        
-        for question_id, answer in result_data['answers'].items():
-            if 'audioUrl' not in answer:
-                continue
-            
-            # Check if already transcribed
-            if 'transcription' in answer and answer['transcription']:
-                print(f"  ⏭️  {question_id}: Already transcribed, skipping")
-                skipped_count += 1
-                continue
-            
-            audio_url = answer['audioUrl']
+        # Use filename from audio_files directory if exists
+        audio_path = audio_path_for(user_id, question_id, audio_dir)
+        pending.append((user_id, question_id, answer, audio_path))
+    return pending
+
+def run_sequential(pending, transcribe_many, session, download_workers, batch_size, journal, stats):
+    """Download every missing file first, then transcribe batch_size files at a time"""
+    # Download stage: fetch every missing audio file before transcription starts
+    print(f"Downloading missing audio files ({download_workers} concurrent downloads)...")
+    download_results = download_all([(answer['audioUrl'], audio_path) for _, _, answer, audio_path in pending],
+                                    workers=download_workers, session=session)
+    print(f"Audio files ready: {sum(download_results.values())}/{len(download_results)}\n")
+    
+    current_user = None
+    for start in range(0, len(pending), max(1, batch_size)):
+        ready = {}
+        sharing = {}
+        for user_id, question_id, answer, audio_path in pending[start:start + batch_size]:
+            if user_id != current_user:
+                print(f"\nUser: {user_id[:20]}...")
+                current_user = user_id
             print(f"  {question_id}:")
             
-            # Use filename from audio_files directory if exists
-            audio_filename = f"{user_id}_{question_id}.webm"
-            audio_path = audio_dir / audio_filename
-            
-            # Download if not exists
+            # Download if not exists (retry of a failed prefetch)
             if not audio_path.exists():
-                if not download_audio(audio_url, audio_path):
-                    failed_count += 1
+                if not download_audio(answer['audioUrl'], audio_path, session):
+                    stats['failed'] += 1
                     continue
             else:
                 print(f"    Using existing audio file")
-            
-            # Transcribe
-            transcription = None
-            if WHISPER_AVAILABLE and whisper_model:
-                transcription = transcribe_with_whisper(audio_path, whisper_model)
-            elif SR_AVAILABLE:
-                transcription = transcribe_with_speech_recognition(audio_path)
-            
-            if transcription:
-                answer['transcription'] = transcription
-                transcribed_count += 1
-                print(f"    Transcribed: '{transcription[:60]}{'...' if len(transcription) > 60 else ''}'")
-            else:
-                answer['transcription'] = "TRANSCRIPTION_FAILED"
-                failed_count += 1
-                print(f"    Failed to transcribe")
+            ready.setdefault(audio_path, answer)
+            sharing.setdefault(audio_path, []).append(((user_id, question_id), answer))
+        
+        for audio_path, transcription in transcribe_many(ready):
+            store_shared_transcription(sharing[audio_path], transcription, stats, journal)
+
+def run_multiprocess(pending, cache, session, download_workers, workers, threads_per_worker, batch_size,
+                     use_features, use_vad, prompts, journal, stats):
+    """Download every missing file, then transcribe on `workers` processes.
+    
+    VAD, feature decoding and cached answers are resolved here first; each
+    worker loads its own Whisper model (and decodes batch_size files per task),
+    and results are merged back into the answers (and the cache) in the parent
+    process as they complete.
+    """
+    options = cache_options(WHISPER_OPTIONS, batched=batch_size > 1, pcm_features=use_features,
+                            vad=VAD_OPTIONS if use_vad else None)
+    print(f"Downloading missing audio files ({download_workers} concurrent downloads)...")
+    download_results = download_all([(answer['audioUrl'], audio_path) for _, _, answer, audio_path in pending],
+                                    workers=download_workers, session=session)
+    print(f"Audio files ready: {sum(download_results.values())}/{len(download_results)}\n")
+    
+    ready = {}
+    sharing = {}
+    keys = {}
+    for user_id, question_id, answer, audio_path in pending:
+        if not download_results.get(audio_path):
+            stats['failed'] += 1
+            continue
+        ready.setdefault(audio_path, answer)
+        sharing.setdefault(audio_path, []).append(((user_id, question_id), answer))
+        keys.setdefault(audio_path, (user_id, question_id))
+    
+    resolved, misses = prepare_inputs(ready, cache, options, DEFAULT_MODEL_NAMES[0], use_features, use_vad, prompts)
+    for audio_path, transcription in resolved:
+        user_id, question_id = keys[audio_path]
+        print(f"  {user_id[:20]}... / {question_id}:")
+        store_shared_transcription(sharing[audio_path], transcription, stats, journal)
+    
+    if not misses:
+        return
+    paths = {keys[audio_path]: audio_path for audio_path in misses}
+    tasks = [(keys[audio_path], str(source)) for audio_path, source in misses.items()]
+    threads = threads_per_worker or default_threads_per_worker(workers)
+    print(f"Starting {workers} Whisper workers ({threads} thread(s) each)...\n")
+    task_prompts = None if prompts is None else {keys[audio_path]: prompts.get(audio_path) for audio_path in misses}
+    results = transcribe_parallel(tasks, transcribe_with_whisper, workers, threads,
+                                  batch_size=batch_size, options=WHISPER_OPTIONS, prompts=task_prompts)
+    for (user_id, question_id), transcription, model_name in results:
+        audio_path = paths[(user_id, question_id)]
+        print(f"  {user_id[:20]}... / {question_id}:")
+        store_shared_transcription(sharing[audio_path], transcription, stats, journal)
+        if cache is not None and model_name:
+            cache.put(audio_path, model_name, prompt_options(options, (prompts or {}).get(audio_path)), transcription)
+
+def run_pipeline(pending, transcribe_many, session, download_workers, queue_size, batch_size, use_features,
+                 journal, stats):
+    """Producer/consumer: download threads feed the single transcription loop.
+    
+    The queue is bounded, so downloads block (backpressure) once queue_size
+    files are waiting for the model; total runtime approaches
+    max(download, inference) instead of their sum. The consumer takes up to
+    batch_size files that are already waiting, without holding back for more.
+    """
+    ready = queue.Queue(maxsize=queue_size)
+    
+    def produce(item):
+        user_id, question_id, answer, audio_path = item
+        ok = audio_path.exists() or download_file(session, answer['audioUrl'], audio_path)
+        if ok and use_features:
+            prepare_one(audio_path)  # decode here, off the transcription thread
+        ready.put((item, ok))  # blocks while the transcription side is behind
+    
+    def producers():
+        try:
+            with ThreadPoolExecutor(max_workers=download_workers) as executor:
+                list(executor.map(produce, pending))
+        finally:
+            ready.put(None)
+    
+    threading.Thread(target=producers, daemon=True).start()
+    
+    # Consumer: this thread owns the Whisper model (and the cache connection)
+    done = False
+    while not done:
+        entries = [ready.get()]
+        while len(entries) < batch_size and not ready.empty():
+            entries.append(ready.get())
+        
+        batch = {}
+        sharing = {}
+        for entry in entries:
+            if entry is None:
+                done = True
+                continue
+            (user_id, question_id, answer, audio_path), ok = entry
+            print(f"  {user_id[:20]}... / {question_id}:")
+            if not ok:
+                stats['failed'] += 1
+                continue
+            batch.setdefault(audio_path, answer)
+            sharing.setdefault(audio_path, []).append(((user_id, question_id), answer))
+        
+        for audio_path, transcription in transcribe_many(batch):
+            store_shared_transcription(sharing[audio_path], transcription, stats, journal)
 
-# Save updated data
-output_file = '../data/final_with_transcriptions.json'
-print("\n" + "=" * 60)
-print("Saving transcriptions...")
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump(data, f, indent=2, ensure_ascii=False)
+def main():
+    args = parse_args()
+    
+    # Load the JSON data (or only the audio answers of an export store)
+    input_file, output_file = (args.store, args.store) if args.store else (args.input, args.output)
+    # Each output has its own journal, so runs over different sessions never mix
+    journal_file = JOURNAL_FILE if output_file == OUTPUT_FILE else f"{os.path.splitext(output_file)[0]}.journal.jsonl"
+    print(f"Loading data from {input_file}...")
+    if is_store(input_file):
+        with ExportStore(input_file) as store:
+            data = store.audio_answers()
+    else:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    
+    # Count audio answers
+    audio_count = count_audio_answers(data)
+    print(f"\nFound {audio_count} audio answers to transcribe\n")
+    
+    if audio_count == 0:
+        print("No audio files need transcription!")
+        exit(0)
+    
+    # Check if we have transcription tools available
+    if not WHISPER_AVAILABLE and not SR_AVAILABLE:
+        print("No transcription libraries available!")
+        print("\nTo transcribe audio, install one of these:")
+        print("  1. OpenAI Whisper (recommended): pip install openai-whisper")
+        print("  2. SpeechRecognition: pip install SpeechRecognition")
+        exit(1)
+    
+    print(f"Using transcription method: {'Whisper (offline) - SMALL model (high accuracy)' if WHISPER_AVAILABLE else 'Google Speech Recognition (online)'}\n")
+    
+    # Worker processes load their own model; otherwise it is loaded on the first cache miss
+    use_workers = args.workers > 1 and WHISPER_AVAILABLE
+    cache = None if args.no_cache else TranscriptionCache()
+    
+    stats = {'transcribed': 0, 'failed': 0, 'skipped': 0, 'silent': 0, 'escalated': 0, 'resumed': 0}
+    
+    # Resume an interrupted run: its results count as already transcribed (failures are retried)
+    journal = TranscriptionJournal(journal_file)
+    if args.restart:
+        journal.remove()
+    records = {key: record for key, record in journal.load().items()
+               if record.get('transcription') != "TRANSCRIPTION_FAILED"}
+    if records:
+        stats['resumed'] = apply_records(data, records)
+        print(f"Resuming interrupted run: {stats['resumed']} transcriptions from {journal_file}\n")
+    
+    pending = pending_audio_answers(data, stats)
+    
+    # Short question-specific prompts instead of the exam-wide one
+    question_ids = {audio_path: question_id for _, question_id, _, audio_path in pending}
+    prompts = None
+    if not args.static_prompt:
+        question_prompts = load_question_prompts()
+        prompts = {audio_path: question_prompts.get(question_id) for audio_path, question_id in question_ids.items()}
+    
+    if args.tiered and WHISPER_AVAILABLE:
+        transcribe_many = make_tiered_transcriber(cache, stats, question_ids, args.fast_model, args.accurate_model,
+                                                  args.use_features, args.vad, prompts)
+    else:
+        transcribe_many = make_transcriber(cache, args.batch_size, args.use_features, args.vad, prompts)
+    
+    # One pooled HTTP session for every download in this run
+    session = create_session(args.download_workers)
+    
+    print("=" * 60)
+    mode = f"{args.workers} worker processes" if use_workers else ('pipelined' if args.pipeline else 'sequential')
+    print(f"Transcribing {len(pending)} audio answers ({mode})...")
+    print("=" * 60)
+    
+    if use_workers:
+        run_multiprocess(pending, cache, session, args.download_workers, args.workers, args.threads_per_worker,
+                         args.batch_size, args.use_features, args.vad, prompts, journal, stats)
+    elif args.pipeline:
+        run_pipeline(pending, transcribe_many, session, args.download_workers, args.queue_size, args.batch_size,
+                     args.use_features, journal, stats)
+    else:
+        run_sequential(pending, transcribe_many, session, args.download_workers, args.batch_size, journal, stats)
+    
+    if cache is not None:
+        cache.close()
+    journal.close()
+    
+    # Merge step: the export plus the journal, written once; the run is then complete
+    print("\n" + "=" * 60)
+    print("Saving transcriptions...")
+    merge_journal(input_file, journal_file, output_file)
+    journal.remove()
+    
+    # Summary
+    print("\n" + "=" * 60)
+    print("TRANSCRIPTION COMPLETE!")
+    print("=" * 60)
+    print(f"Statistics:")
+    print(f"  - Total audio files: {audio_count}")
+    print(f"  - Successfully transcribed: {stats['transcribed']}")
+    print(f"  - Failed: {stats['failed']}")
+    print(f"  - Skipped (already done): {stats['skipped']}")
+    if stats['resumed']:
+        print(f"  - Resumed from journal: {stats['resumed']}")
+    if args.vad:
+        print(f"  - Silent (no speech detected): {stats['silent']}")
+    if args.tiered:
+        print(f"  - Escalated to '{args.accurate_model}': {stats['escalated']}")
+    if cache is not None:
+        print(f"  - Served from cache: {cache.hits}")
+    print(f"\nUpdated data saved to: {output_file}")
+    print(f"Audio files in: {audio_dir}/")
+    print("\nTip: Run generate_csv.py again to include transcriptions in CSVs")
 
-# Summary
-print("\n" + "=" * 60)
-print("TRANSCRIPTION COMPLETE!")
-print("=" * 60)
-print(f"Statistics:")
-print(f"  - Total audio files: {audio_count}")
-print(f"  - Successfully transcribed: {transcribed_count}")
-print(f"  - Failed: {failed_count}")
-print(f"  - Skipped (already done): {skipped_count}")
-print(f"\nUpdated data saved to: {output_file}")
-print(f"Audio files in: {audio_dir}/")
-print("\nTip: Run generate_csv.py again to include transcriptions in CSVs")
+if __name__ == '__main__':
+    main()
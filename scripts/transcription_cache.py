@@ -0,0 +1,106 @@
+"""
+Persistent transcription cache shared by transcribe_audio.py and retranscribe_audio.py.
+
+Entries live in a small SQLite database and are keyed by the SHA-256 of the
+audio file's bytes plus the decoding settings (model name, initial_prompt,
+beam_size, best_of, thresholds, ...). Re-running a script with unchanged
+settings is served entirely from the cache; changing the prompt or the model
+only re-decodes the files under the new key.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path('../data/transcription_cache.sqlite')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcriptions (
+    audio_sha256  TEXT NOT NULL,
+    settings      TEXT NOT NULL,
+    model         TEXT NOT NULL,
+    transcription TEXT NOT NULL,
+    created_at    TEXT NOT NULL DEFAULT (datetime('now')),
+    PRIMARY KEY (audio_sha256, settings)
+)
+"""
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_key(model_name, options):
+    """Canonical text form of the decoding settings (model name + transcribe() options)."""
+    return json.dumps({'model': model_name, **options}, sort_keys=True, separators=(',', ':'))
+
+
+def cache_options(options, **engine):
+    """Decoding settings as recorded in the cache.
+
+    Non-default engine settings (batched decoding, decoded PCM input, ...) are
+    added to the transcribe() options, since their results can differ slightly
+    from a plain transcribe() of the .webm file.
+    """
+    extra = {name: value for name, value in engine.items() if value}
+    return {**options, **extra} if extra else options
+
+
+class TranscriptionCache:
+    """(audio bytes, model, decoding options) -> transcription, stored in SQLite."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # The pipelined mode reads and writes from its consumer thread
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self._hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def audio_hash(self, audio_path):
+        """File hash, memoized per (path, size, mtime) so get + put read the file once."""
+        stat = os.stat(audio_path)
+        key = (str(audio_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = file_sha256(audio_path)
+        return self._hashes[key]
+
+    def get(self, audio_path, model_name, options):
+        """Cached transcription of audio_path under these settings, or None."""
+        row = self._conn.execute(
+            'SELECT transcription FROM transcriptions WHERE audio_sha256 = ? AND settings = ?',
+            (self.audio_hash(audio_path), settings_key(model_name, options))).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, audio_path, model_name, options, transcription):
+        """Store a successful transcription (failures are never cached)."""
+        if not transcription:
+            return
+        with self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO transcriptions (audio_sha256, settings, model, transcription) '
+                'VALUES (?, ?, ?, ?)',
+                (self.audio_hash(audio_path), settings_key(model_name, options), model_name, transcription))
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,135 @@
+"""
+Checkpoint journal for the transcription scripts.
+
+Every finished transcription is appended to a JSONL journal as soon as it is
+known (one line per answer, flushed immediately), instead of living only in
+memory until the final JSON is written. A run that crashes or is killed
+resumes from its journal: answers already in it are not transcribed again.
+At the end the output JSON is produced by a merge step (the input export
+plus the journal, written atomically) and the journal is removed. When the
+output is an export store (export_store.py), only the journaled answers are
+updated in place.
+
+Merge the journal of an interrupted run without resuming it:
+    python3 transcription_journal.py --journal ../data/transcribe_audio.journal.jsonl
+"""
+
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+
+from audio_answers import iter_audio_answers
+from export_store import ExportStore, is_store, json_to_store, load_export
+
+JOURNAL_FIELDS = ('transcription', 'speechSpan')
+
+
+class TranscriptionJournal:
+    """Append-only JSONL file of {user_id, question_id, transcription[, speechSpan]} records."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+
+    def load(self):
+        """(user_id, question_id) -> recorded fields; later records win.
+
+        A line cut short by a crash is ignored.
+        """
+        records = {}
+        if not self.path.exists():
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = (record.pop('user_id'), record.pop('question_id'))
+                records[key] = record
+        return records
+
+    def append(self, user_id, question_id, answer):
+        """Record the transcription fields of one answer."""
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        record = {'user_id': user_id, 'question_id': question_id,
+                  **{field: answer[field] for field in JOURNAL_FIELDS if field in answer}}
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()  # on disk (page cache) even if the process is killed
+
+    def close(self):
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Delete the journal once its run has been merged."""
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def apply_records(data, records):
+    """Write journal records into the matching audio answers of data. Returns the number of answers updated."""
+    applied = 0
+    for user_id, question_id, answer in iter_audio_answers(data):
+        record = records.get((user_id, question_id))
+        if record is not None:
+            answer.update(record)
+            applied += 1
+    return applied
+
+
+def write_json_atomic(data, path):
+    """json.dump to a temporary file next to path, then rename it over path."""
+    path = Path(path)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def merge_journal(input_file, journal_path, output_file):
+    """Merge step: output_file = input_file + every record of the journal. Returns the number of answers updated."""
+    records = TranscriptionJournal(journal_path).load()
+    if is_store(output_file):
+        if Path(input_file) != Path(output_file):
+            if is_store(input_file):
+                shutil.copyfile(input_file, output_file)
+            else:
+                json_to_store(input_file, output_file)
+        with ExportStore(output_file) as store:
+            return store.update_answers(records)
+
+    data = load_export(input_file)
+    applied = apply_records(data, records)
+    write_json_atomic(data, output_file)
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge a transcription journal into the exam export.")
+    parser.add_argument('--journal', required=True, help="Journal of the (interrupted) run")
+    parser.add_argument('--input', default='../data/final.json',
+                        help="Export (JSON or .sqlite store) the run started from (default: ../data/final.json)")
+    parser.add_argument('--output', default='../data/final_with_transcriptions.json',
+                        help="Merged export, JSON or .sqlite store (default: ../data/final_with_transcriptions.json)")
+    args = parser.parse_args()
+
+    applied = merge_journal(args.input, args.journal, args.output)
+    print(f"Merged {applied} transcriptions from {args.journal} into {args.output}")
+
+
+if __name__ == '__main__':
+    main()
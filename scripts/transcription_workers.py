@@ -0,0 +1,85 @@
+"""
+Multi-process Whisper transcription.
+
+Each worker process loads the Whisper model once (in the pool initializer),
+optionally limits its own torch thread count, and then pulls tasks (one audio
+file, or a batch of batch_size files) from the executor's shared queue. The parent process only collects
+(key, transcription) results and merges them into the JSON at the end.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from batched_transcription import transcribe_batched
+
+DEFAULT_MODEL_NAMES = ('small', 'base')
+
+_model = None
+_model_name = None
+_transcribe_fn = None
+
+
+def default_threads_per_worker(workers):
+    """Split the machine's cores evenly between the workers."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(model_names, threads, transcribe_fn):
+    global _model, _model_name, _transcribe_fn
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    import whisper
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    for name in model_names:
+        try:
+            _model = whisper.load_model(name)
+            _model_name = name
+            break
+        except Exception as e:
+            print(f"[worker {os.getpid()}] Failed to load '{name}' model: {e}")
+    _transcribe_fn = transcribe_fn
+
+
+def _transcribe_task(items, options, batch_size, prompts):
+    if _model is None:
+        return [(key, None, None) for key, _ in items]
+    keys = {audio_path: key for key, audio_path in items}
+    results = transcribe_batched(_model, list(keys), options, _transcribe_fn, batch_size, prompts)
+    return [(keys[audio_path], transcription, _model_name) for audio_path, transcription in results]
+
+
+def transcribe_parallel(tasks, transcribe_fn, workers, threads_per_worker=None,
+                        model_names=DEFAULT_MODEL_NAMES, batch_size=1, options=None, prompts=None):
+    """Transcribe [(key, audio_path), ...] on `workers` processes.
+
+    transcribe_fn(audio_path, model) must be a module-level function (it is
+    sent to the workers by reference). With batch_size > 1 each task holds
+    batch_size files, decoded together with the transcribe() `options`.
+    prompts optionally maps a key to its own initial_prompt (transcribe_fn is
+    then called as transcribe_fn(audio_path, model, prompt)).
+    Yields (key, transcription, model_name) as they complete; transcription
+    is None when a file fails, model_name is the model the worker actually loaded.
+    """
+    if not tasks:
+        return
+    if threads_per_worker is None:
+        threads_per_worker = default_threads_per_worker(workers)
+
+    # spawn: forking a process that already has torch's thread pools is unsafe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(tuple(model_names), threads_per_worker, transcribe_fn)) as executor:
+        step = max(1, batch_size)
+        futures = []
+        for i in range(0, len(tasks), step):
+            chunk = tasks[i:i + step]
+            chunk_prompts = None if prompts is None else {audio_path: prompts.get(key) for key, audio_path in chunk}
+            futures.append(executor.submit(_transcribe_task, chunk, options, batch_size, chunk_prompts))
+        for future in as_completed(futures):
+            yield from future.result()
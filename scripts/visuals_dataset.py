@@ -0,0 +1,145 @@
+"""
+In-memory dataset of a corrected CSV tree, loaded in a single pass.
+
+generate_visuals.py used to read general_statistics/summary.csv, then every
+user_csvs/*/summary.csv for the pair statistics, then every answers.csv again
+for the standard/control accuracy, and each new chart added one more scan.
+load_dataset() walks the tree once and returns everything the charts use:
+    summary   -> metric -> value of general_statistics/summary.csv
+    answers   -> AnswerTable of the answers.csv files (typed, columnar)
+    users     -> rows of general_statistics/users.csv
+    pairs     -> per-user pair counts as NumPy arrays (users with graded pairs only)
+    accuracy  -> overall / control / core accuracy, from the answer table
+    tests     -> Text vs Audio significance tests (statistical_tests.run_tests)
+    intervals -> bootstrap CI of every summary.csv metric (summary_intervals.py)
+Every chart function takes this dict. tests and intervals resample the users
+and are only computed on first access (see Dataset), so a run whose charts
+are all up to date, or that renders only charts without them, never pays
+for the resampling. The answers, and everything computed
+from them, leave out the excluded users like summary.csv does, so the
+intervals are those of the values the charts show.
+"""
+
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from answer_table import AnswerTable
+from statistical_tests import run_tests
+from summary_intervals import summary_intervals
+
+PAIR_METRICS = {
+    'Correct Pairs (Both Correct)': 'correct',
+    'Wrong Pairs (Both Wrong)': 'wrong',
+    'Partial Pairs (One Correct)': 'partial',
+}
+
+
+def _read_rows(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def _pair_counts(summary_rows):
+    """(correct, wrong, partial) pair counts of one user's summary.csv rows."""
+    counts = dict.fromkeys(PAIR_METRICS.values(), 0)
+    for row in summary_rows:
+        name = PAIR_METRICS.get(row.get('Metric', ''))
+        value = row.get('Value', '0')
+        if name is not None:
+            counts[name] = int(value) if value.isdigit() else 0
+    return counts['correct'], counts['wrong'], counts['partial']
+
+
+def accuracy_metrics(answers):
+    """Overall, control and core (standard) accuracy from the Correct/Wrong marks of an AnswerTable."""
+    # Group-by on question kind (accommodation questions are left out)
+    correct, wrong = answers.accuracy_counts('kind')
+    standard = answers.code_of('kind', 'standard')
+    control = answers.code_of('kind', 'control')
+
+    standard_correct, standard_wrong = int(correct[standard]), int(wrong[standard])
+    control_correct, control_wrong = int(correct[control]), int(wrong[control])
+    total_correct = standard_correct + control_correct
+    total_wrong = standard_wrong + control_wrong
+
+    def percent(right, total):
+        return right / total * 100 if total > 0 else 0
+
+    return {
+        'overall_accuracy': percent(total_correct, total_correct + total_wrong),
+        'overall_correct': total_correct,
+        'overall_wrong': total_wrong,
+        'core_accuracy': percent(standard_correct, standard_correct + standard_wrong),
+        'core_correct': standard_correct,
+        'core_wrong': standard_wrong,
+        'control_accuracy': percent(control_correct, control_correct + control_wrong),
+        'control_correct': control_correct,
+        'control_wrong': control_wrong
+    }
+
+
+def _tests(dataset):
+    return run_tests(dataset['answers'])
+
+
+def _intervals(dataset):
+    return summary_intervals(dataset['answers'], dataset['users'])
+
+
+class Dataset(dict):
+    """The dataset dict; the LAZY entries are computed from the others on first access."""
+
+    LAZY = {'tests': _tests, 'intervals': _intervals}
+
+    def __missing__(self, key):
+        if key not in self.LAZY:
+            raise KeyError(key)
+        value = self[key] = self.LAZY[key](self)
+        return value
+
+
+def load_dataset(corrected_dir, exclude_users=()):
+    """Read <corrected_dir>/general_statistics/ (summary.csv, users.csv) and every user_csvs/<user_id>/ once.
+
+    exclude_users are left out of the answers and of the users.csv rows (the
+    pair counts are per user and keep every user).
+    """
+    corrected_dir = Path(corrected_dir)
+    summary = {row['Metric']: row['Value']
+               for row in _read_rows(corrected_dir / 'general_statistics' / 'summary.csv')}
+    users_file = corrected_dir / 'general_statistics' / 'users.csv'
+    users_rows = [row for row in (_read_rows(users_file) if users_file.exists() else [])
+                  if row['User ID'] not in exclude_users]
+
+    rows = AnswerTable.empty_rows()
+    pair_users, pair_counts = [], []
+    for user_dir in sorted((corrected_dir / 'user_csvs').glob('*')):
+        if not user_dir.is_dir():
+            continue
+        summary_file = user_dir / 'summary.csv'
+        answers_file = user_dir / 'answers.csv'
+        if summary_file.exists():
+            counts = _pair_counts(_read_rows(summary_file))
+            # Only users with at least some graded pairs
+            if sum(counts) > 0:
+                pair_users.append(user_dir.name)
+                pair_counts.append(counts)
+        if answers_file.exists() and user_dir.name not in exclude_users:
+            AnswerTable.append_csv_rows(rows, user_dir.name, _read_rows(answers_file))
+
+    answers = AnswerTable(rows)
+    pair_counts = np.array(pair_counts, dtype=np.int64).reshape(-1, 3)
+    return Dataset({
+        'summary': summary,
+        'answers': answers,
+        'users': users_rows,
+        'pairs': {
+            'user_id': np.array(pair_users, dtype=object),
+            'correct': pair_counts[:, 0],
+            'wrong': pair_counts[:, 1],
+            'partial': pair_counts[:, 2],
+        },
+        'accuracy': accuracy_metrics(answers),
+    })
@@ -0,0 +1,145 @@
+"""
+Energy-based voice activity detection before transcription (CPU only, NumPy).
+
+Most answer recordings are a word or two surrounded by silence, but Whisper
+always processes a full padded 30-second window and only afterwards applies
+no_speech_threshold. Here each clip is split into short frames, frames whose
+RMS level stands out from the clip's noise floor count as speech, and the clip
+is trimmed to the first..last speech frame (plus some padding). Clips without
+enough speech are not sent to Whisper at all.
+
+The trimmed PCM is written to data/audio_features/<name>.speech.npy and the
+speech span of every file is kept in data/audio_features/speech_spans.json, so
+the detection runs once per file and VAD settings.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from audio_features import FEATURES_DIR, load_pcm
+
+SAMPLE_RATE = 16000
+NO_SPEECH = "NO_SPEECH_DETECTED"
+
+VAD_OPTIONS = {
+    'frame_ms': 30,
+    'threshold_db': 12.0,  # a speech frame is this much louder than the noise floor
+    'min_level_db': -45.0,  # ... and louder than this absolute level (dBFS)
+    'min_speech_ms': 120,  # less speech than this counts as a silent clip
+    'padding_ms': 250,  # kept around the detected speech
+}
+
+SPANS_FILE = 'speech_spans.json'
+
+
+def speech_span(pcm, options=VAD_OPTIONS, sample_rate=SAMPLE_RATE):
+    """(start_sample, end_sample) of the speech in pcm, or None for a silent clip."""
+    frame = int(sample_rate * options['frame_ms'] / 1000)
+    n_frames = len(pcm) // frame
+    if n_frames == 0:
+        return None
+
+    frames = np.asarray(pcm[:n_frames * frame], dtype=np.float32).reshape(n_frames, frame)
+    level_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+    # Relative to the noise floor, but never above (peak - threshold): a clip
+    # that is speech from start to end has no quiet frames to compare against
+    noise_floor = np.percentile(level_db, 10)
+    threshold = min(noise_floor, level_db.max() - 2 * options['threshold_db']) + options['threshold_db']
+    threshold = max(threshold, options['min_level_db'])
+    voiced = np.flatnonzero(level_db > threshold)
+    if len(voiced) * options['frame_ms'] < options['min_speech_ms']:
+        return None
+
+    padding = int(sample_rate * options['padding_ms'] / 1000)
+    return int(max(0, voiced[0] * frame - padding)), int(min(len(pcm), (voiced[-1] + 1) * frame + padding))
+
+
+def speech_path_for(audio_path, features_dir=FEATURES_DIR):
+    """<features_dir>/<user_id>_<question_id>.speech.npy (the trimmed PCM)."""
+    return Path(features_dir) / (Path(audio_path).stem + '.speech.npy')
+
+
+def load_spans(features_dir=FEATURES_DIR):
+    spans_path = Path(features_dir) / SPANS_FILE
+    if not spans_path.exists():
+        return {}
+    with open(spans_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_spans(spans, features_dir=FEATURES_DIR):
+    spans_path = Path(features_dir) / SPANS_FILE
+    spans_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = spans_path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(spans, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, spans_path)
+
+
+def _trim_one(audio_path, source_path, features_dir, options):
+    """Detect speech in one file; returns the spans.json entry (None if it cannot be decoded)."""
+    try:
+        pcm = load_pcm(source_path)
+    except Exception as e:
+        print(f"    Failed to decode {Path(audio_path).name}: {e}")
+        return None
+
+    span = speech_span(pcm, options)
+    entry = {'mtime_ns': Path(audio_path).stat().st_mtime_ns, 'options': options,
+             'duration': round(len(pcm) / SAMPLE_RATE, 3), 'span': None}
+    if span is not None:
+        start, end = span
+        entry['span'] = [round(start / SAMPLE_RATE, 3), round(end / SAMPLE_RATE, 3)]
+        speech_path = speech_path_for(audio_path, features_dir)
+        speech_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = speech_path.with_suffix('.part.npy')
+        np.save(tmp_path, np.asarray(pcm[start:end], dtype=np.float16))
+        os.replace(tmp_path, speech_path)
+    return entry
+
+
+def trim_silence(audio_paths, sources=None, features_dir=FEATURES_DIR, options=VAD_OPTIONS, workers=4):
+    """Run the VAD on every audio file that has no up-to-date result yet.
+
+    sources optionally maps an audio path to the file to decode instead (its
+    .npy PCM, see audio_features.py). Returns a dict audio_path -> result, where
+    result is {'span': {'start': s, 'end': e}, 'path': trimmed .npy} for speech,
+    {'span': None, 'path': None} for a silent clip; files that cannot be decoded
+    are left out.
+    """
+    sources = sources or {}
+    spans = load_spans(features_dir)
+    audio_paths = [Path(path) for path in audio_paths]
+
+    def is_fresh(audio_path):
+        entry = spans.get(audio_path.stem)
+        return (entry is not None and entry['options'] == options
+                and entry['mtime_ns'] == audio_path.stat().st_mtime_ns
+                and (entry['span'] is None or speech_path_for(audio_path, features_dir).exists()))
+
+    stale = [path for path in audio_paths if not is_fresh(path)]
+    if stale:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            entries = executor.map(lambda path: _trim_one(path, sources.get(path, path), features_dir, options), stale)
+            for audio_path, entry in zip(stale, entries):
+                if entry is not None:
+                    spans[audio_path.stem] = entry
+        save_spans(spans, features_dir)
+
+    results = {}
+    for audio_path in audio_paths:
+        if not is_fresh(audio_path):
+            continue  # could not be decoded
+        entry = spans[audio_path.stem]
+        if entry['span'] is None:
+            results[audio_path] = {'span': None, 'path': None}
+        else:
+            start, end = entry['span']
+            results[audio_path] = {'span': {'start': start, 'end': end},
+                                   'path': speech_path_for(audio_path, features_dir)}
+    return results
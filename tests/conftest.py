@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The scripts import each other as top-level modules (they are run from scripts/)
+SCRIPTS_DIR = Path(__file__).resolve().parents[1] / 'scripts'
+sys.path.insert(0, str(SCRIPTS_DIR))
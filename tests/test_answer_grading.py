@@ -0,0 +1,110 @@
+"""answer_grading.AnswerGrader on the accepted answers shipped in data/."""
+
+import csv
+import shutil
+from pathlib import Path
+
+import pytest
+
+import generate_visuals
+from answer_grading import AnswerGrader, answer_words, grade_tree, load_accepted_answers, load_question_texts
+from answer_table import EXCLUDED_USERS
+from visuals_dataset import load_dataset
+
+DATA_DIR = Path(__file__).resolve().parents[1] / 'data'
+CORRECTED_DIR = Path(__file__).resolve().parents[1] / 'manual_corrected_csvs'
+
+
+@pytest.fixture(scope='module')
+def grader():
+    accepted = load_accepted_answers(DATA_DIR / 'question_answers.json', DATA_DIR / 'answer_synonyms.json')
+    return AnswerGrader(accepted, load_question_texts(DATA_DIR / 'questions_map.json'))
+
+
+@pytest.mark.parametrize('text, words', [
+    ('Eight', ('8',)),
+    ('four four three', ('443',)),
+    ('4 4 3', ('443',)),
+    ('port eight zero', ('port', '80')),
+    ('four hundred and forty three', ('443',)),
+    ("The Dijkstra's algorithm.", ('dijkstra', 'algorithm')),
+])
+def test_answer_words(text, words):
+    assert answer_words(text) == words
+
+
+@pytest.mark.parametrize('question_id, answer', [
+    ('section2_control_Q8', 'four four three'),
+    ('section2_control_Q8', 'Four hundred forty three'),
+    ('section2_standard_Q8', 'port eight zero'),
+    ('section2_standard_Q8', 'eighty'),
+    ('section2_standard_Q1', 'eight'),
+])
+def test_spoken_numbers_are_correct(grader, question_id, answer):
+    assert grader.grade(question_id, answer)['verdict'] == 'Correct'
+
+
+def test_unmatched_spoken_number_goes_to_review(grader):
+    result = grader.grade('section2_control_Q8', 'four forty three')
+    assert result['verdict'] is None
+    assert result['reason'] == 'unmatched spoken number'
+
+
+def test_typed_wrong_number_is_wrong(grader):
+    assert grader.grade('section2_standard_Q8', '8080')['verdict'] == 'Wrong'
+
+
+@pytest.mark.parametrize('question_id, answer, verdict', [
+    ('section3_standard_Q7', 'Incapsulation.', 'Correct'),
+    ('section2_control_Q6', 'Transport', 'Correct'),
+    ('section2_control_Q7', 'http', 'Wrong'),
+    ('section2_standard_Q5', 'NOR', 'Wrong'),
+    ('section3_standard_Q4', 'One area network.', None),
+    ('section2_control_Q12', 'n*log(n)', None),
+])
+def test_fuzzy_matching(grader, question_id, answer, verdict):
+    assert grader.grade(question_id, answer)['verdict'] == verdict
+
+
+def test_missing_transcription_goes_to_review(grader):
+    assert grader.grade('section3_standard_Q9', 'TRANSCRIPTION_FAILED')['reason'] == 'no transcription'
+
+
+def test_questions_without_accepted_answers_are_not_graded(grader):
+    assert grader.grade('section1_accomodation_Q1', '22') is None
+
+
+def _blank_marks(answers_file, question_id):
+    with open(answers_file, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        if row['Question ID'] == question_id:
+            row['Correct'] = row['Wrong'] = ''
+    with open(answers_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_grading_updates_the_general_summary(grader, tmp_path, monkeypatch):
+    tree = tmp_path / 'manual_corrected_csvs'
+    shutil.copytree(CORRECTED_DIR, tree)
+    # An answer marked Correct by hand that the grader marks Wrong ('RAM' for the packet forwarding device)
+    answers_file = next(path for path in sorted(tree.glob('user_csvs/*/answers.csv'))
+                        if path.parent.name not in EXCLUDED_USERS
+                        and 'section2_standard_Q4,' in path.read_text(encoding='utf-8')
+                        and any(row['Question ID'] == 'section2_standard_Q4' and row['User Answer (Text)'] == 'RAM'
+                                for row in csv.DictReader(path.open(encoding='utf-8', newline=''))))
+    _blank_marks(answers_file, 'section2_standard_Q4')
+
+    totals, _ = grade_tree(tree, grader)
+    assert totals['Wrong'] == 1
+
+    dataset = load_dataset(tree, EXCLUDED_USERS)
+    assert dataset['summary']['Total Correct Answers (Count)'] == '165'
+    assert dataset['summary']['Total Wrong Answers (Count)'] == '51'
+    for metric in ('Total Correct Answers (Count)', 'Overall Accuracy (%)', 'Text Accuracy (%)'):
+        value = generate_visuals.parse_number(dataset['summary'][metric])
+        assert dataset['intervals'][metric]['estimate'] == pytest.approx(value, abs=0.005)
+    monkeypatch.setattr(generate_visuals.plt, 'savefig', lambda *args, **kwargs: None)
+    generate_visuals.generate_overall_accuracy_chart(dataset)
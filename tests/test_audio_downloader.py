@@ -0,0 +1,143 @@
+"""audio_downloader.download_file against a local http.server stand-in for Firebase Storage."""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import audio_downloader
+from audio_downloader import create_session, download_file
+
+BODY = b'webm-audio-bytes' * 1000
+
+
+class StorageHandler(BaseHTTPRequestHandler):
+    """Answers each path with the next status of its script; the last status repeats."""
+
+    scripts = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        statuses = self.scripts[self.path]
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        if status == 'truncated':
+            # Announce the whole body but close the connection halfway through
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY[:len(BODY) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.send_response(status)
+        body = BODY if status == 200 else b'error'
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StorageHandler.scripts = {}
+    StorageHandler.requests = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StorageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(audio_downloader.time, 'sleep', delays.append)
+    return delays
+
+
+@pytest.fixture
+def session():
+    session = create_session(2)
+    yield session
+    session.close()
+
+
+def leftover_parts(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.part')]
+
+
+@pytest.mark.parametrize('status', [500, 503, 429])
+def test_retries_with_backoff_on_server_errors_and_rate_limits(server, sleeps, session, tmp_path, status):
+    StorageHandler.scripts['/a.webm'] = [status, status, 200]
+    output = tmp_path / 'a.webm'
+
+    assert download_file(session, f'{server}/a.webm', output, retries=3, backoff=0.5)
+    assert output.read_bytes() == BODY
+    assert StorageHandler.requests == ['/a.webm'] * 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_gives_up_after_the_last_retry(server, sleeps, session, tmp_path):
+    StorageHandler.scripts['/a.webm'] = [502]
+    output = tmp_path / 'a.webm'
+
+    assert not download_file(session, f'{server}/a.webm', output, retries=2, backoff=1.0)
+    assert len(StorageHandler.requests) == 3
+    assert sleeps == [1.0, 2.0]
+    assert not output.exists()
+    assert leftover_parts(tmp_path) == []
+
+
+def test_not_found_is_a_permanent_failure(server, sleeps, session, tmp_path):
+    StorageHandler.scripts['/missing.webm'] = [404]
+    output = tmp_path / 'missing.webm'
+
+    assert not download_file(session, f'{server}/missing.webm', output, retries=3)
+    assert StorageHandler.requests == ['/missing.webm']
+    assert sleeps == []
+    assert not output.exists()
+
+
+def test_temp_file_is_renamed_into_place(server, sleeps, session, tmp_path, monkeypatch):
+    StorageHandler.scripts['/a.webm'] = [200]
+    output = tmp_path / 'a.webm'
+    renames = []
+    real_replace = os.replace
+
+    def record_replace(source, destination):
+        # The body is complete in the temp file before it becomes visible under its final name
+        renames.append((source, destination, open(source, 'rb').read() == BODY, os.path.exists(destination)))
+        real_replace(source, destination)
+
+    monkeypatch.setattr(audio_downloader.os, 'replace', record_replace)
+
+    assert download_file(session, f'{server}/a.webm', output)
+    (source, destination, complete, existed), = renames
+    assert os.path.dirname(source) == str(tmp_path) and source.endswith('.part')
+    assert destination == output and complete and not existed
+    assert output.read_bytes() == BODY
+    assert leftover_parts(tmp_path) == []
+
+
+def test_interrupted_download_leaves_no_partial_file(server, sleeps, session, tmp_path):
+    StorageHandler.scripts['/a.webm'] = ['truncated']
+    output = tmp_path / 'a.webm'
+
+    assert not download_file(session, f'{server}/a.webm', output, retries=1, backoff=0.1)
+    assert len(StorageHandler.requests) == 2
+    assert not output.exists()
+    assert leftover_parts(tmp_path) == []
+
+
+def test_interrupted_download_is_retried(server, sleeps, session, tmp_path):
+    StorageHandler.scripts['/a.webm'] = ['truncated', 200]
+    output = tmp_path / 'a.webm'
+
+    assert download_file(session, f'{server}/a.webm', output, retries=1, backoff=0.1)
+    assert output.read_bytes() == BODY
+    assert leftover_parts(tmp_path) == []
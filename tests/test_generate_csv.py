@@ -0,0 +1,67 @@
+"""The compact user index of generate_csv.py on a small export, and on the same users split over shards."""
+
+import json
+
+import pytest
+
+from generate_csv import (build_answer_records, build_user_index, load_sharded_index, load_user_answers,
+                          load_user_entries, new_time_stats)
+
+EXPORT = {
+    'users': {'u1': {'email': 'u1@exam.org'}, 'u2': {'email': 'u2@exam.org'}, 'u3': {'email': 'u3@exam.org'}},
+    'examProgress': {
+        'u1': {'submitted': True},
+        'u2': {'answeredCount': 2, 'tabChangeCount': 1, 'answers': {
+            'section2_standard_Q1': {'text': '8', 'timeToAnswerMs': 4000, 'answeredAt': '2026-01-04T15:00:04.000Z'},
+            'section3_standard_Q4': {'audioUrl': 'https://storage/u2/q4.webm', 'transcription': 'Wide area network',
+                                     'timeToAnswerMs': 21000, 'answeredAt': '2026-01-04T15:01:00.000Z'},
+        }},
+        'u3': {'submitted': True},
+    },
+    'examResults': {
+        'u1': {'r1': {'timestamp': '2026-01-04T15:10:00.000Z', 'timeSpent': 600, 'answers': {
+            'section2_control_Q8': {'text': '443', 'timeToAnswerMs': 9000, 'answeredAt': '2026-01-04T15:02:00.000Z'},
+        }}},
+    },
+}
+
+
+@pytest.fixture
+def export_path(tmp_path):
+    path = tmp_path / 'final.json'
+    path.write_text(json.dumps(EXPORT, indent=2), encoding='utf-8')
+    return str(path)
+
+
+def test_index_keeps_no_answers(export_path):
+    index = build_user_index(load_user_entries(export_path))
+    assert 'answers' not in index['u2']
+    assert (index['u2']['text_answers'], index['u2']['audio_answers']) == (1, 1)
+    assert (index['u2']['time_count'], index['u2']['time_sum_ms']) == (2, 25000)
+    assert not index['u3']['has_data']
+
+
+@pytest.mark.parametrize('user_id, data', [
+    ('u1', EXPORT['examResults']['u1']['r1']),
+    ('u2', EXPORT['examProgress']['u2']),
+    ('u3', None),
+])
+def test_answers_are_read_back_from_the_export(export_path, user_id, data):
+    index = build_user_index(load_user_entries(export_path))
+    assert load_user_answers(index[user_id]) == build_answer_records(data)
+
+
+def test_shards_merge_the_times_of_the_kept_users_only(tmp_path, export_path):
+    # An older session of u2: one slow answer, superseded by the copy in final.json
+    older = {'users': {'u2': {'email': 'u2@exam.org'}}, 'examProgress': {'u2': {'answers': {
+        'section2_standard_Q1': {'text': 'eight', 'timeToAnswerMs': 90000, 'answeredAt': '2026-01-03T15:00:00.000Z'},
+    }}}}
+    older_path = tmp_path / 'older.json'
+    older_path.write_text(json.dumps(older), encoding='utf-8')
+
+    user_index, time_stats = load_sharded_index([str(older_path), export_path])
+    expected = new_time_stats()
+    build_user_index(load_user_entries(export_path), expected)
+    assert user_index['u2']['location'][0] == export_path
+    for key in expected:
+        assert (time_stats[key].count, time_stats[key].stats.total) == (expected[key].count, expected[key].stats.total)
@@ -0,0 +1,26 @@
+"""The render cache of generate_visuals.py and the lazy entries of the visuals dataset."""
+
+import pytest
+
+import generate_visuals
+from answer_table import EXCLUDED_USERS
+from visuals_dataset import Dataset, load_dataset
+
+
+@pytest.fixture
+def dataset():
+    return load_dataset(generate_visuals.CORRECTED_DIR, EXCLUDED_USERS)
+
+
+def test_fingerprints_do_not_compute_the_lazy_entries(dataset):
+    for number in range(1, len(generate_visuals.CHARTS) + 1):
+        generate_visuals.chart_fingerprint(number, dataset)
+    assert not set(Dataset.LAZY) & set(dataset)
+
+
+@pytest.mark.parametrize('number', range(1, len(generate_visuals.CHARTS) + 1))
+def test_lazy_entries_lists_the_charts_that_read_them(dataset, number, monkeypatch):
+    monkeypatch.setattr(generate_visuals.plt, 'savefig', lambda *args, **kwargs: None)
+    generate_visuals.render_chart(number, dataset)
+    read = {key for key, charts in generate_visuals.LAZY_ENTRIES.items() if number in charts}
+    assert set(Dataset.LAZY) & set(dataset) == read
@@ -0,0 +1,52 @@
+"""Merging the streaming accumulators of split inputs gives the statistics of a single pass."""
+
+import random
+
+import pytest
+
+from streaming_stats import QuantileSketch, TimeStats
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def times_ms(n=5000, seed=0):
+    rng = random.Random(seed)
+    return [rng.randint(0, 120000) for _ in range(n)]
+
+
+def time_stats_of(values):
+    stats = TimeStats()
+    for value in values:
+        stats.add(value)
+    return stats
+
+
+@pytest.mark.parametrize('cuts', [(2500,), (1, 4999), (700, 701, 3000)])
+def test_merge_of_split_inputs_matches_a_single_pass(cuts):
+    values = times_ms()
+    single = time_stats_of(values)
+    bounds = (0, *cuts, len(values))
+    parts = [time_stats_of(values[start:end]) for start, end in zip(bounds, bounds[1:])]
+    merged = TimeStats()
+    for part in reversed(parts):
+        merged.merge(part)
+
+    assert merged.count == single.count == len(values)
+    assert merged.stats.total == single.stats.total == sum(values)
+    assert merged.mean == single.mean
+    assert (merged.stats.minimum, merged.stats.maximum) == (min(values), max(values))
+    for q in QUANTILES:
+        assert merged.quantile(q) == single.quantile(q)
+
+
+def test_quantiles_are_within_alpha():
+    values = sorted(times_ms())
+    stats = time_stats_of(values)
+    for q in QUANTILES:
+        exact = values[int(q * (len(values) - 1))]
+        assert stats.quantile(q) == pytest.approx(exact, rel=stats.sketch.alpha)
+
+
+def test_sketches_of_another_alpha_do_not_merge():
+    with pytest.raises(ValueError, match='alpha'):
+        QuantileSketch(0.01).merge(QuantileSketch())
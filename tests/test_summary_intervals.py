@@ -0,0 +1,51 @@
+"""summary_intervals on manual_corrected_csvs/ against its summary.csv, and the chart error bars built from them."""
+
+from pathlib import Path
+
+import pytest
+
+from answer_table import EXCLUDED_USERS, AnswerTable
+from generate_visuals import interval_errors
+from summary_intervals import load_users_rows, summary_intervals, summary_mismatches
+
+CORRECTED_DIR = Path(__file__).resolve().parents[1] / 'manual_corrected_csvs'
+
+# Rows of the hand-edited summary.csv that the answers.csv files do not reproduce
+UNREPRODUCED = {
+    'Total Text Answers (Count)', 'Total Audio Answers (Count)', 'Text vs Audio Ratio',
+    'Average Time to Answer - Text (mm:ss)', 'Audio takes longer than Text by (mm:ss)', 'Audio/Text Time Ratio',
+    'Average Tab Changes per User (Count)', 'Total Answered Questions (Count)',
+    'Total Time Spent by All Users (mm:ss)', 'Average Time Spent per User (mm:ss)',
+}
+
+
+def intervals_of(exclude_users):
+    answers = AnswerTable.from_csv_tree(CORRECTED_DIR / 'user_csvs', exclude_users=exclude_users)
+    return summary_intervals(answers, load_users_rows(CORRECTED_DIR, exclude_users), n_resamples=500)
+
+
+@pytest.fixture(scope='module')
+def intervals():
+    return intervals_of(EXCLUDED_USERS)
+
+
+def test_estimates_match_summary_csv(intervals):
+    assert {name for name, _, _ in summary_mismatches(intervals, CORRECTED_DIR)} == UNREPRODUCED
+
+
+def test_single_value_intervals_are_left_out(intervals):
+    assert 'Total Users (Count)' not in intervals
+    assert 'Min Tab Changes (Count)' not in intervals
+    assert all(interval['low'] < interval['high'] for interval in intervals.values())
+
+
+def test_error_bars_run_from_low_to_high_around_the_value(intervals):
+    interval = intervals['Overall Accuracy (%)']
+    errors = interval_errors({'intervals': intervals}, ['Overall Accuracy (%)'], [76.85])
+    assert errors[:, 0] == pytest.approx((76.85 - interval['low'], interval['high'] - 76.85))
+
+
+def test_error_bars_of_another_population_are_left_out(capsys):
+    errors = interval_errors({'intervals': intervals_of(())}, ['Overall Accuracy (%)'], [76.85])
+    assert not errors.any()
+    assert 'does not match the plotted value' in capsys.readouterr().out